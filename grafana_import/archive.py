@@ -0,0 +1,308 @@
+import abc
+import contextlib
+import gzip
+import io
+import json
+import logging
+import posixpath
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+import typing as t
+from datetime import datetime, timezone
+from pathlib import Path
+
+from grafana_import.constants import PKG_NAME, PKG_VERSION
+from grafana_import.util import atomic_write
+
+logger = logging.getLogger(__name__)
+
+# Kinds of archive records, and the names of the metadata records.
+DASHBOARD = "dashboard"
+FOLDERS = "folders"
+MANIFEST = "manifest"
+FOLDERS_NAME = "folders.json"
+MANIFEST_NAME = "manifest.json"
+# Directory of dashboards within tar archives, so their names never collide with the metadata records.
+DASHBOARDS_DIR = "dashboards"
+MANIFEST_VERSION = 1
+
+# Serialized dashboards up to this size are buffered in memory, larger ones are spooled to disk.
+SPOOL_SIZE = 1024 * 1024
+
+
+def dump_json(data: t.Any, fp: t.IO[str], pretty: bool = False) -> None:
+    """
+    Serialize data to a file object, chunk by chunk, without building the whole document in memory.
+    """
+    if pretty:
+        json.dump(data, fp, sort_keys=True, indent=2)
+    else:
+        json.dump(data, fp)
+
+
+def spool_json(data: t.Any, pretty: bool = False) -> t.Tuple[t.IO[bytes], int]:
+    """
+    Serialize data to a spooled temporary file, returning the file rewound to its start, and its size.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    text = io.TextIOWrapper(t.cast(t.BinaryIO, spool), encoding="utf-8")
+    dump_json(data, text, pretty=pretty)
+    text.flush()
+    text.detach()
+    size = spool.tell()
+    spool.seek(0)
+    return t.cast(t.IO[bytes], spool), size
+
+
+class ArchiveRecord(t.NamedTuple):
+    """
+    A record read from an archive, either a dashboard, the folder metadata, or the manifest.
+    """
+
+    kind: str
+    name: str
+    data: t.Any
+    meta: t.Union[t.Dict[str, t.Any], None] = None
+
+
+class ArchiveWriter(abc.ABC):
+    """
+    Write many dashboards into a single archive file, atomically.
+
+    Dashboards are serialized one by one, so memory usage does not grow with the
+    number of dashboards. Adding dashboards is thread-safe. The archive only
+    appears at its destination when it has been closed without an error.
+
+    The metadata of the folders dashboards have been exported from can be added
+    up front, so it is available before any dashboard when reading the archive
+    sequentially. When closing, a manifest indexing all dashboards is appended.
+
+    Subclasses set up the archive format in `start`, and complete it in `finish`.
+    When either of them fails, the temporary file is removed.
+    """
+
+    def __init__(self, path: t.Union[str, Path], pretty: bool = False, compress: bool = False):
+        self.path = Path(path)
+        self.pretty = pretty
+        self.compress = compress
+        self.entries: t.List[t.Dict[str, t.Any]] = []
+        self.folders = 0
+        self.lock = threading.Lock()
+        self.stack = contextlib.ExitStack()
+        self.fp = self.stack.enter_context(atomic_write(self.path, "wb"))
+        try:
+            self.start()
+        except BaseException as ex:
+            self.stack.__exit__(type(ex), ex, ex.__traceback__)
+            raise
+
+    def __enter__(self) -> "ArchiveWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close(*exc_info)
+
+    @property
+    def count(self) -> int:
+        return len(self.entries)
+
+    def add(self, name: str, dashboard: t.Dict[str, t.Any], meta: t.Union[t.Dict[str, t.Any], None] = None) -> None:
+        meta = meta or {}
+        name = self.member_name(name, meta)
+        self.append(DASHBOARD, name, dashboard, meta)
+        entry = {
+            "name": name,
+            "uid": dashboard.get("uid"),
+            "title": dashboard.get("title"),
+            "version": dashboard.get("version"),
+            "folderUid": meta.get("folderUid"),
+            "folderTitle": meta.get("folderTitle"),
+        }
+        with self.lock:
+            self.entries.append(entry)
+
+    def add_folders(self, folders: t.List[t.Dict[str, t.Any]]) -> None:
+        """
+        Add the metadata of folders, a list of folder objects with `uid`, `title`, `parentUid`, and `path`.
+        """
+        self.append(FOLDERS, FOLDERS_NAME, folders)
+        self.folders += len(folders)
+
+    def manifest(self) -> t.Dict[str, t.Any]:
+        return {
+            "version": MANIFEST_VERSION,
+            "generator": f"{PKG_NAME} {PKG_VERSION}",
+            "created": datetime.now(timezone.utc).isoformat(),
+            "folders": self.folders,
+            "dashboards": self.entries,
+        }
+
+    def member_name(self, name: str, meta: t.Dict[str, t.Any]) -> str:
+        return name
+
+    @abc.abstractmethod
+    def start(self) -> None:
+        pass
+
+    @abc.abstractmethod
+    def append(self, kind: str, name: str, data: t.Any, meta: t.Union[t.Dict[str, t.Any], None] = None) -> None:
+        pass
+
+    @abc.abstractmethod
+    def finish(self) -> None:
+        pass
+
+    def close(self, *exc_info) -> None:
+        """
+        Finish writing the archive, and move it to its destination, or discard it when an error is passed.
+        """
+        try:
+            if not exc_info or exc_info[0] is None:
+                exc_info = (None, None, None)
+                self.append(MANIFEST, MANIFEST_NAME, self.manifest())
+            self.finish()
+        except BaseException as ex:
+            self.stack.__exit__(type(ex), ex, ex.__traceback__)
+            raise
+        self.stack.__exit__(*exc_info)
+
+
+class NdjsonWriter(ArchiveWriter):
+    """
+    Write dashboards as newline-delimited JSON, one record per line, optionally compressed using gzip.
+
+    Each dashboard record carries the `name` of the dashboard file, the `dashboard`
+    itself, and its `meta` information, like the folder it has been exported from.
+    The folder metadata and the manifest are records of `kind` `folders` and `manifest`.
+    """
+
+    def start(self) -> None:
+        self.out: t.IO[bytes] = (
+            t.cast(t.IO[bytes], gzip.GzipFile(fileobj=self.fp, mode="wb")) if self.compress else self.fp
+        )
+
+    def append(self, kind: str, name: str, data: t.Any, meta: t.Union[t.Dict[str, t.Any], None] = None) -> None:
+        if kind == DASHBOARD:
+            record = {"kind": kind, "name": name, "meta": meta or {}, "dashboard": data}
+        elif kind == FOLDERS:
+            record = {"kind": kind, "folders": data}
+        else:
+            record = {"kind": kind, **data}
+        spool, _ = spool_json(record)
+        with spool, self.lock:
+            shutil.copyfileobj(spool, self.out)
+            self.out.write(b"\n")
+
+    def finish(self) -> None:
+        if self.out is not self.fp:
+            self.out.close()
+
+
+class TarWriter(ArchiveWriter):
+    """
+    Write dashboards as members of a tar archive, one JSON file per dashboard, optionally compressed using gzip.
+
+    Dashboards are stored within the `dashboards` directory, and dashboards within
+    folders in a subdirectory named by the folder uid. The folder metadata and the
+    manifest are stored as `folders.json` and `manifest.json` at the top level.
+    """
+
+    def start(self) -> None:
+        self.tar = tarfile.open(fileobj=self.fp, mode="w|gz" if self.compress else "w|")
+
+    def member_name(self, name: str, meta: t.Dict[str, t.Any]) -> str:
+        if meta.get("folderUid"):
+            return posixpath.join(DASHBOARDS_DIR, meta["folderUid"], name)
+        return posixpath.join(DASHBOARDS_DIR, name)
+
+    def append(self, kind: str, name: str, data: t.Any, meta: t.Union[t.Dict[str, t.Any], None] = None) -> None:
+        spool, size = spool_json(data, pretty=self.pretty)
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mtime = int(time.time())
+        with spool, self.lock:
+            self.tar.addfile(info, spool)
+
+    def finish(self) -> None:
+        self.tar.close()
+
+
+# Archive formats by file name suffix, and whether they are compressed.
+FORMATS: t.Dict[str, t.Tuple[t.Type[ArchiveWriter], bool]] = {
+    ".ndjson": (NdjsonWriter, False),
+    ".ndjson.gz": (NdjsonWriter, True),
+    ".jsonl": (NdjsonWriter, False),
+    ".jsonl.gz": (NdjsonWriter, True),
+    ".tar": (TarWriter, False),
+    ".tar.gz": (TarWriter, True),
+    ".tgz": (TarWriter, True),
+}
+
+
+def archive_format(path: t.Union[str, Path]) -> t.Union[t.Tuple[t.Type[ArchiveWriter], bool], None]:
+    """
+    Determine the format of an archive by its file name suffix, or `None` when it is not an archive.
+    """
+    name = Path(path).name.lower()
+    for suffix in sorted(FORMATS, key=len, reverse=True):
+        if name.endswith(suffix):
+            return FORMATS[suffix]
+    return None
+
+
+def open_archive(path: t.Union[str, Path], pretty: bool = False) -> ArchiveWriter:
+    """
+    Open an archive for writing many dashboards, selecting its format by file name suffix.
+    """
+    fmt = archive_format(path)
+    if fmt is None:
+        raise ValueError(f"Unsupported archive format: {path}. Use one of: {', '.join(FORMATS)}")
+    writer, compress = fmt
+    return writer(path, pretty=pretty, compress=compress)
+
+
+def read_archive(path: t.Union[str, Path]) -> t.Generator[ArchiveRecord, None, None]:
+    """
+    Read the records of an archive sequentially, without extracting it.
+
+    Only a single dashboard is held in memory at a time. Dashboards read from tar
+    archives carry the folder uid derived from their directory as metadata.
+    Other members of tar archives are ignored.
+    """
+    fmt = archive_format(path)
+    if fmt is None:
+        raise ValueError(f"Unsupported archive format: {path}. Use one of: {', '.join(FORMATS)}")
+    writer, compress = fmt
+
+    if writer is TarWriter:
+        with tarfile.open(path, mode="r|*") as tar:
+            for member in tar:
+                fp = tar.extractfile(member) if member.isfile() else None
+                if fp is None:
+                    continue
+                data = json.load(fp)
+                if member.name == FOLDERS_NAME:
+                    yield ArchiveRecord(FOLDERS, member.name, data)
+                elif member.name == MANIFEST_NAME:
+                    yield ArchiveRecord(MANIFEST, member.name, data)
+                elif member.name.startswith(DASHBOARDS_DIR + "/"):
+                    folder_uid = posixpath.dirname(member.name[len(DASHBOARDS_DIR) + 1 :])
+                    yield ArchiveRecord(DASHBOARD, member.name, data, {"folderUid": folder_uid} if folder_uid else {})
+        return
+
+    opener = gzip.open if compress else open
+    with opener(path, "rt", encoding="utf-8") as lines:
+        for line in lines:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            kind = record.pop("kind", DASHBOARD)
+            if kind == FOLDERS:
+                yield ArchiveRecord(FOLDERS, FOLDERS_NAME, record["folders"])
+            elif kind == MANIFEST:
+                yield ArchiveRecord(MANIFEST, MANIFEST_NAME, record)
+            else:
+                yield ArchiveRecord(DASHBOARD, record.get("name"), record["dashboard"], record.get("meta") or {})
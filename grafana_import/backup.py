@@ -0,0 +1,320 @@
+import json
+import logging
+import threading
+import typing as t
+from datetime import datetime, timezone
+from pathlib import Path
+
+from grafana_import.archive import DASHBOARD, FOLDERS, MANIFEST, ArchiveRecord, read_archive
+from grafana_import.bulk import BulkOutcome, run_bulk
+from grafana_import.grafana import Grafana
+from grafana_import.sync import dashboard_fingerprint
+from grafana_import.util import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+# Number of dashboards read from an archive ahead of uploading them, per worker thread.
+READ_AHEAD = 4
+
+# Name of the manifest file of incremental exports, within the exports directory.
+EXPORT_MANIFEST_NAME = ".grafana-import-manifest.json"
+
+# Name of the directory the files of deleted dashboards are moved to, within the exports directory.
+EXPORT_DELETED_DIR_NAME = ".deleted"
+
+
+def archive_folders(grafana: Grafana, boards: t.List[t.Dict[str, t.Any]]) -> t.List[t.Dict[str, t.Any]]:
+    """
+    Acquire the metadata of the folders containing the given dashboards, including their nested paths.
+
+    Grafana reports the parent folders of nested folders as `parents`, so the
+    path of each folder is computed without acquiring its parents one by one.
+    """
+    folders = []
+    for uid in dict.fromkeys(board["folderUid"] for board in boards if board.get("folderUid")):
+        folder = grafana.get_folder(folder_uid=uid)
+        if folder is None:
+            logger.warning(f"Folder not found: uid={uid}")
+            continue
+        titles = [parent["title"] for parent in folder.get("parents") or []] + [folder["title"]]
+        folders.append(
+            {
+                "uid": folder["uid"],
+                "title": folder["title"],
+                "parentUid": folder.get("parentUid"),
+                "path": "/".join(titles),
+            }
+        )
+    return folders
+
+
+def record_folder(record: ArchiveRecord, folders: t.Dict[str, t.Dict[str, t.Any]]) -> str:
+    """
+    Determine the folder a dashboard has been exported from, by path, by title, or `General`.
+    """
+    meta = record.meta or {}
+    folder = folders.get(meta.get("folderUid") or "")
+    if folder is not None:
+        return folder.get("path") or folder["title"]
+    return meta.get("folderTitle") or "General"
+
+
+def import_archive(
+    grafana: Grafana, path: t.Union[str, Path], jobs: int = 1, folder_name: t.Union[str, None] = None
+) -> t.List[BulkOutcome]:
+    """
+    Import all dashboards from an archive, streaming it, without extracting it to disk.
+
+    Dashboards are restored into the folders they have been exported from, which
+    are created up front, or into `folder_name`. Only a few dashboards per worker
+    thread are held in memory at a time. Outcomes are returned per dashboard
+    record. When the manifest lists more dashboards than the archive contains,
+    the archive is reported as incomplete.
+    """
+    folders: t.Dict[str, t.Dict[str, t.Any]] = {}
+    manifest = None
+    outcomes: t.List[BulkOutcome] = []
+    batch: t.List[ArchiveRecord] = []
+
+    if folder_name is not None:
+        grafana.ensure_folders([folder_name])
+
+    def upload(record: ArchiveRecord) -> str:
+        target = folder_name or record_folder(record, folders)
+        if not grafana.import_dashboard(record.data, folder_name=target):
+            raise IOError(f"Failed to import dashboard into Grafana. title={record.data['title']}, folder={target}")
+        return target
+
+    def flush() -> None:
+        outcomes.extend(run_bulk(upload, batch, jobs=jobs))
+        batch.clear()
+
+    grafana.get_dashboards()
+    for record in read_archive(path):
+        if record.kind == FOLDERS:
+            folders = {folder["uid"]: folder for folder in record.data}
+            if folder_name is None:
+                grafana.ensure_folders(folder.get("path") or folder["title"] for folder in record.data)
+        elif record.kind == MANIFEST:
+            manifest = record.data
+        elif record.kind == DASHBOARD:
+            batch.append(record)
+            if len(batch) >= jobs * READ_AHEAD:
+                flush()
+    flush()
+
+    if manifest is not None and len(manifest["dashboards"]) > len(outcomes):
+        logger.warning(
+            f"Archive is incomplete, it contains {len(outcomes)} of {len(manifest['dashboards'])} dashboards: {path}"
+        )
+    if grafana.sync_state is not None:
+        grafana.sync_state.save()
+    return outcomes
+
+
+class ExportManifest:
+    """
+    Remember the dashboards of the previous exports into a directory, by uid.
+
+    Each entry records the title, folder, version, content hash, and file name
+    of the most recently exported copy of a dashboard. Dashboards which have
+    been deleted on the server are moved to the `deleted` section, retaining
+    their last entry, and the time the deletion has been observed.
+
+    File names are relative to the directory of the manifest. Each file name
+    is claimed by a single dashboard, using `claim`, before writing it. Files
+    replaced by a file of another name, when a dashboard has been renamed or
+    moved to another folder, are remembered, to remove them with `prune`.
+    """
+
+    def __init__(self, path: t.Union[str, Path]):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.dashboards: t.Dict[str, t.Dict[str, t.Any]] = {}
+        self.deleted: t.Dict[str, t.Dict[str, t.Any]] = {}
+        self.replaced: t.Set[str] = set()
+        self.claimed: t.Dict[str, str] = {}
+        if self.path.exists():
+            try:
+                with open(self.path, "r") as f:
+                    data = json.load(f)
+                self.dashboards = data["dashboards"]
+                self.deleted = data["deleted"]
+            except (OSError, ValueError, KeyError, TypeError) as ex:
+                logger.warning(f"Reading export manifest failed, exporting all dashboards: {self.path}. Reason: {ex}")
+
+    def get(self, uid: str) -> t.Union[t.Dict[str, t.Any], None]:
+        return self.dashboards.get(uid)
+
+    def exists(self, entry: t.Dict[str, t.Any]) -> bool:
+        """
+        Check whether the file of a manifest entry is still present.
+        """
+        return (self.path.parent / entry["file"]).is_file()
+
+    def claim(self, uid: str, file: str) -> None:
+        """
+        Reserve a file name for a dashboard, refusing names used by another dashboard.
+        """
+        with self.lock:
+            owner = self.claimed.get(file)
+            if owner is None:
+                owner = next((key for key, entry in self.dashboards.items() if entry["file"] == file), None)
+            if owner is not None and owner != uid:
+                raise ValueError(f"File name {file} is already used by dashboard uid {owner}")
+            self.claimed[file] = uid
+
+    def set(self, uid: str, entry: t.Dict[str, t.Any]) -> None:
+        with self.lock:
+            previous = self.dashboards.get(uid)
+            if previous is not None and previous["file"] != entry["file"]:
+                self.replaced.add(previous["file"])
+            self.dashboards[uid] = entry
+            self.deleted.pop(uid, None)
+
+    def mark_deleted(self, uids: t.Iterable[str]) -> t.List[str]:
+        """
+        Move all dashboards not present in `uids` to the `deleted` section, returning their uids.
+        """
+        present = set(uids)
+        now = datetime.now(timezone.utc).isoformat()
+        with self.lock:
+            deleted = [uid for uid in self.dashboards if uid not in present]
+            for uid in deleted:
+                self.deleted[uid] = dict(self.dashboards.pop(uid), deleted=now)
+        return deleted
+
+    def prune(self, deleted: t.Iterable[str]) -> None:
+        """
+        Remove the files replaced by files of another name, and move the files of
+        the given deleted dashboards into the `.deleted` directory.
+
+        Files still referenced by another dashboard, which has taken over the
+        name of a renamed one, are retained.
+        """
+        directory = self.path.parent
+        with self.lock:
+            current = {entry["file"] for entry in self.dashboards.values()}
+            for name in sorted(self.replaced - current):
+                try:
+                    (directory / name).unlink()
+                except FileNotFoundError:
+                    pass
+            self.replaced.clear()
+            for uid in deleted:
+                entry = self.deleted[uid]
+                source = directory / entry["file"]
+                if entry["file"] in current or not source.exists():
+                    continue
+                target = Path(EXPORT_DELETED_DIR_NAME) / source.name
+                (directory / EXPORT_DELETED_DIR_NAME).mkdir(exist_ok=True)
+                source.replace(directory / target)
+                entry["file"] = target.as_posix()
+
+    def save(self) -> None:
+        with self.lock:
+            data = {"version": 1, "dashboards": self.dashboards, "deleted": self.deleted}
+            write_json_atomic(self.path, data, sort_keys=True, indent=2)
+
+
+def dashboard_version(grafana: Grafana, board: t.Dict[str, t.Any]) -> t.Union[int, None]:
+    """
+    Determine the current version of a dashboard, without fetching the dashboard itself.
+
+    The search API does not report versions, so the most recent entry of the
+    dashboard versions API is inquired, unless the search result carries it.
+    """
+    if board.get("version") is not None:
+        return board["version"]
+    # `get_dashboard_versions_by_uid` sends `limit` as request body, which Grafana ignores.
+    res = grafana.grafana_api.client.GET(f"/dashboards/uid/{board['uid']}/versions?limit=1")
+    # * Grafana 11 wraps the list of versions into an object.
+    versions = res.get("versions") if isinstance(res, dict) else res
+    if not versions:
+        return None
+    return versions[0]["version"]
+
+
+def export_incremental(
+    grafana: Grafana,
+    boards: t.List[t.Dict[str, t.Any]],
+    manifest: ExportManifest,
+    save: t.Callable[[t.Dict[str, t.Any], t.Dict[str, t.Any]], str],
+    jobs: int = 1,
+) -> t.Tuple[t.List[BulkOutcome], t.List[str]]:
+    """
+    Export only dashboards which are new, or whose version changed since the previous export.
+
+    The versions of all previously exported dashboards are probed concurrently,
+    using `jobs` worker threads. This costs one request per dashboard, unless
+    the search results carry versions. Only new or changed dashboards are
+    fetched, and passed to `save`, which returns the name of the file written,
+    after claiming it using `ExportManifest.claim`. When the content of a
+    fetched dashboard did not change, and its previous file is still present,
+    that file is retained, and it is reported as unchanged. When the file name
+    of a dashboard changed, its previous file is removed.
+
+    Dashboards of the manifest not present on the server anymore are recorded
+    as deleted, and their files are moved into the `.deleted` directory. The
+    manifest is saved even when exporting fails, retaining the entries of all
+    dashboards exported successfully.
+
+    Outcomes carry the file name of exported dashboards, and `None` for
+    unchanged dashboards. Also returns the uids of deleted dashboards.
+    """
+
+    def probe(board: t.Dict[str, t.Any]) -> t.Union[int, None]:
+        # New dashboards are fetched anyway.
+        if manifest.get(board["uid"]) is None:
+            return None
+        try:
+            return dashboard_version(grafana, board)
+        except Exception as ex:
+            logger.warning(f"Probing the version of dashboard '{board['title']}' failed, exporting it. Reason: {ex}")
+            return None
+
+    def export(item: t.Tuple[t.Dict[str, t.Any], t.Union[int, None]]) -> t.Union[str, None]:
+        board, version = item
+        entry = manifest.get(board["uid"])
+        if (
+            entry is not None
+            and version is not None
+            and entry["version"] == version
+            and entry["title"] == board["title"]
+            and entry["folderUid"] == board.get("folderUid")
+            and manifest.exists(entry)
+        ):
+            return None
+        dash = grafana.grafana_api.dashboard.get_dashboard(board["uid"])
+        digest = dashboard_fingerprint(dash["dashboard"], keep_uid=True)
+        unchanged = (
+            entry is not None
+            and entry["digest"] == digest
+            and entry["title"] == board["title"]
+            and entry["folderUid"] == board.get("folderUid")
+            and manifest.exists(entry)
+        )
+        file = entry["file"] if entry is not None and unchanged else save(board, dash)
+        manifest.set(
+            board["uid"],
+            {
+                "title": board["title"],
+                "folderUid": board.get("folderUid"),
+                "version": dash["dashboard"].get("version", version),
+                "digest": digest,
+                "file": file,
+            },
+        )
+        return None if unchanged else file
+
+    try:
+        versions = [outcome.result for outcome in run_bulk(probe, boards, jobs=jobs)]
+        outcomes = run_bulk(export, list(zip(boards, versions)), jobs=jobs)
+        outcomes = [
+            BulkOutcome(item=outcome.item[0], result=outcome.result, error=outcome.error) for outcome in outcomes
+        ]
+        deleted = manifest.mark_deleted(board["uid"] for board in grafana.get_dashboards())
+        manifest.prune(deleted)
+    finally:
+        manifest.save()
+    return outcomes, deleted
@@ -0,0 +1,479 @@
+import ast
+import contextlib
+import functools
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import re
+import runpy
+import subprocess
+import sys
+import threading
+import typing as t
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from grafana_import.bulk import BulkOutcome
+from grafana_import.util import read_dashboard_file, write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+# Dashboard builders which can be cached, by file suffix.
+CACHEABLE_SUFFIXES = [".jsonnet", ".py"]
+
+# Python packages contributing to the outcome of Python dashboard builders.
+PYTHON_BUILDER_PACKAGES = ["grafana-dashboard", "grafanalib"]
+
+JSONNET_IMPORT_PATTERN = re.compile(r"""\b(?:import|importstr|importbin)\s+(['"])(.+?)\1""")
+
+
+def jsonnet_jpath(path: Path) -> t.List[Path]:
+    """
+    Return the library search path for rendering a Jsonnet file.
+    """
+    return [path.parent / "vendor"]
+
+
+def resolve_jsonnet_import(base: Path, name: str, jpath: t.List[Path]) -> t.Union[Path, None]:
+    """
+    Resolve a Jsonnet import like the `jsonnet` program, relative to the importing file first.
+    """
+    for directory in [base.parent] + jpath:
+        candidate = directory / name
+        if candidate.is_file():
+            return candidate
+    return None
+
+
+def resolve_python_import(base: Path, module: str, level: int = 0, root: t.Union[Path, None] = None) -> t.List[Path]:
+    """
+    Resolve a Python import to local module files.
+
+    Relative imports are resolved against the package of the importing file.
+    Absolute imports are resolved against `root`, the directory of the dashboard
+    builder, which is the first entry of `sys.path` when rendering it, or the
+    directory of the importing file, when not given. Imports of modules which
+    are not located within that directory, like installed packages, are not
+    resolved.
+    """
+    if level == 0 and root is not None:
+        directory = root
+    else:
+        directory = base.parent
+        for _ in range(max(level - 1, 0)):
+            directory = directory.parent
+    parts = [part for part in module.split(".") if part]
+    candidates = []
+    for index in range(1, len(parts) + 1):
+        location = directory.joinpath(*parts[:index])
+        for candidate in [location.with_suffix(".py"), location / "__init__.py"]:
+            if candidate.is_file():
+                candidates.append(candidate)
+    if not parts and (directory / "__init__.py").is_file():
+        candidates.append(directory / "__init__.py")
+    return candidates
+
+
+def find_dependencies(path: t.Union[str, Path]) -> t.List[Path]:
+    """
+    Find all local files a dashboard builder file reads, recursively, including itself.
+
+    For Jsonnet files, these are the files referenced by `import`, `importstr`,
+    and `importbin` statements, also from the `vendor` library path. For Python
+    files, these are the modules imported from the same directory tree, where
+    absolute imports of all modules are resolved against the directory of the
+    dashboard builder file.
+    """
+    path = Path(path)
+    root = path.parent
+    jpath = jsonnet_jpath(path)
+    seen: t.Dict[Path, None] = {}
+    pending = [path]
+    while pending:
+        current = pending.pop()
+        if current in seen:
+            continue
+        seen[current] = None
+        try:
+            source = current.read_text(encoding="utf-8")
+        except (OSError, UnicodeDecodeError):
+            continue
+        if current.suffix in [".jsonnet", ".libsonnet"]:
+            for match in JSONNET_IMPORT_PATTERN.finditer(source):
+                resolved = resolve_jsonnet_import(current, match.group(2), jpath)
+                if resolved is not None:
+                    pending.append(resolved)
+        elif current.suffix == ".py":
+            try:
+                tree = ast.parse(source, filename=str(current))
+            except SyntaxError:
+                continue
+            for node in ast.walk(tree):
+                if isinstance(node, ast.Import):
+                    for alias in node.names:
+                        pending.extend(resolve_python_import(current, alias.name, root=root))
+                elif isinstance(node, ast.ImportFrom):
+                    pending.extend(resolve_python_import(current, node.module or "", node.level, root=root))
+                    for alias in node.names:
+                        name = f"{node.module}.{alias.name}" if node.module else alias.name
+                        pending.extend(resolve_python_import(current, name, node.level, root=root))
+    return list(seen)
+
+
+def dependencies_digest(path: Path, dependencies: t.Iterable[Path]) -> str:
+    """
+    Compute a content hash of a dashboard builder file, its dependencies, and the builder version.
+    """
+    digest = hashlib.sha256()
+    digest.update(builder_version(path.suffix).encode("utf-8"))
+    for dependency in sorted(dependencies):
+        digest.update(b"\0" + os.path.relpath(dependency, path.parent).encode("utf-8"))
+        try:
+            digest.update(b"\0" + dependency.read_bytes())
+        except OSError:
+            digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class DependencyGraph:
+    """
+    Track the local files each dashboard reads when rendering, and the dashboards depending on each file.
+
+    Dependencies are discovered from Jsonnet imports, and from imports of local
+    Python modules. The inputs of executable builder programs can not be
+    determined, so they are considered to depend on any file which is not a
+    dashboard itself.
+    """
+
+    def __init__(self, dashboards: t.Iterable[t.Union[str, Path]] = ()):
+        self.lock = threading.RLock()
+        # Dictionaries retain the order dashboards have been added in.
+        self.dependencies: t.Dict[Path, t.Set[Path]] = {}
+        self.dependents: t.Dict[Path, t.Dict[Path, None]] = {}
+        for dashboard in dashboards:
+            self.update(dashboard)
+
+    @staticmethod
+    def normalize(path: t.Union[str, Path]) -> Path:
+        return Path(os.path.normpath(Path(path).absolute()))
+
+    @staticmethod
+    def opaque(path: Path) -> bool:
+        return path.suffix not in [".json"] + CACHEABLE_SUFFIXES
+
+    def update(self, dashboard: t.Union[str, Path]) -> t.Set[Path]:
+        """
+        Discover the dependencies of a dashboard, replacing the previously recorded ones.
+        """
+        dashboard = self.normalize(dashboard)
+        dependencies = {self.normalize(path) for path in find_dependencies(dashboard)}
+        dependencies.add(dashboard)
+        with self.lock:
+            self.remove(dashboard)
+            self.dependencies[dashboard] = dependencies
+            for dependency in dependencies:
+                self.dependents.setdefault(dependency, {})[dashboard] = None
+        return dependencies
+
+    def remove(self, dashboard: t.Union[str, Path]) -> None:
+        dashboard = self.normalize(dashboard)
+        with self.lock:
+            for dependency in self.dependencies.pop(dashboard, set()):
+                dependents = self.dependents.get(dependency, {})
+                dependents.pop(dashboard, None)
+                if not dependents:
+                    self.dependents.pop(dependency, None)
+
+    def affected(self, paths: t.Iterable[t.Union[str, Path]]) -> t.List[Path]:
+        """
+        Return the dashboards affected by a set of changed files, in the order they have been added.
+        """
+        changed = {self.normalize(path) for path in paths}
+        with self.lock:
+            affected: t.Set[Path] = set()
+            for path in changed:
+                affected.update(self.dependents.get(path, {}))
+            if any(path not in self.dependencies for path in changed):
+                affected.update(dashboard for dashboard in self.dependencies if self.opaque(dashboard))
+            return [dashboard for dashboard in self.dependencies if dashboard in affected]
+
+    def digest(self, dashboard: t.Union[str, Path]) -> str:
+        """
+        Compute a content hash of a dashboard and all its dependencies.
+        """
+        dashboard = self.normalize(dashboard)
+        with self.lock:
+            dependencies = self.dependencies.get(dashboard)
+        if dependencies is None:
+            dependencies = self.update(dashboard)
+        return dependencies_digest(dashboard, dependencies)
+
+
+# Executing Python builders in-process modifies interpreter-global state, so serialize it.
+inprocess_lock = threading.Lock()
+
+
+class ThreadStdout:
+    """
+    Stand in for `sys.stdout`, routing output of capturing threads to their buffers, and other output to `stream`.
+
+    Other threads keep writing to `sys.stdout` while a dashboard builder is
+    executed in-process, for example the log output of bulk operations. Unlike
+    `contextlib.redirect_stdout`, their output does not end up in the buffer.
+    """
+
+    def __init__(self, stream: t.TextIO):
+        self.stream = stream
+        self.local = threading.local()
+
+    def __getattr__(self, name: str) -> t.Any:
+        return getattr(getattr(self.local, "buffer", None) or self.stream, name)
+
+    @contextlib.contextmanager
+    def capture(self) -> t.Generator[io.StringIO, None, None]:
+        self.local.buffer = io.StringIO()
+        try:
+            yield self.local.buffer
+        finally:
+            self.local.buffer = None
+
+
+def dashboard_to_dict(dashboard: t.Any) -> t.Dict[str, t.Any]:
+    """
+    Convert a dashboard object emitted by a Python dashboard builder to its JSON representation.
+
+    Supports dictionaries, `grafana-dashboard` models, and `grafanalib` objects.
+    """
+    if isinstance(dashboard, dict):
+        return dashboard
+    if hasattr(dashboard, "to_grafana_json"):
+        return json.loads(dashboard.to_grafana_json())
+    if hasattr(dashboard, "to_json_data"):
+        from grafanalib._gen import DashboardEncoder
+
+        return json.loads(json.dumps(dashboard.to_json_data(), cls=DashboardEncoder))
+    raise TypeError(f"Unable to convert dashboard object of type: {type(dashboard).__name__}")
+
+
+def render_python_inprocess(path: t.Union[str, Path]) -> t.Dict[str, t.Any]:
+    """
+    Render a Python dashboard builder within the running interpreter, without spawning a subprocess.
+
+    The program is executed as `__main__` in an isolated namespace. When it defines a
+    module-level `dashboard` variable, the dashboard object is converted directly.
+    Otherwise, the JSON representation it prints to STDOUT is used.
+
+    Builder libraries like `grafanalib` or `grafana-dashboard` stay imported across
+    invocations. Local helper modules are unloaded after each invocation, in order
+    to pick up changes, and to avoid clashes between modules of the same name.
+    """
+    path = Path(path).absolute()
+    with inprocess_lock:
+        modules_before = set(sys.modules)
+        saved_path = list(sys.path)
+        saved_argv = list(sys.argv)
+        sys.path.insert(0, str(path.parent))
+        sys.argv = [str(path)]
+        saved_stdout = sys.stdout
+        sys.stdout = proxy = ThreadStdout(saved_stdout)  # type: ignore[assignment]
+        try:
+            with proxy.capture() as stdout:
+                try:
+                    namespace = runpy.run_path(str(path), run_name="__main__")
+                except SystemExit as ex:
+                    if ex.code not in [None, 0]:
+                        raise RuntimeError(f"Dashboard builder exited with status {ex.code}: {path}") from ex
+                    namespace = {}
+        finally:
+            sys.path[:] = saved_path
+            sys.argv = saved_argv
+            if sys.stdout is proxy:
+                sys.stdout = saved_stdout
+            for name in set(sys.modules) - modules_before:
+                module_file = getattr(sys.modules[name], "__file__", None) or ""
+                if module_file.startswith(str(path.parent) + os.sep):
+                    del sys.modules[name]
+
+    if "dashboard" in namespace:
+        return dashboard_to_dict(namespace["dashboard"])
+    try:
+        return json.loads(stdout.getvalue())
+    except json.JSONDecodeError as ex:
+        raise IOError(f"Decoding JSON output from file failed: {path}. Reason: {ex}") from ex
+
+
+class JsonnetEvaluator:
+    """
+    Evaluate Jsonnet files within the running interpreter, using the `jsonnet` Python bindings.
+
+    Imported files are resolved like the `jsonnet` program does, relative to the
+    importing file first, then using the library search path. Their content is
+    kept in a cache shared across all evaluations, so library files like the
+    Grafonnet library are only read once per process. Cache entries are validated
+    by file modification time and size, so changes are picked up in watch mode.
+    """
+
+    def __init__(self) -> None:
+        import _jsonnet
+
+        self.jsonnet = _jsonnet
+        self.lock = threading.Lock()
+        self.imports: t.Dict[str, t.Tuple[int, int, bytes]] = {}
+
+    def read(self, filename: str) -> t.Union[bytes, None]:
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            return None
+        entry = self.imports.get(filename)
+        if entry is not None and entry[:2] == (stat.st_mtime_ns, stat.st_size):
+            return entry[2]
+        with open(filename, "rb") as f:
+            content = f.read()
+        with self.lock:
+            self.imports[filename] = (stat.st_mtime_ns, stat.st_size, content)
+        return content
+
+    def evaluate(self, path: t.Union[str, Path]) -> str:
+        """
+        Evaluate a Jsonnet file, and return its JSON output.
+        """
+        path = Path(path)
+        jpath = [str(directory) for directory in jsonnet_jpath(path)]
+
+        def import_callback(base: str, rel: str) -> t.Tuple[str, bytes]:
+            for directory in [base] + jpath:
+                filename = os.path.normpath(os.path.join(directory, rel))
+                content = self.read(filename)
+                if content is not None:
+                    return filename, content
+            raise RuntimeError(f"couldn't open import {rel!r}: no match locally or in the Jsonnet library paths")
+
+        return self.jsonnet.evaluate_file(str(path), jpathdir=jpath, import_callback=import_callback)
+
+
+@functools.lru_cache(maxsize=None)
+def jsonnet_evaluator() -> t.Union[JsonnetEvaluator, None]:
+    """
+    Return the shared Jsonnet evaluator, or `None` when the `jsonnet` Python bindings are not installed.
+    """
+    try:
+        return JsonnetEvaluator()
+    except ImportError:
+        logger.debug("Jsonnet Python bindings not installed, using the `jsonnet` program")
+        return None
+
+
+@functools.lru_cache(maxsize=None)
+def builder_version(suffix: str) -> str:
+    """
+    Identify the version of the dashboard builder toolchain for a file type.
+    """
+    if suffix == ".jsonnet":
+        try:
+            return subprocess.check_output(["jsonnet", "--version"], encoding="utf-8").strip()  # noqa: S603, S607
+        except (OSError, subprocess.CalledProcessError):
+            evaluator = jsonnet_evaluator()
+            return f"jsonnet-python {evaluator.jsonnet.version}" if evaluator is not None else "unknown"
+    if suffix == ".py":
+        versions = [sys.version]
+        try:
+            from importlib.metadata import PackageNotFoundError, version
+        except ImportError:  # pragma: no cover
+            return sys.version
+        for package in PYTHON_BUILDER_PACKAGES:
+            try:
+                versions.append(f"{package}=={version(package)}")
+            except PackageNotFoundError:
+                pass
+        return ";".join(versions)
+    return "unknown"
+
+
+class RenderCache:
+    """
+    Content-addressed cache of rendered dashboards, for Jsonnet and Python dashboard builders.
+
+    The cache key is computed from the content of the builder file, the content
+    of all local files it imports, and the version of the builder toolchain.
+    Executable builder programs are not cached, because their inputs can not be
+    determined.
+    """
+
+    def __init__(self, path: t.Union[str, Path]):
+        self.path = Path(path)
+
+    @staticmethod
+    def cacheable(path: Path) -> bool:
+        return path.suffix in CACHEABLE_SUFFIXES
+
+    def key(self, path: Path) -> str:
+        return dependencies_digest(path, find_dependencies(path))
+
+    def filename(self, key: str) -> Path:
+        return self.path / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> t.Union[t.Dict[str, t.Any], None]:
+        try:
+            with open(self.filename(key), "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as ex:
+            logger.warning(f"Reading rendered dashboard from cache failed: {key}. Reason: {ex}")
+            return None
+
+    def put(self, key: str, dashboard: t.Dict[str, t.Any]) -> None:
+        try:
+            write_json_atomic(self.filename(key), dashboard)
+        except OSError as ex:
+            logger.warning(f"Writing rendered dashboard to cache failed: {key}. Reason: {ex}")
+
+
+def render_dashboard_files(
+    paths: t.Iterable[t.Union[str, Path]],
+    jobs: t.Union[int, None] = None,
+    cache: t.Union[RenderCache, None] = None,
+    inprocess: bool = False,
+) -> t.List[BulkOutcome]:
+    """
+    Read and render many dashboard files, fanning out builder invocations to a pool of worker processes.
+
+    The pool is sized to the number of available CPU cores by default. Plain JSON
+    files do not need rendering, so they are read within the calling process.
+    Outcomes are returned in the order of the input paths.
+
+    With `inprocess`, Python builders are executed within the long-lived worker
+    processes, reusing builder libraries already imported by previous files.
+
+    Worker processes are spawned, not forked, because this function is also
+    invoked from worker threads of the watch mode, and forking a multi-threaded
+    process can deadlock on locks held by other threads.
+    """
+    paths = list(paths)
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    if jobs < 1:
+        raise ValueError(f"Invalid number of jobs: {jobs}")
+
+    def collect(path, func, *args) -> BulkOutcome:
+        try:
+            return BulkOutcome(item=path, result=func(*args))
+        except Exception as ex:
+            return BulkOutcome(item=path, error=ex)
+
+    builders = [path for path in paths if Path(path).suffix != ".json"]
+    if jobs == 1 or len(builders) <= 1:
+        return [collect(path, read_dashboard_file, path, cache, inprocess) for path in paths]
+
+    with ProcessPoolExecutor(
+        max_workers=min(jobs, len(builders)), mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        futures = {path: executor.submit(read_dashboard_file, path, cache, inprocess) for path in builders}
+        return [
+            collect(path, futures[path].result) if path in futures else collect(path, read_dashboard_file, path)
+            for path in paths
+        ]
@@ -0,0 +1,81 @@
+import asyncio
+import logging
+import typing as t
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class BulkOutcome(t.NamedTuple):
+    """
+    Outcome of processing a single item within a bulk operation.
+    """
+
+    item: t.Any
+    result: t.Any = None
+    error: t.Union[Exception, None] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def run_bulk(func: t.Callable[[t.Any], t.Any], items: t.Iterable[t.Any], jobs: int = 1) -> t.List[BulkOutcome]:
+    """
+    Invoke `func` for each item, using a pool of `jobs` worker threads.
+
+    Exceptions do not abort the operation, they are recorded on the outcome
+    of the corresponding item. Outcomes are returned in the order of the input
+    items, independently of their completion order.
+    """
+
+    def invoke(item: t.Any) -> BulkOutcome:
+        try:
+            return BulkOutcome(item=item, result=func(item))
+        except Exception as ex:
+            return BulkOutcome(item=item, error=ex)
+
+    if jobs < 1:
+        raise ValueError(f"Invalid number of jobs: {jobs}")
+
+    if jobs == 1:
+        return [invoke(item) for item in items]
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(invoke, items))
+
+
+async def run_bulk_async(
+    func: t.Callable[[t.Any], t.Awaitable[t.Any]], items: t.Iterable[t.Any], jobs: t.Union[int, None] = None
+) -> t.List[BulkOutcome]:
+    """
+    Await `func` for each item concurrently, with at most `jobs` invocations in flight.
+
+    Without `jobs`, all invocations are started at once. Like `run_bulk`,
+    exceptions are recorded on the outcome of the corresponding item, and
+    outcomes are returned in the order of the input items.
+    """
+
+    if jobs is not None and jobs < 1:
+        raise ValueError(f"Invalid number of jobs: {jobs}")
+
+    semaphore = asyncio.Semaphore(jobs) if jobs is not None else None
+
+    async def invoke(item: t.Any) -> BulkOutcome:
+        try:
+            if semaphore is None:
+                return BulkOutcome(item=item, result=await func(item))
+            async with semaphore:
+                return BulkOutcome(item=item, result=await func(item))
+        except Exception as ex:
+            return BulkOutcome(item=item, error=ex)
+
+    return list(await asyncio.gather(*[invoke(item) for item in items]))
+
+
+def bulk_summary(outcomes: t.List[BulkOutcome], verb: str) -> str:
+    """
+    Summarize the outcomes of a bulk operation in a single line.
+    """
+    failed = len([outcome for outcome in outcomes if not outcome.ok])
+    return f"Summary: {len(outcomes) - failed} of {len(outcomes)} dashboards {verb}, {failed} failed"
@@ -0,0 +1,477 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import typing as t
+from pathlib import Path
+
+from grafana_import.util import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+DashboardType = t.Dict[str, t.Any]
+FolderType = t.Dict[str, t.Any]
+
+
+class DashboardCatalog:
+    """
+    Index of dashboard search results, for constant-time lookups.
+
+    The catalog is built once from the result of the search API, and kept
+    up to date by the import and remove operations, instead of being
+    rebuilt from scratch.
+
+    Dashboards are indexed by uid, and by (folder, title), where the folder
+    is addressed by either its title or its uid. Dashboards stored in the
+    `General` folder do not carry any folder attributes, so they are indexed
+    using `None` as folder key.
+    """
+
+    def __init__(self, dashboards: t.Union[t.Iterable[DashboardType], None] = None):
+        self.by_uid: t.Dict[str, DashboardType] = {}
+        self.by_folder_title: t.Dict[t.Tuple[t.Union[str, None], str], DashboardType] = {}
+        self.by_folder_uid: t.Dict[t.Tuple[t.Union[str, None], str], DashboardType] = {}
+        self.by_title: t.Dict[str, t.List[DashboardType]] = {}
+        self.lock = threading.RLock()
+        # * loaded from the persistent cache, entries must be revalidated before use.
+        self.cached = False
+        self.validated: t.Set[str] = set()
+        if dashboards is not None:
+            self.update(dashboards)
+
+    def __len__(self) -> int:
+        return len(self.by_uid)
+
+    def __iter__(self) -> t.Iterator[DashboardType]:
+        with self.lock:
+            return iter(list(self.by_uid.values()))
+
+    def __contains__(self, uid: str) -> bool:
+        return uid in self.by_uid
+
+    def update(self, dashboards: t.Iterable[DashboardType]) -> None:
+        """
+        Add multiple dashboards to the catalog.
+        """
+        for dashboard in dashboards:
+            self.add(dashboard)
+
+    def add(self, dashboard: DashboardType) -> None:
+        """
+        Add a dashboard to the catalog, replacing an entry with the same uid.
+        """
+        uid = dashboard.get("uid")
+        title = dashboard["title"]
+        with self.lock:
+            if uid is not None and uid in self.by_uid:
+                self.remove(uid)
+            if uid is not None:
+                self.by_uid[uid] = dashboard
+            self.by_folder_title[(dashboard.get("folderTitle"), title)] = dashboard
+            self.by_folder_uid[(dashboard.get("folderUid"), title)] = dashboard
+            self.by_title.setdefault(title, []).append(dashboard)
+
+    def remove(self, uid: str) -> t.Union[DashboardType, None]:
+        """
+        Remove a dashboard from the catalog by uid, and return it.
+        """
+        with self.lock:
+            dashboard = self.by_uid.pop(uid, None)
+            if dashboard is None:
+                return None
+            title = dashboard["title"]
+            for index, key in (
+                (self.by_folder_title, (dashboard.get("folderTitle"), title)),
+                (self.by_folder_uid, (dashboard.get("folderUid"), title)),
+            ):
+                if index.get(key) is dashboard:
+                    del index[key]
+            candidates = [item for item in self.by_title.get(title, []) if item is not dashboard]
+            if candidates:
+                self.by_title[title] = candidates
+            else:
+                self.by_title.pop(title, None)
+            self.validated.discard(uid)
+            return dashboard
+
+    def get(self, uid: str) -> t.Union[DashboardType, None]:
+        """
+        Look up a dashboard by uid.
+        """
+        return self.by_uid.get(uid)
+
+    def find(
+        self,
+        title: str,
+        folder_title: t.Union[str, None] = None,
+        folder_uid: t.Union[str, None] = None,
+    ) -> t.Union[DashboardType, None]:
+        """
+        Look up a dashboard by title within a folder.
+
+        When the folder is omitted, the dashboard is looked up within the
+        `General` folder.
+        """
+        if folder_uid is not None:
+            return self.by_folder_uid.get((folder_uid, title))
+        return self.by_folder_title.get((folder_title, title))
+
+    def find_any(self, title: str) -> t.Union[DashboardType, None]:
+        """
+        Look up a dashboard by title, regardless of its folder.
+
+        When multiple dashboards share the same title, the most recently
+        added one is returned.
+        """
+        with self.lock:
+            candidates = self.by_title.get(title)
+            if not candidates:
+                return None
+            return candidates[-1]
+
+
+class FolderCatalog:
+    """
+    Index of Grafana folders, by uid, by title, and by nested path.
+
+    Nested folders are indexed by parent uid and title, so a path like
+    `Team/Services` resolves using a constant-time lookup per path component.
+    Top-level folders do not carry a parent uid, so they are indexed using
+    `None` as parent key.
+
+    The list of all folders is only acquired when needed. Before, the catalog
+    is populated lazily, folder by folder, which is signalled by `complete`.
+    The parent folders whose child folders have been acquired are recorded
+    in `listed`.
+    """
+
+    def __init__(self, folders: t.Union[t.Iterable[FolderType], None] = None, complete: bool = True):
+        self.by_uid: t.Dict[str, FolderType] = {}
+        self.by_title: t.Dict[str, FolderType] = {}
+        self.by_parent_title: t.Dict[t.Tuple[t.Union[str, None], str], FolderType] = {}
+        self.lock = threading.RLock()
+        self.complete = complete
+        self.listed: t.Set[str] = set()
+        # * loaded from the persistent cache, entries must be revalidated before use.
+        self.cached = False
+        self.validated: t.Set[str] = set()
+        if folders is not None:
+            self.update(folders)
+
+    def __len__(self) -> int:
+        return len(self.by_uid)
+
+    def __iter__(self) -> t.Iterator[FolderType]:
+        with self.lock:
+            return iter(list(self.by_uid.values()))
+
+    def update(self, folders: t.Iterable[FolderType]) -> None:
+        """
+        Add multiple folders to the catalog.
+        """
+        for folder in folders:
+            self.add(folder)
+
+    def add(self, folder: FolderType) -> None:
+        """
+        Add a folder to the catalog, replacing an entry with the same uid.
+        """
+        with self.lock:
+            previous = self.by_uid.get(folder["uid"])
+            if previous is not None:
+                if self.by_title.get(previous["title"]) is previous:
+                    del self.by_title[previous["title"]]
+                key = (previous.get("parentUid"), previous["title"])
+                if self.by_parent_title.get(key) is previous:
+                    del self.by_parent_title[key]
+            self.by_uid[folder["uid"]] = folder
+            # Retain the first folder for each title, like a linear scan would do.
+            self.by_title.setdefault(folder["title"], folder)
+            self.by_parent_title[(folder.get("parentUid"), folder["title"])] = folder
+
+    def get(self, uid: str) -> t.Union[FolderType, None]:
+        """
+        Look up a folder by uid.
+        """
+        return self.by_uid.get(uid)
+
+    def find(self, title: str) -> t.Union[FolderType, None]:
+        """
+        Look up a folder by title.
+        """
+        return self.by_title.get(title)
+
+    def find_child(self, parent_uid: t.Union[str, None], title: str) -> t.Union[FolderType, None]:
+        """
+        Look up a folder by title within its parent folder, or at the top level, when the parent is `None`.
+        """
+        return self.by_parent_title.get((parent_uid, title))
+
+    def find_path(self, path: str) -> t.Union[FolderType, None]:
+        """
+        Look up a folder by its nested path, like `Team/Services`.
+        """
+        folder = None
+        parent_uid = None
+        for title in folder_path(path):
+            folder = self.find_child(parent_uid, title)
+            if folder is None:
+                return None
+            parent_uid = folder["uid"]
+        return folder
+
+    def path(self, folder: FolderType) -> str:
+        """
+        Compute the nested path of a folder, as far as its parent folders are known.
+        """
+        titles = [folder["title"]]
+        seen = {folder["uid"]}
+        parent = self.by_uid.get(folder.get("parentUid") or "")
+        while parent is not None and parent["uid"] not in seen:
+            titles.insert(0, parent["title"])
+            seen.add(parent["uid"])
+            parent = self.by_uid.get(parent.get("parentUid") or "")
+        return "/".join(titles)
+
+
+def folder_path(name: str) -> t.List[str]:
+    """
+    Split a nested folder path, like `Team/Services`, into the titles of its folders.
+    """
+    return [title.strip() for title in name.split("/") if title.strip()]
+
+
+def dashboard_in_folder(dashboard: DashboardType, folder: t.Union[FolderType, None]) -> bool:
+    """
+    Check whether a dashboard search result is stored within a folder, or within `General`, when it is `None`.
+
+    Folders are compared by uid, because titles of nested folders are not unique.
+    Dashboards within the `General` folder do not carry any folder attributes.
+    """
+    if folder is None:
+        return not dashboard.get("folderUid") and not dashboard.get("folderId")
+    if dashboard.get("folderUid"):
+        return dashboard["folderUid"] == folder["uid"]
+    return dashboard.get("folderTitle") == folder["title"]
+
+
+def cache_key(url: str, credential: t.Any = None) -> str:
+    """
+    Compute the key of cache files for a Grafana URL and identity.
+    """
+    return hashlib.sha256(f"{url}|{credential!r}".encode("utf-8")).hexdigest()[:24]
+
+
+def default_cache_path() -> Path:
+    """
+    Return the default directory for persistent cache files.
+    """
+    return Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "grafana-import"
+
+
+class CatalogStore:
+    """
+    Persist catalogs of dashboards and folders on disk, with a time to live.
+
+    Cache files are keyed by Grafana URL and identity, so different servers,
+    or different users on the same server, never share cache entries. Both
+    the URL and the credential are only used as input to the hash, and are
+    never stored, because URLs may embed credentials.
+    """
+
+    def __init__(self, url: str, credential: t.Any = None, ttl: float = 0, path: t.Union[str, Path, None] = None):
+        self.ttl = float(ttl)
+        self.path = Path(path) if path is not None else default_cache_path()
+        self.key = cache_key(url, credential)
+
+    def filename(self, kind: str) -> Path:
+        return self.path / f"catalog-{self.key}-{kind}.json"
+
+    def load(self, kind: str) -> t.Union[t.List[t.Dict[str, t.Any]], None]:
+        """
+        Load cached catalog items, or return `None` when missing or expired.
+        """
+        filename = self.filename(kind)
+        try:
+            with open(filename, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as ex:
+            logger.warning(f"Reading cache file failed: {filename}. Reason: {ex}")
+            return None
+        # Valid JSON of another shape, like `null`, is treated as a cache miss, too.
+        if (
+            not isinstance(data, dict)
+            or not isinstance(data.get("items"), list)
+            or not isinstance(data.get("created"), (int, float))
+        ):
+            logger.warning(f"Reading cache file failed: {filename}. Reason: Invalid content")
+            return None
+        if data.get("key") != self.key or time.time() - data["created"] > self.ttl:
+            return None
+        return data["items"]
+
+    def save(self, kind: str, items: t.Iterable[t.Dict[str, t.Any]]) -> None:
+        """
+        Save catalog items atomically, so concurrent readers never see partial files.
+        """
+        filename = self.filename(kind)
+        data = {"key": self.key, "created": time.time(), "items": list(items)}
+        try:
+            write_json_atomic(filename, data)
+        except OSError as ex:
+            logger.warning(f"Writing cache file failed: {filename}. Reason: {ex}")
+
+
+class CatalogCache:
+    """
+    Thread-safe cache of the dashboard and folder catalogs of a single Grafana instance.
+
+    Catalogs are acquired on first use, either from the persistent cache, or
+    by invoking the loader functions. They can be refreshed or invalidated
+    explicitly, and are updated in place by the import and remove operations.
+
+    Without loader functions, catalogs are acquired by the owner, which passes
+    the items acquired from the server to `set_dashboards` and `set_folders`.
+    This way, the asynchronous Grafana class shares the same bookkeeping.
+    """
+
+    def __init__(
+        self,
+        load_dashboards: t.Union[t.Callable[[], t.Iterable[DashboardType]], None] = None,
+        load_folders: t.Union[t.Callable[[], t.Iterable[FolderType]], None] = None,
+        store: t.Union[CatalogStore, None] = None,
+    ):
+        self.load_dashboards = load_dashboards
+        self.load_folders = load_folders
+        self.store = store
+        self.lock = threading.RLock()
+        self._dashboards: t.Union[DashboardCatalog, None] = None
+        self._folders: t.Union[FolderCatalog, None] = None
+
+    @property
+    def dashboards(self) -> DashboardCatalog:
+        """
+        Return the catalog of all dashboards, acquiring it on first use.
+        """
+        catalog = self._dashboards
+        if catalog is not None:
+            return catalog
+        with self.lock:
+            catalog = self.cached_dashboards()
+            if catalog is None:
+                catalog = self.refresh_dashboards()
+            return catalog
+
+    @property
+    def folders(self) -> FolderCatalog:
+        """
+        Return the catalog of all folders, acquiring it on first use.
+        """
+        catalog = self._folders
+        if catalog is not None and catalog.complete:
+            return catalog
+        with self.lock:
+            catalog = self.cached_folders()
+            if catalog is None:
+                catalog = self.refresh_folders()
+            return catalog
+
+    @property
+    def folder_index(self) -> FolderCatalog:
+        """
+        Return the catalog of folders without acquiring the list of all folders, for lazy lookups.
+        """
+        catalog = self._folders
+        if catalog is not None:
+            return catalog
+        with self.lock:
+            if self._folders is None:
+                self._folders = FolderCatalog(complete=False)
+            return self._folders
+
+    def cached_dashboards(self) -> t.Union[DashboardCatalog, None]:
+        """
+        Return the catalog of all dashboards when acquired before, or from the persistent cache, or `None`.
+        """
+        with self.lock:
+            if self._dashboards is None and self.store is not None:
+                items = self.store.load("dashboards")
+                if items is not None:
+                    self.set_dashboards(items, cached=True)
+            return self._dashboards
+
+    def cached_folders(self) -> t.Union[FolderCatalog, None]:
+        """
+        Return the complete catalog of folders when acquired before, or from the persistent cache, or `None`.
+        """
+        with self.lock:
+            if self._folders is None or not self._folders.complete:
+                items = self.store.load("folders") if self.store is not None else None
+                if items is None:
+                    return None
+                self.set_folders(items, cached=True)
+            return self._folders
+
+    def set_dashboards(self, items: t.Iterable[DashboardType], cached: bool = False) -> DashboardCatalog:
+        """
+        Replace the catalog of all dashboards, saving it to the persistent cache, unless loaded from there.
+        """
+        with self.lock:
+            catalog = DashboardCatalog(items)
+            catalog.cached = cached
+            if self.store is not None and not cached:
+                self.store.save("dashboards", catalog)
+            self._dashboards = catalog
+            return catalog
+
+    def set_folders(self, items: t.Iterable[FolderType], cached: bool = False) -> FolderCatalog:
+        """
+        Replace the catalog of all folders, saving it to the persistent cache, unless loaded from there.
+        """
+        with self.lock:
+            catalog = FolderCatalog(items)
+            catalog.cached = cached
+            if self.store is not None and not cached:
+                self.store.save("folders", catalog)
+            # * retain folders acquired lazily before.
+            partial = self._folders
+            if partial is not None and not partial.complete:
+                catalog.update(folder for folder in partial if folder["uid"] not in catalog.by_uid)
+                catalog.validated |= partial.validated
+                catalog.listed |= partial.listed
+            self._folders = catalog
+            return catalog
+
+    def refresh_dashboards(self) -> DashboardCatalog:
+        """
+        Acquire the catalog of all dashboards from the server.
+        """
+        with self.lock:
+            return self.set_dashboards(t.cast(t.Callable[[], t.Iterable[DashboardType]], self.load_dashboards)())
+
+    def refresh_folders(self) -> FolderCatalog:
+        """
+        Acquire the catalog of all folders from the server.
+        """
+        with self.lock:
+            return self.set_folders(t.cast(t.Callable[[], t.Iterable[FolderType]], self.load_folders)())
+
+    def refresh(self) -> None:
+        """
+        Acquire both catalogs from the server.
+        """
+        with self.lock:
+            self.refresh_folders()
+            self.refresh_dashboards()
+
+    def invalidate(self) -> None:
+        """
+        Discard both catalogs, they will be acquired again on next use.
+        """
+        with self.lock:
+            self._dashboards = None
+            self._folders = None
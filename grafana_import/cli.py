@@ -14,6 +14,7 @@ import logging
 import os
 import re
 import sys
+import threading
 import traceback
 from datetime import datetime
 from pathlib import Path
@@ -21,51 +22,93 @@ from pathlib import Path
 import grafana_client.client as GrafanaApi
 
 import grafana_import.grafana as Grafana
+from grafana_import.archive import archive_format, open_archive
+from grafana_import.backup import (
+    EXPORT_MANIFEST_NAME,
+    ExportManifest,
+    archive_folders,
+    export_incremental,
+    import_archive,
+)
+from grafana_import.builder import DependencyGraph, RenderCache, render_dashboard_files
+from grafana_import.bulk import bulk_summary, run_bulk
+from grafana_import.catalog import default_cache_path
 from grafana_import.constants import CONFIG_NAME, PKG_NAME, PKG_VERSION
+from grafana_import.fanout import connect_instances, import_fanout
+from grafana_import.plan import apply_plan, plan_import
 from grafana_import.service import watchdog_service
 from grafana_import.util import (
+    grafana_labels,
     grafana_settings,
     load_yaml_config,
     read_dashboard_file,
     setup_logging,
+    write_json_atomic,
 )
 
 config = None
 
 
-def save_dashboard(config, args, base_path, dashboard_name, dashboard, action):
-
-    output_file = base_path
+def dashboard_file_name(config, dashboard_name, dashboard, suffix=True, qualify=False):
     file_name = dashboard_name
 
-    if "exports_path" in config["general"] and not re.search(r"^(\.|\/)?/", config["general"]["exports_path"]):
-        output_file = os.path.join(output_file, config["general"]["exports_path"])
-
-    if "export_suffix" in config["general"]:
+    if suffix and "export_suffix" in config["general"]:
         file_name += datetime.today().strftime(config["general"]["export_suffix"])
 
     if "meta" in dashboard and "folderId" in dashboard["meta"] and dashboard["meta"]["folderId"] != 0:
+        # Folder titles are not unique across nested folders, so qualify them by uid when requested.
+        if qualify and dashboard["meta"].get("folderUid"):
+            file_name = dashboard["meta"]["folderUid"] + "_" + file_name
         file_name = dashboard["meta"]["folderTitle"] + "_" + file_name
 
     file_name = Grafana.remove_accents_and_space(file_name)
     # Sanitize filename to prevent path traversal attacks
     file_name = file_name.replace("/", "_").replace("\\", "_").replace("..", "")
-    output_file = Path(output_file) / (file_name + ".json")
+    return file_name + ".json"
+
+
+def ambiguous_file_names(config, boards):
+    # Determine the uids of dashboards whose file names collide with dashboards of another folder.
+    folders = {}
+    for board in boards:
+        name = dashboard_file_name(config, board["title"], {"meta": board}, suffix=False)
+        folders.setdefault(name, {}).setdefault(board.get("folderUid"), []).append(board["uid"])
+    return {uid for by_folder in folders.values() if len(by_folder) > 1 for uids in by_folder.values() for uid in uids}
+
+
+def exports_dir(config, base_path):
+
+    exports_path = base_path
 
-    content = (
-        json.dumps(dashboard["dashboard"], sort_keys=True, indent=2)
-        if args.pretty
-        else json.dumps(dashboard["dashboard"])
+    if "exports_path" in config["general"] and not re.search(r"^(\.|\/)?/", config["general"]["exports_path"]):
+        exports_path = os.path.join(exports_path, config["general"]["exports_path"])
+
+    return Path(exports_path)
+
+
+def save_dashboard(config, args, base_path, dashboard_name, dashboard, action, suffix=True, qualify=False):
+
+    output_file = exports_dir(config, base_path) / dashboard_file_name(
+        config, dashboard_name, dashboard, suffix=suffix, qualify=qualify
     )
+
     try:
-        # Create directory structure if it doesn't exist
-        output_file.parent.mkdir(parents=True, exist_ok=True)
-        with open(output_file, "w") as output:
-            output.write(content)
+        # Serialize straight to a temporary file, and move it into place when complete.
+        write_json_atomic(
+            output_file, dashboard["dashboard"], **({"sort_keys": True, "indent": 2} if args.pretty else {})
+        )
     except OSError as e:
-        logger.error("File {0} error: {1}.".format(output_file, e.strerror))
-        sys.exit(2)
+        msg = "File {0} error: {1}.".format(output_file, e.strerror)
+        logger.error(msg)
+        raise IOError(msg) from e
     logger.info(f"OK: Dashboard '{dashboard_name}' {action} to: {output_file}")
+    return output_file
+
+
+def archive_dashboard(config, archive, dashboard_name, dashboard, action):
+    name = dashboard_file_name(config, dashboard_name, dashboard, suffix=False)
+    archive.add(name, dashboard["dashboard"], meta=dashboard.get("meta"))
+    logger.info(f"OK: Dashboard '{dashboard_name}' {action} to: {archive.path} ({name})")
 
 
 class myArgs:
@@ -80,6 +123,20 @@ class myArgs:
         "allow_new",
         "verbose",
         "keep_uid",
+        "jobs",
+        "cache_ttl",
+        "sync",
+        "render_cache",
+        "render_jobs",
+        "in_process",
+        "reload_delay",
+        "prune",
+        "regex",
+        "uid",
+        "dry_run",
+        "all_folders",
+        "archive",
+        "incremental",
     ]
 
     def __init__(self):
@@ -124,15 +181,53 @@ def main():
 
     parser.add_argument("-d", "--dashboard_name", help="name of dashboard to export.")
 
+    parser.add_argument(
+        "--pattern",
+        help="glob pattern of dashboard names to export or remove, e.g. '*' to select all dashboards. "
+        "Use together with `--grafana_folder` to export or remove a whole folder.",
+    )
+
+    parser.add_argument(
+        "--regex",
+        help="regular expression searched within dashboard names to export or remove.",
+    )
+
+    parser.add_argument(
+        "--uid",
+        help="comma-separated list of dashboard uids to export or remove.",
+    )
+
+    parser.add_argument(
+        "--dry_run",
+        action="store_true",
+        default=False,
+        help="when removing many dashboards, display the selected dashboards without removing them.",
+    )
+
+    parser.add_argument(
+        "--all_folders",
+        action="store_true",
+        default=False,
+        help="when exporting or removing many dashboards, select them from all folders, ignoring the "
+        "`grafana_folder` setting of the config file. Required to remove dashboards by `--pattern` "
+        "without selecting a folder.",
+    )
+
     parser.add_argument("-u", "--grafana_url", help="Grafana URL to connect to.", required=False)
 
     parser.add_argument(
         "-g",
         "--grafana_label",
-        help="label in the config file that represents the grafana to connect to.",
+        help="label in the config file that represents the grafana to connect to. "
+        "When importing, use a comma-separated list of labels or glob patterns, like 'prod-*', "
+        "to import into many Grafana instances at once.",
     )
 
-    parser.add_argument("-f", "--grafana_folder", help="the folder name where to import into Grafana.")
+    parser.add_argument(
+        "-f",
+        "--grafana_folder",
+        help="the folder name where to import into Grafana. Use `/` to separate the titles of nested folders.",
+    )
 
     parser.add_argument(
         "-i",
@@ -153,7 +248,16 @@ def main():
         "--reload",
         action="store_true",
         default=False,
-        help="Watch the input dashboard for changes on disk, and re-upload it, when changed.",
+        help="Watch the input dashboards and their directory trees for changes on disk, "
+        "and re-upload affected dashboards, when changed.",
+    )
+
+    parser.add_argument(
+        "--reload_delay",
+        type=float,
+        default=0.5,
+        help="when watching for changes, wait for this many seconds without further changes, "
+        "before re-uploading dashboards.",
     )
 
     parser.add_argument(
@@ -163,6 +267,22 @@ def main():
         help="use JSON indentation when exporting or extraction of dashboards.",
     )
 
+    parser.add_argument(
+        "--archive",
+        help="when exporting, write all dashboards and their folders into a single archive file instead of "
+        "individual files. The format is selected by file name suffix, one of `.ndjson`, `.jsonl`, or `.tar`, "
+        "optionally compressed using the `.gz` suffix, or `.tgz`. Use the archive with `--dashboard_file` "
+        "to import it again.",
+    )
+
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="when exporting many dashboards, only fetch dashboards which are new, or whose version changed "
+        "since the previous export into the same directory, tracked by a manifest file in that directory. "
+        "Dashboards deleted on the server are recorded in the manifest.",
+    )
+
     parser.add_argument(
         "-v",
         "--verbose",
@@ -182,11 +302,13 @@ def main():
         "action",
         metavar="ACTION",
         nargs="?",
-        choices=["import", "export", "remove"],
-        help="action to perform. Is one of 'export', 'import' (default), or 'remove'.\n"
+        choices=["import", "export", "remove", "plan", "apply"],
+        help="action to perform. Is one of 'export', 'import' (default), 'remove', 'plan', or 'apply'.\n"
         "export: lookup for dashboard name in Grafana and dump it to local file.\n"
         "import: import a local dashboard file (previously exported) to Grafana.\n"
-        "remove: lookup for dashboard name in Grafana and remove it from Grafana server.",
+        "remove: lookup for dashboard name in Grafana and remove it from Grafana server.\n"
+        "plan: compare local dashboard files with the Grafana folder, and display the changes.\n"
+        "apply: compare local dashboard files with the Grafana folder, and apply the changes.",
     )
 
     parser.add_argument(
@@ -197,6 +319,57 @@ def main():
         help="when importing dashboard, keep dashboard uid defined in the json file.",
     )
 
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of dashboards to process concurrently.",
+    )
+
+    parser.add_argument(
+        "--cache_ttl",
+        type=float,
+        help="cache the dashboards and folders lists on disk for the given number of seconds.",
+    )
+
+    parser.add_argument(
+        "-s",
+        "--sync",
+        action="store_true",
+        default=False,
+        help="when importing dashboards, skip uploading dashboards whose content did not change.",
+    )
+
+    parser.add_argument(
+        "--render_cache",
+        action="store_true",
+        default=False,
+        help="cache dashboards rendered by Jsonnet and Python builders, and skip rendering unchanged files.",
+    )
+
+    parser.add_argument(
+        "--render_jobs",
+        type=int,
+        help="number of worker processes for rendering dashboards when using `--jobs`. "
+        "The default is the number of CPU cores.",
+    )
+
+    parser.add_argument(
+        "--in_process",
+        action="store_true",
+        default=False,
+        help="render Python and Jsonnet dashboard builders within the running interpreter, instead of "
+        "spawning a new process for each file. Jsonnet requires the `jsonnet` Python package.",
+    )
+
+    parser.add_argument(
+        "--prune",
+        action="store_true",
+        default=False,
+        help="with 'plan' and 'apply', remove dashboards from the Grafana folder which are not present locally.",
+    )
+
     inArgs = myArgs()
     args = parser.parse_args(namespace=inArgs)
 
@@ -232,40 +405,84 @@ def main():
     if args.dashboard_name is not None:
         config["general"]["dashboard_name"] = args.dashboard_name
 
-    if args.action == "export" and (
-        "dashboard_name" not in config["general"] or config["general"]["dashboard_name"] is None
+    select_many = args.pattern is not None or args.regex is not None or args.uid is not None
+    if (
+        args.action == "export"
+        and not select_many
+        and ("dashboard_name" not in config["general"] or config["general"]["dashboard_name"] is None)
     ):
         logger.error("ERROR: no dashboard has been specified.")
         sys.exit(1)
 
+    if args.incremental and (args.action != "export" or not select_many or args.archive is not None):
+        logger.error("ERROR: --incremental requires exporting many dashboards into a directory, not an archive.")
+        sys.exit(1)
+
     config["check_folder"] = False
     if args.grafana_folder is not None:
         config["general"]["grafana_folder"] = args.grafana_folder
         config["check_folder"] = True
 
+    if args.all_folders and args.grafana_folder is not None:
+        logger.error("ERROR: --all_folders can not be used together with --grafana_folder.")
+        sys.exit(1)
+    if (
+        args.action == "remove"
+        and args.pattern is not None
+        and not args.all_folders
+        and config["general"].get("grafana_folder") is None
+    ):
+        logger.error("ERROR: Removing dashboards by --pattern requires --grafana_folder, or --all_folders.")
+        sys.exit(1)
+
     if "export_suffix" not in config["general"] or config["general"]["export_suffix"] is None:
         config["general"]["export_suffix"] = "_%Y%m%d%H%M%S"
 
     if args.keep_uid is None:
         args.keep_uid = False
 
-    params = grafana_settings(url=args.grafana_url, config=config, label=args.grafana_label)
-    params.update(
-        {
-            "overwrite": args.overwrite,
-            "allow_new": args.allow_new,
-            "keep_uid": args.keep_uid,
-        }
-    )
+    if args.jobs is None:
+        args.jobs = 1
+    if args.jobs < 1 or (args.render_jobs is not None and args.render_jobs < 1):
+        logger.error(f"ERROR: invalid number of jobs: {args.jobs}, {args.render_jobs}")
+        sys.exit(1)
 
-    try:
-        grafana_api = Grafana.Grafana(**params)
-    except Exception as ex:
-        logger.error(str(ex))
+    # Resolve connection profiles, multiple labels select fan-out mode.
+    labels = [args.grafana_label]
+    if args.grafana_label is not None and args.grafana_url is None and "GRAFANA_URL" not in os.environ:
+        try:
+            labels = grafana_labels(config, args.grafana_label)
+        except ValueError as ex:
+            logger.error(str(ex))
+            sys.exit(1)
+    fanout = len(labels) > 1
+    if fanout and args.action != "import":
+        logger.error(f"ERROR: Multiple Grafana instances are only supported when importing: {', '.join(labels)}")
         sys.exit(1)
 
+    def instance_settings(label):
+        params = grafana_settings(url=args.grafana_url, config=config, label=label)
+        if args.cache_ttl is not None:
+            params["cache_ttl"] = args.cache_ttl
+        params.update(
+            {
+                "overwrite": args.overwrite,
+                "allow_new": args.allow_new,
+                "keep_uid": args.keep_uid,
+                "sync": bool(args.sync) or args.action in ("plan", "apply"),
+            }
+        )
+        return params
+
+    if not fanout:
+        try:
+            grafana_api = Grafana.Grafana(**instance_settings(labels[0]))
+        except Exception as ex:
+            logger.error(str(ex))
+            sys.exit(1)
+
     # Import
-    if args.action == "import":
+    if args.action in ("import", "plan", "apply"):
         if args.dashboard_file is None:
             logger.error("ERROR: no file to import provided!")
             sys.exit(1)
@@ -292,18 +509,94 @@ def main():
                 import_files = [
                     os.path.join(import_file, f)
                     for f in os.listdir(import_file)
-                    if os.path.isfile(os.path.join(import_file, f))
+                    if os.path.isfile(os.path.join(import_file, f)) and f != EXPORT_MANIFEST_NAME
                 ]
                 logger.info(f"Found the following files: '{import_files}' in dir '{import_file}'")
 
-        def process_dashboard(file_path):
+        render_cache = RenderCache(default_cache_path() / "render") if args.render_cache else None
+
+        # Archive mode: Stream dashboards from a single archive file, restoring them into their folders.
+        if args.action == "import" and len(import_files) == 1 and archive_format(import_files[0]) is not None:
+            if fanout:
+                logger.error("ERROR: Importing archives into multiple Grafana instances is not supported")
+                sys.exit(1)
+            folder_name = config["general"]["grafana_folder"] if config["check_folder"] else None
+            try:
+                outcomes = import_archive(grafana_api, import_files[0], jobs=args.jobs, folder_name=folder_name)
+            except Exception as ex:
+                logger.error(f"Failed to import archive: {import_files[0]}. Reason: {ex}")
+                sys.exit(1)
+            for outcome in outcomes:
+                if outcome.ok:
+                    logger.info(f"OK: Dashboard '{outcome.item.name}' imported into folder '{outcome.result}'")
+                else:
+                    logger.error(f"KO: Dashboard '{outcome.item.name}' import failed. Reason: {outcome.error}")
+            logger.info(bulk_summary(outcomes, "imported"))
+            sys.exit(0 if all(outcome.ok for outcome in outcomes) else 1)
+
+        # Plan mode: Compare the rendered dashboards with the destination folder, and apply the differences.
+        if args.action in ("plan", "apply"):
+            rendered = render_dashboard_files(
+                import_files, jobs=args.render_jobs, cache=render_cache, inprocess=bool(args.in_process)
+            )
+            try:
+                plan = plan_import(grafana_api, rendered, prune=bool(args.prune), jobs=args.jobs)
+            except Exception as ex:
+                logger.error(f"Failed to plan import into folder '{grafana_api.grafana_folder}'. Reason: {ex}")
+                sys.exit(1)
+            print(plan.format())
+            if args.action == "plan":
+                sys.exit(1 if plan.errors else 0)
+            outcomes = apply_plan(grafana_api, plan, jobs=args.jobs)
+            if outcomes:
+                logger.info(bulk_summary(outcomes, "applied"))
+            sys.exit(0 if not plan.errors and all(outcome.ok for outcome in outcomes) else 1)
+
+        # Fan-out mode: Render dashboards once, and import them into many Grafana instances concurrently.
+        if fanout:
+            instances, errors = connect_instances(labels, lambda label: Grafana.Grafana(**instance_settings(label)))
+
+            def import_many(file_paths):
+                rendered = render_dashboard_files(
+                    file_paths, jobs=args.render_jobs, cache=render_cache, inprocess=bool(args.in_process)
+                )
+                report = import_fanout(instances, rendered, jobs=args.jobs, errors=errors)
+                for label in report.labels:
+                    logger.info(report.summary(label))
+                print(report.matrix())
+                return report
+
+            report = import_many(import_files)
+            if args.reload:
+                watchdog_service(import_files, lambda file_path: import_many([file_path]), delay=args.reload_delay)
+            sys.exit(0 if report.ok else 1)
+
+        def load_dashboard(file_path):
             try:
-                dash = read_dashboard_file(file_path)
+                return read_dashboard_file(file_path, cache=render_cache, inprocess=bool(args.in_process))
             except Exception as ex:
                 msg = f"Failed to load dashboard from: {file_path}. Reason: {ex}"
                 logger.exception(msg)
                 raise IOError(msg) from ex
 
+        # Ensure the destination folder exists once, when uploading the first dashboard which loaded successfully.
+        prepare_lock = threading.Lock()
+        prepared = threading.Event()
+
+        def prepare_folders():
+            with prepare_lock:
+                if prepared.is_set():
+                    return
+                try:
+                    grafana_api.ensure_folders([grafana_api.grafana_folder])
+                except Exception as ex:
+                    msg = f"Failed to prepare import into folder '{grafana_api.grafana_folder}'. Reason: {ex}"
+                    logger.error(msg)
+                    raise IOError(msg) from ex
+                prepared.set()
+
+        def upload_dashboard(dash):
+            prepare_folders()
             try:
                 res = grafana_api.import_dashboard(dash)
             except GrafanaApi.GrafanaClientError as ex:
@@ -320,25 +613,167 @@ def main():
                 logger.error(msg)
                 raise IOError(msg)
 
-        for file in import_files:
-            print(f"Processing file: {file}")
+        # Sync mode: Skip rendering dashboards whose files and dependencies did not change.
+        graph = DependencyGraph(import_files) if grafana_api.sync_state is not None else None
+
+        def sources_digest(file_path):
+            if graph is None:
+                return None
+            return graph.digest(file_path)
+
+        def sources_unchanged(file_path, digest):
+            if digest is None:
+                return False
+            source = grafana_api.sync_state.get_source(file_path, grafana_api.grafana_folder)
+            if source is None or source["digest"] != digest or grafana_api.find_dashboard(source["title"]) is None:
+                return False
+            logger.info(f"Dashboard file '{file_path}' and its dependencies are unchanged, skipping")
+            return True
+
+        def remember_sources(file_path, digest, dash):
+            if digest is not None:
+                grafana_api.sync_state.set_source(file_path, grafana_api.grafana_folder, digest, dash["title"])
+
+        def process_dashboard(file_path):
+            digest = sources_digest(file_path)
+            if sources_unchanged(file_path, digest):
+                return
+            dash = load_dashboard(file_path)
+            upload_dashboard(dash)
+            remember_sources(file_path, digest, dash)
+
+        def reload_dashboard(file_path):
+            process_dashboard(file_path)
+            if grafana_api.sync_state is not None:
+                grafana_api.sync_state.save()
+
+        def process_file(file_path, process=process_dashboard):
+            print(f"Processing file: {file_path}")
             try:
-                process_dashboard(file)
+                process(file_path)
             except Exception as e:
-                logger.error(f"Failed to process file {file}. Reason: {str(e)}")
-                continue
+                logger.error(f"Failed to process file {file_path}. Reason: {str(e)}")
+                raise
+
+        # Acquire the catalog before importing the batch.
+        try:
+            grafana_api.get_dashboards()
+        except Exception as ex:
+            logger.error(f"Failed to prepare import into folder '{grafana_api.grafana_folder}'. Reason: {ex}")
+            sys.exit(1)
+
+        if args.jobs > 1:
+            digests = {file_path: sources_digest(file_path) for file_path in import_files}
+            pending = [file_path for file_path in import_files if not sources_unchanged(file_path, digests[file_path])]
+
+            # Render stage: Fan out builder invocations to a pool of worker processes.
+            rendered = {
+                outcome.item: outcome
+                for outcome in render_dashboard_files(
+                    pending, jobs=args.render_jobs, cache=render_cache, inprocess=bool(args.in_process)
+                )
+            }
+
+            # Upload stage: Upload rendered dashboards using a pool of worker threads.
+            def upload_rendered(file_path):
+                if file_path not in rendered:
+                    return
+                outcome = rendered[file_path]
+                if not outcome.ok:
+                    msg = f"Failed to load dashboard from: {file_path}. Reason: {outcome.error}"
+                    logger.error(msg)
+                    raise IOError(msg) from outcome.error
+                upload_dashboard(outcome.result)
+                remember_sources(file_path, digests[file_path], outcome.result)
+
+            outcomes = run_bulk(lambda file_path: process_file(file_path, upload_rendered), import_files, args.jobs)
+        else:
+            outcomes = run_bulk(process_file, import_files)
+
+        if len(outcomes) > 1:
+            logger.info(bulk_summary(outcomes, "imported"))
+        if grafana_api.sync_state is not None:
+            grafana_api.sync_state.save()
 
         if args.reload:
-            for file in import_files:
-                watchdog_service(import_file, process_dashboard(file))
+            watchdog_service(import_files, reload_dashboard, delay=args.reload_delay, graph=graph)
+
+        sys.exit(0 if all(outcome.ok for outcome in outcomes) else 1)
+
+    # Write exported dashboards into a single archive file, when requested.
+    def open_export_archive(boards):
+        if args.archive is None:
+            return None
+        try:
+            archive = open_archive(os.path.join(base_path, args.archive), pretty=bool(args.pretty))
+        except (ValueError, OSError) as ex:
+            logger.error(f"ERROR: Failed to open archive. Reason: {ex}")
+            sys.exit(2)
+        try:
+            archive.add_folders(archive_folders(grafana_api, boards))
+        except Exception as ex:
+            archive.close(type(ex), ex, ex.__traceback__)
+            logger.error(f"ERROR: Failed to acquire folders. Reason: {ex}")
+            sys.exit(1)
+        return archive
 
-        sys.exit(0)
+    # Select many dashboards from a single catalog snapshot, by folder, title pattern, title regex, or uid.
+    # The folder is also taken from the config file, like when addressing a single dashboard.
+    def select_boards():
+        folder_name = None if args.all_folders else config["general"].get("grafana_folder")
+        uids = [uid.strip() for uid in args.uid.split(",") if uid.strip()] if args.uid is not None else None
+        try:
+            boards = grafana_api.select_dashboards(
+                args.pattern or "*", folder_name=folder_name, regex=args.regex, uids=uids
+            )
+        except Grafana.GrafanaFolderNotFoundError as exp:
+            logger.info(f"KO: Folder not found: {exp.folder}")
+            sys.exit(1)
+        except GrafanaApi.GrafanaUnauthorizedError:
+            logger.error("KO: Unauthorized - check your Grafana credentials or token.")
+            sys.exit(1)
+        except re.error as exp:
+            logger.error(f"ERROR: Invalid regular expression: {args.regex}. Reason: {exp}")
+            sys.exit(1)
+        missing = [uid for uid in uids or [] if uid not in {board["uid"] for board in boards}]
+        for uid in missing:
+            logger.info(f"KO: Dashboard not found: uid={uid}")
+        if not boards:
+            criteria = [args.pattern, args.regex and f"regex={args.regex}", args.uid and f"uid={args.uid}"]
+            logger.info(f"KO: No dashboards found matching: {', '.join(filter(None, criteria))}")
+            sys.exit(1)
+        return boards, missing
+
+    # Remove many
+    if args.action == "remove" and select_many:
+        boards, missing = select_boards()
+
+        if args.dry_run:
+            for board in boards:
+                folder_title = board.get("folderTitle") or "General"
+                print(f"Would remove dashboard '{board['title']}' from folder '{folder_title}' (uid: {board['uid']})")
+            logger.info(f"Dry run: {len(boards)} dashboards would be removed")
+            sys.exit(0 if not missing else 1)
+
+        outcomes = grafana_api.remove_dashboards(boards, jobs=args.jobs)
+        for outcome in outcomes:
+            board = outcome.item
+            if outcome.ok:
+                logger.info(f"OK: Dashboard '{board['title']}' removed (uid: {board['uid']})")
+            else:
+                logger.error(f"KO: Dashboard '{board['title']}' remove failed. Reason: {outcome.error}")
+        if grafana_api.sync_state is not None:
+            grafana_api.sync_state.save()
+        logger.info(bulk_summary(outcomes, "removed"))
+        sys.exit(0 if not missing and all(outcome.ok for outcome in outcomes) else 1)
 
     # Remove
     elif args.action == "remove":
         dashboard_name = config["general"]["dashboard_name"]
         try:
             grafana_api.remove_dashboard(dashboard_name)
+            if grafana_api.sync_state is not None:
+                grafana_api.sync_state.save()
             logger.info(f"OK: Dashboard removed: {dashboard_name}")
             sys.exit(0)
         except Grafana.GrafanaDashboardNotFoundError as exp:
@@ -357,6 +792,61 @@ def main():
             logger.info("ERROR: Dashboard '{0}' remove exception '{1}'".format(dashboard_name, traceback.format_exc()))
             sys.exit(1)
 
+    # Export many
+    elif args.action == "export" and select_many and args.incremental:
+        boards, missing = select_boards()
+
+        manifest = ExportManifest(exports_dir(config, base_path) / EXPORT_MANIFEST_NAME)
+        ambiguous = ambiguous_file_names(config, boards)
+
+        def save_board(board, dash):
+            # Use stable file names, so each export replaces the previous copy of a dashboard.
+            qualify = board["uid"] in ambiguous
+            manifest.claim(
+                board["uid"], dashboard_file_name(config, board["title"], dash, suffix=False, qualify=qualify)
+            )
+            output_file = save_dashboard(
+                config, args, base_path, board["title"], dash, "exported", suffix=False, qualify=qualify
+            )
+            return output_file.name
+
+        outcomes, deleted = export_incremental(grafana_api, boards, manifest, save_board, jobs=args.jobs)
+        for outcome in outcomes:
+            if not outcome.ok:
+                logger.error(f"KO: Dashboard '{outcome.item['title']}' export failed. Reason: {outcome.error}")
+        for uid in deleted:
+            logger.info(f"Dashboard '{manifest.deleted[uid]['title']}' has been deleted (uid: {uid})")
+        changed = len([outcome for outcome in outcomes if outcome.ok and outcome.result is not None])
+        unchanged = len([outcome for outcome in outcomes if outcome.ok and outcome.result is None])
+        logger.info(f"Incremental export: {changed} changed, {unchanged} unchanged, {len(deleted)} deleted")
+        logger.info(bulk_summary(outcomes, "exported"))
+        sys.exit(0 if not missing and all(outcome.ok for outcome in outcomes) else 1)
+
+    elif args.action == "export" and select_many:
+        boards, missing = select_boards()
+
+        archive = open_export_archive(boards)
+        ambiguous = ambiguous_file_names(config, boards)
+
+        def export_board(board):
+            try:
+                dash = grafana_api.grafana_api.dashboard.get_dashboard(board["uid"])
+            except Exception as ex:
+                logger.error(f"KO: Dashboard '{board['title']}' export failed. Reason: {ex}")
+                raise
+            if archive is not None:
+                archive_dashboard(config, archive, board["title"], dash, "exported")
+            else:
+                save_dashboard(
+                    config, args, base_path, board["title"], dash, "exported", qualify=board["uid"] in ambiguous
+                )
+
+        outcomes = run_bulk(export_board, boards, jobs=args.jobs)
+        if archive is not None:
+            archive.close()
+        logger.info(bulk_summary(outcomes, "exported"))
+        sys.exit(0 if not missing and all(outcome.ok for outcome in outcomes) else 1)
+
     # Export
     elif args.action == "export":
         dashboard_name = config["general"]["dashboard_name"]
@@ -376,11 +866,20 @@ def main():
             sys.exit(1)
 
         if dash is not None:
-            save_dashboard(config, args, base_path, dashboard_name, dash, "exported")
+            archive = open_export_archive([dash.get("meta") or {}])
+            if archive is not None:
+                with archive:
+                    archive_dashboard(config, archive, dashboard_name, dash, "exported")
+            else:
+                try:
+                    save_dashboard(config, args, base_path, dashboard_name, dash, "exported")
+                except IOError:
+                    sys.exit(2)
             sys.exit(0)
 
     else:
-        logger.error(f"Unknown action: {args.action}. Use one of: {parser._actions[-2].choices}")
+        choices = [action.choices for action in parser._actions if action.dest == "action"][0]
+        logger.error(f"Unknown action: {args.action}. Use one of: {choices}")
         print_help_and_exit()
 
 
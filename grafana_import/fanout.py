@@ -0,0 +1,118 @@
+import copy
+import logging
+import typing as t
+from pathlib import Path
+
+from grafana_import.bulk import BulkOutcome, bulk_summary, run_bulk
+from grafana_import.grafana import Grafana
+
+logger = logging.getLogger(__name__)
+
+
+class FanoutReport:
+    """
+    Outcomes of importing dashboards into many Grafana instances, by instance label, and by dashboard file.
+    """
+
+    def __init__(self, labels: t.List[str], files: t.List[str]):
+        self.labels = labels
+        self.files = files
+        self.outcomes: t.Dict[str, t.Dict[str, BulkOutcome]] = {label: {} for label in labels}
+
+    def record(self, label: str, outcome: BulkOutcome) -> None:
+        self.outcomes[label][outcome.item] = outcome
+
+    def fail(self, label: str, error: Exception) -> None:
+        """
+        Record an error for all dashboards of an instance, for example when connecting failed.
+        """
+        for file in self.files:
+            self.record(label, BulkOutcome(item=file, error=error))
+
+    @property
+    def ok(self) -> bool:
+        return all(outcome.ok for outcomes in self.outcomes.values() for outcome in outcomes.values())
+
+    def summary(self, label: str) -> str:
+        return f"{label}: " + bulk_summary(list(self.outcomes[label].values()), "imported")
+
+    def matrix(self) -> str:
+        """
+        Render the outcomes as a text table, with a row per instance, and a column per dashboard file.
+        """
+        header = ["instance"] + [Path(file).name for file in self.files] + ["imported", "failed"]
+        rows = [header]
+        for label in self.labels:
+            outcomes = [self.outcomes[label].get(file) for file in self.files]
+            cells = ["-" if outcome is None else "ok" if outcome.ok else "FAILED" for outcome in outcomes]
+            imported = len([cell for cell in cells if cell == "ok"])
+            failed = len([cell for cell in cells if cell == "FAILED"])
+            rows.append([label] + cells + [str(imported), str(failed)])
+        widths = [max(len(row[column]) for row in rows) for column in range(len(header))]
+        return "\n".join("  ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip() for row in rows)
+
+
+def connect_instances(
+    labels: t.List[str], factory: t.Callable[[str], Grafana]
+) -> t.Tuple[t.Dict[str, Grafana], t.Dict[str, Exception]]:
+    """
+    Connect to many Grafana instances concurrently, returning the connected instances, and the errors, by label.
+    """
+    outcomes = run_bulk(factory, labels, jobs=max(1, len(labels)))
+    instances = {outcome.item: outcome.result for outcome in outcomes if outcome.ok}
+    errors = {outcome.item: t.cast(Exception, outcome.error) for outcome in outcomes if not outcome.ok}
+    for label, error in errors.items():
+        logger.error(f"Failed to connect to Grafana instance '{label}'. Reason: {error}")
+    return instances, errors
+
+
+def import_fanout(
+    instances: t.Dict[str, Grafana],
+    rendered: t.List[BulkOutcome],
+    jobs: int = 1,
+    errors: t.Union[t.Dict[str, Exception], None] = None,
+) -> FanoutReport:
+    """
+    Import rendered dashboards into many Grafana instances.
+
+    Dashboards are rendered once by the caller, and uploaded to all instances
+    concurrently, using a worker thread per instance. Within each instance, `jobs`
+    dashboards are uploaded concurrently. Each instance receives its own copy of
+    the dashboards, because importing adjusts their uid and version.
+
+    Instances which could not be connected to are passed as `errors`, and are
+    reported as failed for all dashboards.
+    """
+    errors = errors or {}
+    report = FanoutReport(labels=list(instances) + list(errors), files=[outcome.item for outcome in rendered])
+    for label, error in errors.items():
+        report.fail(label, error)
+
+    def upload(grafana: Grafana, outcome: BulkOutcome) -> None:
+        if not outcome.ok:
+            raise IOError(f"Failed to load dashboard from: {outcome.item}. Reason: {outcome.error}")
+        dashboard = copy.deepcopy(outcome.result)
+        if not grafana.import_dashboard(dashboard):
+            raise IOError(f"Failed to import dashboard into Grafana. title={dashboard['title']}")
+
+    def import_instance(label: str) -> None:
+        grafana = instances[label]
+        try:
+            # Acquire the catalogs and the destination folder once, before fanning out to worker threads.
+            # Only create the folder when there is any dashboard to upload into it.
+            grafana.get_dashboards()
+            if any(outcome.ok for outcome in rendered):
+                grafana.ensure_folders([grafana.grafana_folder])
+        except Exception as ex:
+            logger.error(f"Failed to prepare import into Grafana instance '{label}'. Reason: {ex}")
+            report.fail(label, ex)
+            return
+        for outcome in run_bulk(lambda item: upload(grafana, item), rendered, jobs=jobs):
+            if not outcome.ok:
+                logger.error(f"Failed to import '{outcome.item.item}' into Grafana instance '{label}'. {outcome.error}")
+            report.record(label, BulkOutcome(item=outcome.item.item, error=outcome.error))
+        if grafana.sync_state is not None:
+            grafana.sync_state.save()
+
+    run_bulk(import_instance, list(instances), jobs=max(1, len(instances)))
+    return report
@@ -1,12 +1,111 @@
+import fnmatch
+import logging
 import os
 import re
 import typing as t
 import unicodedata
+from pathlib import Path
 
 import grafana_client.api as GrafanaApi
 import grafana_client.client as GrafanaClient
 
+from grafana_import.bulk import BulkOutcome, run_bulk
+from grafana_import.catalog import (
+    CatalogCache,
+    CatalogStore,
+    DashboardCatalog,
+    FolderCatalog,
+    cache_key,
+    dashboard_in_folder,
+    default_cache_path,
+    folder_path,
+)
 from grafana_import.constants import PKG_NAME
+from grafana_import.sync import SyncState, dashboard_fingerprint
+from grafana_import.transport import TransportSettings, configure_client
+
+logger = logging.getLogger(__name__)
+
+T = t.TypeVar("T")
+
+
+class FolderApi(t.Protocol):
+    """
+    The folder operations of the grafana-client API used by the flows of `GrafanaBase`.
+    """
+
+    def get_folder(self, uid: str) -> t.Any: ...
+
+    def get_all_folders(self, parent_uid: t.Union[str, None] = None) -> t.Any: ...
+
+    def create_folder(
+        self, title: str, uid: t.Union[str, None] = None, parent_uid: t.Union[str, None] = None
+    ) -> t.Any: ...
+
+
+class DashboardApi(t.Protocol):
+    """
+    The dashboard operations of the grafana-client API used by the flows of `GrafanaBase`.
+    """
+
+    def get_dashboard(self, dashboard_uid: str) -> t.Any: ...
+
+    def update_dashboard(self, dashboard: t.Dict[str, t.Any]) -> t.Any: ...
+
+    def delete_dashboard(self, dashboard_uid: str) -> t.Any: ...
+
+
+class SearchApi(t.Protocol):
+    """
+    The search operations of the grafana-client API used by the flows of `GrafanaBase`.
+    """
+
+    def search_dashboards(self, type_: t.Union[str, None] = None, dashboard_uids: t.Any = None) -> t.Any: ...
+
+
+class ClientApi(t.Protocol):
+    """
+    The surface of the synchronous or asynchronous grafana-client API used by the flows of `GrafanaBase`.
+    """
+
+    @property
+    def folder(self) -> FolderApi: ...
+
+    @property
+    def dashboard(self) -> DashboardApi: ...
+
+    @property
+    def search(self) -> SearchApi: ...
+
+
+class GrafanaOperations(t.Protocol):
+    """
+    The surface of the Grafana classes the flows of `GrafanaBase` call.
+
+    The synchronous Grafana class returns results, the asynchronous one returns awaitables of them.
+    """
+
+    @property
+    def grafana_api(self) -> ClientApi: ...
+
+    def get_dashboards(self) -> t.Any: ...
+
+    def refresh_dashboards(self) -> t.Any: ...
+
+    def get_folders(self) -> t.Any: ...
+
+    def refresh_folders(self) -> t.Any: ...
+
+    def ensure_folder(self, folder_name: str) -> t.Any: ...
+
+
+# A call requested by a flow of `GrafanaBase`, selecting and invoking a method of the Grafana instance, like
+# `lambda grafana: grafana.grafana_api.folder.get_folder(uid)`. The synchronous Grafana class runs it, the
+# asynchronous one awaits its result. Calls are type-checked against `GrafanaOperations`.
+ApiCall = t.Callable[[GrafanaOperations], t.Any]
+
+# An operation yielding the calls it needs, and returning its result.
+Flow = t.Generator[ApiCall, t.Any, T]
 
 
 class GrafanaDashboardNotFoundError(Exception):
@@ -56,36 +155,29 @@ def remove_accents_and_space(input_str: str) -> str:
     return re.sub(r"\s+", "_", res)
 
 
-class Grafana:
-    # * to store the folders list, dashboards list (kind of cache)
-    folders: t.List[t.Any] = []
-    dashboards: t.List[t.Any] = []
+class GrafanaBase:
+    """
+    Settings and connectivity-agnostic decisions shared by the synchronous and the asynchronous Grafana classes.
+    """
 
-    def __init__(self, **kwargs):
+    grafana_folder: str
+    overwrite: bool
+    allow_new: bool
+    keep_uid: bool
+    search_api_limit: int
+    sync_state: t.Union[SyncState, None]
+    prepared_folders: t.Dict[str, t.Dict[str, t.Any]]
+    cache: CatalogCache
 
-        # Configure Grafana connectivity.
-        if "url" in kwargs:
-            self.grafana_api = GrafanaApi.GrafanaApi.from_url(
-                url=kwargs["url"],
-                credential=kwargs.get("credential", os.environ.get("GRAFANA_TOKEN")),
-            )
-        else:
-            config = {}
-            config["protocol"] = kwargs.get("protocol", "http")
-            config["host"] = kwargs.get("host", "localhost")
-            config["port"] = kwargs.get("port", 3000)
-            config["token"] = kwargs.get("token", None)
-            config["verify_ssl"] = kwargs.get("verify_ssl", True)
-
-            self.grafana_api = GrafanaApi.GrafanaApi(
-                auth=config["token"],
-                host=config["host"],
-                protocol=config["protocol"],
-                port=config["port"],
-                verify=config["verify_ssl"],
-            )
+    def _configure(self, identity: t.Tuple[str, t.Any], **kwargs) -> t.Union[CatalogStore, None]:
+        """
+        Apply settings from keyword arguments, and return the persistent catalog store, if configured.
+        """
 
-        self.search_api_limit = kwargs.get("search_api_limit", 5000)
+        # * page size when iterating the search API.
+        self.search_api_limit = int(kwargs.get("search_api_limit", 5000))
+        if self.search_api_limit < 1:
+            raise ValueError(f"Invalid value for search_api_limit: {self.search_api_limit}")
         # * set the default destination folder for dash
         self.grafana_folder = kwargs.get("folder", "General")
 
@@ -99,69 +191,408 @@ class Grafana:
         # * when importing dash, keep dashboard uid defined in the json file.
         self.keep_uid = kwargs.get("keep_uid", False)
 
-        # * try to connect to the API
-        try:
-            res = self.grafana_api.health.check()
-            if res["database"] != "ok":
-                raise Exception("grafana is not UP")
-        except:
-            raise
+        # * destination folders ensured up front, before importing a batch of dashboards.
+        self.prepared_folders = {}
+
+        # * when importing dash, skip uploading it when its content did not change.
+        # * remember the content hashes of imported dashboards in a state file per Grafana instance.
+        self.sync_state = None
+        if kwargs.get("sync", False):
+            sync_state = kwargs.get("sync_state")
+            if sync_state is None:
+                sync_state = Path(kwargs.get("cache_path") or default_cache_path()) / "sync-{0}.json".format(
+                    cache_key(*identity)
+                )
+            self.sync_state = SyncState(sync_state)
+
+        # * optionally persist the folders list and dashboards list on disk, for the given time to live (seconds).
+        if kwargs.get("cache_ttl"):
+            return CatalogStore(
+                url=identity[0],
+                credential=identity[1],
+                ttl=kwargs["cache_ttl"],
+                path=kwargs.get("cache_path"),
+            )
+        return None
 
-    def find_dashboard(self, dashboard_name: str) -> t.Union[t.Dict[str, t.Any], None]:
+    @staticmethod
+    def _connection_settings(**kwargs) -> t.Dict[str, t.Any]:
         """
-        Retrieve dashboards which name are matching the lookup named.
-        Some api version didn't return folderTitle. Requires to lookup in two phases.
+        Compute connection settings for host-based connectivity.
+        """
+        config: t.Dict[str, t.Any] = {}
+        config["protocol"] = kwargs.get("protocol", "http")
+        config["host"] = kwargs.get("host", "localhost")
+        config["port"] = kwargs.get("port", 3000)
+        config["token"] = kwargs.get("token", None)
+        config["verify_ssl"] = kwargs.get("verify_ssl", True)
+        return config
+
+    def _prepare_upload(self, new_dash: t.Dict[str, t.Any], old_dash: t.Union[t.Dict[str, t.Any], None]) -> None:
+        """
+        Adjust the upload request of a dashboard, depending on an existing dashboard with the same title.
+        """
+
+        # ** several case
+        # read new folder1/dash1(uid1) => old folder1/dash1(uid1): classic update
+        # b) read new folder_new/dash1(uid1) => old folder1/dash1(uid1): create new dash in folder_new
+        #      => new folder_new/dash1(uid_new) if allow_new
+        # c) read new folder_new/dash1(uid_new) => old folder1/dash1(uid1): create new in new folder folder_new
+        #      => classic create (update)
+        # d) read new folder1/dash1(uid_new) => old folder1/dash1(uid1)
+        #      => new folder1/dash1(uid1) if overwrite
+        if old_dash is not None:
+            # case b) get a copy of an existing dash to a folder where dash is not present
+            if new_dash["folderId"] != old_dash["folderId"]:
+                # if new_dash['dashboard']['uid'] == old_dash['uid']:
+                if self.allow_new:
+                    new_dash["overwrite"] = False
+                    # force the creation of a new dashboard
+                    new_dash["dashboard"]["uid"] = None
+                    new_dash["dashboard"]["id"] = None
+                else:
+                    raise GrafanaClient.GrafanaBadInputError(
+                        "Dashboard with the same title already exists in another folder. "
+                        "Use `allow_new` to permit creation in a different folder."
+                    )
+            # ** case d) send a copy to existing dash : update existing
+            elif new_dash["folderId"] == old_dash["folderId"]:
+                if (
+                    "uid" not in new_dash["dashboard"]
+                    or new_dash["dashboard"]["uid"] != old_dash["uid"]
+                    or new_dash["dashboard"]["id"] != old_dash["id"]
+                ):
+                    if self.overwrite:
+                        if not self.keep_uid:
+                            new_dash["dashboard"]["uid"] = old_dash["uid"]
+                        new_dash["dashboard"]["id"] = old_dash["id"]
+                    else:
+                        raise GrafanaClient.GrafanaBadInputError(
+                            "Dashboard with the same title already exists in this folder with another uid. "
+                            "Use `overwrite` to permit overwriting it."
+                        )
+        else:
+            if not self.keep_uid:
+                # force the creation of a new dashboard
+                new_dash["dashboard"]["uid"] = None
+
+            new_dash["dashboard"]["id"] = None
+            new_dash["overwrite"] = False
+
+        new_dash["message"] = "imported from {0}.".format(PKG_NAME)
+
+    @staticmethod
+    def _plan_folders(folder_names: t.Iterable[str]) -> t.List[str]:
+        """
+        Compute the distinct destination folders of an import batch, parent folders first.
+
+        The `General` folder always exists, so it is omitted.
+        """
+        names: t.Dict[str, None] = {}
+        for name in folder_names:
+            if name and not re.match("general", name, re.IGNORECASE):
+                names.setdefault(name)
+        return sorted(names, key=lambda name: len(folder_path(name)))
+
+    @staticmethod
+    def _find_in_catalog(
+        dashboards: DashboardCatalog, dashboard_name: str, folder: t.Dict[str, t.Any]
+    ) -> t.Union[t.Dict[str, t.Any], None]:
         """
+        Find a dashboard by title in the requested folder, or in any other folder.
+        """
+        if folder["id"] == 0:
+            board = dashboards.find(dashboard_name)
+        else:
+            # * prefer the folder uid, titles of nested folders are not unique.
+            board = dashboards.find(dashboard_name, folder_uid=folder["uid"]) if folder.get("uid") else None
+            if board is None:
+                board = dashboards.find(dashboard_name, folder_title=folder["title"])
+        if board is None:
+            board = dashboards.find_any(dashboard_name)
+        return board
 
-        # Init cache for dashboards.
-        if len(Grafana.dashboards) == 0:
-            # Collect all dashboard names.
-            res = self.grafana_api.search.search_dashboards(type_="dash-db", limit=self.search_api_limit)
-            Grafana.dashboards = res
+    @staticmethod
+    def _filter_dashboards(
+        dashboards: DashboardCatalog,
+        pattern: str,
+        folder_name: t.Union[str, None],
+        folder: t.Union[t.Dict[str, t.Any], None],
+        regex: t.Union[str, None] = None,
+        uids: t.Union[t.Iterable[str], None] = None,
+    ) -> t.List[t.Dict[str, t.Any]]:
+        """
+        Select dashboards from the catalog, by title pattern, title regex, uid, and folder.
 
-        dashboards = Grafana.dashboards
+        When `folder_name` is given, only dashboards within `folder` are selected,
+        or within `General`, when `folder` is `None`.
+        """
+        title_regex = re.compile(regex) if regex is not None else None
+        uid_set = set(uids) if uids is not None else None
+        boards = []
+        for board in dashboards:
+            if folder_name is not None and not dashboard_in_folder(board, folder):
+                continue
+            if uid_set is not None and board["uid"] not in uid_set:
+                continue
+            if title_regex is not None and not title_regex.search(board["title"]):
+                continue
+            if fnmatch.fnmatchcase(board["title"], pattern):
+                boards.append(board)
+        return boards
+
+    @staticmethod
+    def _matches_search(board: t.Dict[str, t.Any], current: t.Dict[str, t.Any]) -> bool:
+        """
+        Check whether a cached dashboard entry still matches a search result of the server.
+        """
+        return (
+            current.get("uid") == board["uid"]
+            and current["title"] == board["title"]
+            and current.get("folderUid") == board.get("folderUid")
+        )
+
+    @staticmethod
+    def _resolve_folder_id(old_dash: t.Dict[str, t.Any]) -> None:
+        if "meta" in old_dash and "folderUrl" in old_dash["meta"]:
+            old_dash["folderId"] = old_dash["meta"]["folderId"]
+        elif "folderId" not in old_dash:
+            old_dash["folderId"] = 0
+
+    @staticmethod
+    def _catalog_entry(
+        new_dash: t.Dict[str, t.Any], res: t.Dict[str, t.Any], folder: t.Union[t.Dict[str, t.Any], None]
+    ) -> t.Dict[str, t.Any]:
+        """
+        Build a catalog entry for a successfully uploaded dashboard.
+        """
+        entry = {
+            "id": res.get("id"),
+            "uid": res["uid"],
+            "title": new_dash["dashboard"]["title"],
+            "url": res.get("url"),
+            "type": "dash-db",
+        }
+        if folder is not None:
+            entry.update(
+                {
+                    "folderId": folder["id"],
+                    "folderUid": folder["uid"],
+                    "folderTitle": folder["title"],
+                }
+            )
+        return entry
 
-        folder = {
+    @staticmethod
+    def _check_removal(board: t.Dict[str, t.Any], folder: t.Dict[str, t.Any]) -> None:
+        if (folder["id"] == 0 and "folderId" in board and board["folderId"] != folder["id"]) or (
+            folder["id"] != 0 and "folderId" not in board
+        ):
+            raise GrafanaApi.GrafanaBadInputError(
+                "Dashboard name found but in folder '{0}'!".format(board["folderTitle"])
+            )
+
+    @staticmethod
+    def _update_catalog(
+        dashboards: DashboardCatalog,
+        old_dash: t.Union[t.Dict[str, t.Any], None],
+        new_dash: t.Dict[str, t.Any],
+        res: t.Dict[str, t.Any],
+        folder: t.Union[t.Dict[str, t.Any], None],
+    ) -> None:
+        """
+        Reflect a successful dashboard upload in the catalog of dashboards.
+        """
+        if "uid" not in res:
+            return
+        if old_dash is not None and old_dash.get("uid") != res["uid"] and new_dash["overwrite"]:
+            dashboards.remove(old_dash["uid"])
+        dashboards.add(GrafanaBase._catalog_entry(new_dash, res, folder))
+
+    # The flows below implement the operations of both Grafana classes once, without doing any I/O.
+    # They yield the calls they need, which the synchronous class invokes, and the asynchronous class awaits.
+
+    def _find_dashboard_flow(
+        self, dashboard_name: str, folder_name: t.Union[str, None] = None
+    ) -> Flow[t.Union[t.Dict[str, t.Any], None]]:
+        board = yield from self._lookup_dashboard_flow(dashboard_name, folder_name)
+
+        # * entries loaded from the persistent cache are revalidated by uid,
+        # * a miss or a stale entry refreshes the whole catalog.
+        if (yield lambda grafana: grafana.get_dashboards()).cached:
+            if board is not None:
+                board = yield from self._revalidate_dashboard_flow(board)
+            if board is None:
+                yield lambda grafana: grafana.refresh_dashboards()
+                board = yield from self._lookup_dashboard_flow(dashboard_name, folder_name)
+
+        return board
+
+    def _lookup_dashboard_flow(
+        self, dashboard_name: str, folder_name: t.Union[str, None] = None
+    ) -> Flow[t.Union[t.Dict[str, t.Any], None]]:
+        dashboards = yield lambda grafana: grafana.get_dashboards()
+        folder_name = folder_name or self.grafana_folder
+
+        folder: t.Dict[str, t.Any] = {
             "id": 0,
             "title": "General",
         }
-        if not re.match("general", self.grafana_folder, re.IGNORECASE):
-            found_folder = self.get_folder(folder_name=self.grafana_folder)
+        if not re.match("general", folder_name, re.IGNORECASE):
+            found_folder = self.prepared_folders.get(folder_name)
+            if found_folder is None:
+                found_folder = yield from self._get_folder_flow(folder_name=folder_name)
             if found_folder is not None:
                 folder = found_folder
 
-        board = None
-        # * find the board uid in the list
-        for cur_dash in dashboards:
-            if cur_dash["title"] == dashboard_name:
-                # set current dashbard as found candidate
-                board = cur_dash
-                # check the folder part
-                if ("folderTitle" in cur_dash and cur_dash["folderTitle"] == folder["title"]) or (
-                    "folderTitle" not in cur_dash and folder["id"] == 0
-                ):
-                    # this is a requested folder or no folder !
+        return self._find_in_catalog(dashboards, dashboard_name, folder)
+
+    def _revalidate_dashboard_flow(self, board: t.Dict[str, t.Any]) -> Flow[t.Union[t.Dict[str, t.Any], None]]:
+        """
+        Check a cached dashboard entry against the server, by uid.
+        """
+        dashboards = yield lambda grafana: grafana.get_dashboards()
+        if board["uid"] in dashboards.validated:
+            return board
+        res = yield lambda grafana: grafana.grafana_api.search.search_dashboards(
+            type_="dash-db", dashboard_uids=board["uid"]
+        )
+        for current in res:
+            if self._matches_search(board, current):
+                dashboards.add(current)
+                dashboards.validated.add(board["uid"])
+                return current
+        return None
+
+    def _revalidate_folder_flow(self, folder: t.Dict[str, t.Any]) -> Flow[t.Union[t.Dict[str, t.Any], None]]:
+        """
+        Check a cached folder entry against the server, by uid.
+        """
+        if folder["uid"] in self.cache.folder_index.validated:
+            return folder
+        current = yield from self._fetch_folder_flow(folder["uid"])
+        if current is None or current["title"] != folder["title"]:
+            return None
+        return current
+
+    def _fetch_folder_flow(self, folder_uid: str) -> Flow[t.Union[t.Dict[str, t.Any], None]]:
+        """
+        Fetch a single folder from the server by uid, and add it to the catalog.
+        """
+        try:
+            folder = yield lambda grafana: grafana.grafana_api.folder.get_folder(folder_uid)
+        except GrafanaClient.GrafanaClientError as ex:
+            if ex.status_code == 404:
+                return None
+            raise
+        folders = self.cache.folder_index
+        folders.add(folder)
+        folders.validated.add(folder_uid)
+        return folder
+
+    def _get_child_folder_flow(
+        self, parent_uid: t.Union[str, None], title: str
+    ) -> Flow[t.Union[t.Dict[str, t.Any], None]]:
+        """
+        Find a folder by title within its parent folder, acquiring the child folders of the parent on demand.
+        """
+        if parent_uid is None:
+            folders = yield lambda grafana: grafana.get_folders()
+        else:
+            folders = self.cache.folder_index
+        folder = folders.find_child(parent_uid, title)
+        if folder is not None and folders.cached:
+            folder = yield from self._revalidate_folder_flow(folder)
+        if folder is None and parent_uid is None and folders.cached:
+            folder = (yield lambda grafana: grafana.refresh_folders()).find_child(None, title)
+        elif folder is None and parent_uid is not None and parent_uid not in folders.listed:
+            children = yield lambda grafana: grafana.grafana_api.folder.get_all_folders(parent_uid=parent_uid)
+            folders.update({**child, "parentUid": parent_uid} for child in children)
+            folders.listed.add(parent_uid)
+            folder = folders.find_child(parent_uid, title)
+        return folder
+
+    def _get_folder_flow(
+        self, folder_name: t.Union[str, None] = None, folder_uid: t.Union[str, None] = None
+    ) -> Flow[t.Union[t.Dict[str, t.Any], None]]:
+        if folder_name is None and folder_uid is None:
+            return None
+
+        # * a single folder is fetched lazily by uid, without acquiring the list of all folders.
+        if folder_uid is not None:
+            folder = self.cache.folder_index.get(folder_uid)
+            if folder is not None and not self.cache.folder_index.cached:
+                return folder
+            return (yield from self._fetch_folder_flow(folder_uid))
+
+        # * nested folders are resolved component by component.
+        if len(folder_path(t.cast(str, folder_name))) > 1:
+            parent_uid = None
+            for title in folder_path(t.cast(str, folder_name)):
+                folder = yield from self._get_child_folder_flow(parent_uid, title)
+                if folder is None:
                     break
+                parent_uid = folder["uid"]
+            if folder is not None:
+                return folder
 
-        return board
+        folder = (yield lambda grafana: grafana.get_folders()).find(folder_name)
 
-    def export_dashboard(self, dashboard_name: str) -> t.Dict[str, t.Any]:
+        # * entries loaded from the persistent cache are revalidated by uid,
+        # * a miss or a stale entry refreshes the whole catalog.
+        if (yield lambda grafana: grafana.get_folders()).cached:
+            if folder is not None:
+                folder = yield from self._revalidate_folder_flow(folder)
+            if folder is None:
+                folder = (yield lambda grafana: grafana.refresh_folders()).find(folder_name)
+
+        return folder
+
+    def _ensure_folder_flow(self, folder_name: str) -> Flow[t.Dict[str, t.Any]]:
+        # * callers serialize folder creation, concurrent imports into a new folder must not race.
+        folder = yield from self._get_folder_flow(folder_name)
+        if folder is not None:
+            return folder
+        titles = folder_path(folder_name)
+        if len(titles) <= 1:
+            return (yield from self._create_folder_flow(folder_name))
+        parent_uid = None
+        for title in titles:
+            folder = yield from self._get_child_folder_flow(parent_uid, title)
+            if folder is None:
+                folder = yield from self._create_folder_flow(title, parent_uid)
+            parent_uid = folder["uid"]
+        return t.cast(t.Dict[str, t.Any], folder)
+
+    def _create_folder_flow(self, title: str, parent_uid: t.Union[str, None] = None) -> Flow[t.Dict[str, t.Any]]:
         """
-        retrive the dashboard object from Grafana server.
-           params:
-              dashboard_name (str): name of the dashboard to retrieve
-           result:
-              dashboard (dict [json])
+        Create a folder, and add it to the catalog.
         """
+        folder = yield lambda grafana: grafana.grafana_api.folder.create_folder(title, parent_uid=parent_uid)
+        if not folder:
+            raise Exception("KO: grafana folder '{0}' creation failed.".format(title))
+        if parent_uid is not None:
+            folder.setdefault("parentUid", parent_uid)
+        self.cache.folder_index.add(folder)
+        return folder
+
+    def _ensure_folders_flow(self, folder_names: t.Iterable[str]) -> Flow[t.Dict[str, t.Dict[str, t.Any]]]:
+        folders = {}
+        for folder_name in self._plan_folders(folder_names):
+            # Calls are run before the flow resumes, so binding the loop variable late is fine.
+            folders[folder_name] = yield lambda grafana: grafana.ensure_folder(folder_name)  # noqa: B023
+        self.prepared_folders.update(folders)
+        return folders
 
+    def _export_dashboard_flow(self, dashboard_name: str) -> Flow[t.Dict[str, t.Any]]:
         try:
-            board = self.find_dashboard(dashboard_name)
+            board = yield from self._find_dashboard_flow(dashboard_name)
 
             if board is None:
                 raise GrafanaClient.GrafanaClientError(response=None, message="Not Found", status_code=404)
 
             # Fetch the dashboard JSON representation by UID.
-            return self.grafana_api.dashboard.get_dashboard(board["uid"])
+            return (yield lambda grafana: grafana.grafana_api.dashboard.get_dashboard(board["uid"]))
         except Exception as ex:
             if isinstance(ex, GrafanaClient.GrafanaClientError) and ex.status_code == 404:
                 raise GrafanaDashboardNotFoundError(
@@ -171,15 +602,27 @@ class Grafana:
                 ) from ex
             raise
 
-    def remove_dashboard(self, dashboard_name: str) -> t.Dict[str, t.Any]:
-        """
-        Retrieve the dashboard object from Grafana server and remove it.
-           params:
-              dashboard_name (str): name of the dashboard to retrieve
-           result:
-              True or Exception
-        """
+    def _select_dashboards_flow(
+        self,
+        pattern: str = "*",
+        folder_name: t.Union[str, None] = None,
+        regex: t.Union[str, None] = None,
+        uids: t.Union[t.Iterable[str], None] = None,
+    ) -> Flow[t.List[t.Dict[str, t.Any]]]:
+        folder = None
+        if folder_name is not None and not re.match("general", folder_name, re.IGNORECASE):
+            folder = yield from self._get_folder_flow(folder_name)
+            if folder is None:
+                raise GrafanaFolderNotFoundError(folder_name, f"Folder not found: {folder_name}")
 
+        # * bulk selection does not revalidate single entries, so do not use the persistent cache.
+        dashboards = yield lambda grafana: grafana.get_dashboards()
+        if dashboards.cached:
+            dashboards = yield lambda grafana: grafana.refresh_dashboards()
+
+        return self._filter_dashboards(dashboards, pattern, folder_name, folder, regex=regex, uids=uids)
+
+    def _remove_dashboard_flow(self, dashboard_name: str) -> Flow[t.Dict[str, t.Any]]:
         res = {}
         folder = {
             "id": 0,
@@ -189,62 +632,37 @@ class Grafana:
         # Check if the destination folder is `General`.
         if not re.match("general", self.grafana_folder, re.IGNORECASE):
             # ** check 'custom' folder existence (custom != General)
-            folder = self.get_folder(self.grafana_folder)
-            if folder is None:
+            found_folder = yield from self._get_folder_flow(self.grafana_folder)
+            if found_folder is None:
                 raise GrafanaFolderNotFoundError(
                     self.grafana_folder,
                     f"Folder not found: {self.grafana_folder}",
                 )
+            folder = found_folder
 
         # Collect the board object itself from it uid.
-        board = self.find_dashboard(dashboard_name)
+        board = yield from self._find_dashboard_flow(dashboard_name)
 
         if board is None:
             raise GrafanaDashboardNotFoundError(dashboard_name, folder["title"], "dashboard not found")
 
-        if (folder["id"] == 0 and "folderId" in board and board["folderId"] != folder["id"]) or (
-            folder["id"] != 0 and "folderId" not in board
-        ):
-            raise GrafanaApi.GrafanaBadInputError(
-                "Dashboard name found but in folder '{0}'!".format(board["folderTitle"])
-            )
+        self._check_removal(board, folder)
 
         if "uid" in board:
-            res = self.grafana_api.dashboard.delete_dashboard(board["uid"])
+            res = yield from self._delete_dashboard_flow(board["uid"])
 
         return res
 
-    def get_folder(self, folder_name: str = None, folder_uid: str = None):
-        """
-        try to find folder meta data (uid...) from folder name
-           params:
-              folder_name (str): name of the folder (case sensitive) into Grafana folders tree
-           return:
-              folder object (dict)
-        """
-        if folder_name is None and folder_uid is None:
-            return None
-
-        # * init cache for folders.
-        if len(Grafana.folders) == 0:
-            res = self.grafana_api.folder.get_all_folders()
-            Grafana.folders = res
-
-        folders = Grafana.folders
-        folder = None
-
-        for tmp_folder in folders:
-
-            if (folder_name is not None and folder_name == tmp_folder["title"]) or (
-                folder_uid is not None and folder_uid == tmp_folder["folderId"]
-            ):
-                folder = tmp_folder
-                break
-
-        return folder
-
-    def import_dashboard(self, dashboard: t.Dict[str, t.Any]) -> bool:
+    def _delete_dashboard_flow(self, uid: str) -> Flow[t.Dict[str, t.Any]]:
+        res = yield lambda grafana: grafana.grafana_api.dashboard.delete_dashboard(uid)
+        (yield lambda grafana: grafana.get_dashboards()).remove(uid)
+        if self.sync_state is not None:
+            self.sync_state.discard(uid)
+        return res
 
+    def _import_dashboard_flow(
+        self, dashboard: t.Dict[str, t.Any], force: bool = False, folder_name: t.Union[str, None] = None
+    ) -> Flow[bool]:
         # ** build a temporary meta dashboard struct to store info
         # ** by default dashboard will be overwritten
         new_dash: t.Dict[str, t.Any] = {
@@ -252,7 +670,12 @@ class Grafana:
             "overwrite": True,
         }
 
-        old_dash = self.find_dashboard(dashboard["title"])
+        digest = None
+        if self.sync_state is not None:
+            digest = dashboard_fingerprint(dashboard, keep_uid=self.keep_uid)
+
+        folder_name = folder_name or self.grafana_folder
+        old_dash = yield from self._find_dashboard_flow(dashboard["title"], folder_name)
 
         # ** check a previous dashboard existence (same folder, same uid)
         if old_dash is None:
@@ -260,78 +683,277 @@ class Grafana:
             dashboard["version"] = 1
 
         # * check the destination folder is General
-        if re.match("general", self.grafana_folder, re.IGNORECASE):
+        folder = None
+        if re.match("general", folder_name, re.IGNORECASE):
             new_dash["folderId"] = 0
         else:
-            # ** check 'custom' folder existence (custom != General)
-            folder = self.get_folder(self.grafana_folder)
+            # ** check 'custom' folder existence (custom != General), unless ensured up front
+            folder = self.prepared_folders.get(folder_name)
             if folder is None:
-                folder = self.grafana_api.folder.create_folder(self.grafana_folder)
+                folder = yield lambda grafana: grafana.ensure_folder(folder_name)
+            new_dash["folderId"] = folder["id"]
 
-                if folder:
-                    new_dash["folderId"] = folder["id"]
-                else:
-                    raise Exception("KO: grafana folder '{0}' creation failed.".format(self.grafana_folder))
-            else:
-                new_dash["folderId"] = folder["id"]
-
-        # ** several case
-        # read new folder1/dash1(uid1) => old folder1/dash1(uid1): classic update
-        # b) read new folder_new/dash1(uid1) => old folder1/dash1(uid1): create new dash in folder_new
-        #      => new folder_new/dash1(uid_new) if allow_new
-        # c) read new folder_new/dash1(uid_new) => old folder1/dash1(uid1): create new in new folder folder_new
-        #      => classic create (update)
-        # d) read new folder1/dash1(uid_new) => old folder1/dash1(uid1)
-        #      => new folder1/dash1(uid1) if overwrite
         if old_dash is not None:
-            if "meta" in old_dash and "folderUrl" in old_dash["meta"]:
-                old_dash["folderId"] = old_dash["meta"]["folderId"]
-            elif "folderId" not in old_dash:
-                old_dash["folderId"] = 0
+            self._resolve_folder_id(old_dash)
 
-            # case b) get a copy of an existing dash to a folder where dash is not present
-            if new_dash["folderId"] != old_dash["folderId"]:
-                # if new_dash['dashboard']['uid'] == old_dash['uid']:
-                if self.allow_new:
-                    new_dash["overwrite"] = False
-                    # force the creation of a new dashboard
-                    new_dash["dashboard"]["uid"] = None
-                    new_dash["dashboard"]["id"] = None
-                else:
-                    raise GrafanaClient.GrafanaBadInputError(
-                        "Dashboard with the same title already exists in another folder. "
-                        "Use `allow_new` to permit creation in a different folder."
-                    )
-            # ** case d) send a copy to existing dash : update existing
-            elif new_dash["folderId"] == old_dash["folderId"]:
-                if (
-                    "uid" not in new_dash["dashboard"]
-                    or new_dash["dashboard"]["uid"] != old_dash["uid"]
-                    or new_dash["dashboard"]["id"] != old_dash["id"]
-                ):
-                    if self.overwrite:
-                        if not self.keep_uid:
-                            new_dash["dashboard"]["uid"] = old_dash["uid"]
-                        new_dash["dashboard"]["id"] = old_dash["id"]
-                    else:
-                        raise GrafanaClient.GrafanaBadInputError(
-                            "Dashboard with the same title already exists in this folder with another uid. "
-                            "Use `overwrite` to permit overwriting it."
-                        )
-        else:
-            if not self.keep_uid:
-                # force the creation of a new dashboard
-                new_dash["dashboard"]["uid"] = None
+            # ** sync mode: same folder, same content => nothing to upload
+            if digest is not None and not force and new_dash["folderId"] == old_dash["folderId"]:
+                if (yield from self._is_unchanged_flow(old_dash["uid"], digest)):
+                    logger.info(f"Dashboard '{dashboard['title']}' is unchanged, skipping upload")
+                    return True
 
-            new_dash["dashboard"]["id"] = None
-            new_dash["overwrite"] = False
+        self._prepare_upload(new_dash, old_dash)
 
-        new_dash["message"] = "imported from {0}.".format(PKG_NAME)
+        res = yield lambda grafana: grafana.grafana_api.dashboard.update_dashboard(new_dash)
+        if not res["status"]:
+            return False
+        self._update_catalog((yield lambda grafana: grafana.get_dashboards()), old_dash, new_dash, res, folder)
+        if digest is not None and "uid" in res:
+            t.cast(SyncState, self.sync_state).set(res["uid"], digest)
+        return True
+
+    def _is_unchanged_flow(self, uid: str, digest: str) -> Flow[bool]:
+        """
+        Compare the content hash of a dashboard with the last imported state, or with the server copy.
+        """
+        sync_state = t.cast(SyncState, self.sync_state)
+        if sync_state.get(uid) == digest:
+            return True
+        current = yield lambda grafana: grafana.grafana_api.dashboard.get_dashboard(uid)
+        if dashboard_fingerprint(current["dashboard"], keep_uid=self.keep_uid) == digest:
+            sync_state.set(uid, digest)
+            return True
+        return False
+
+
+class Grafana(GrafanaBase):
+    def __init__(self, **kwargs):
 
-        res = self.grafana_api.dashboard.update_dashboard(new_dash)
-        if res["status"]:
-            res = True
+        # Configure Grafana connectivity.
+        if "url" in kwargs:
+            identity = (kwargs["url"], kwargs.get("credential", os.environ.get("GRAFANA_TOKEN")))
+            self.grafana_api = GrafanaApi.GrafanaApi.from_url(
+                url=identity[0],
+                credential=identity[1],
+            )
         else:
-            res = False
+            config = self._connection_settings(**kwargs)
+            self.grafana_api = GrafanaApi.GrafanaApi(
+                auth=config["token"],
+                host=config["host"],
+                protocol=config["protocol"],
+                port=config["port"],
+                verify=config["verify_ssl"],
+            )
+            identity = ("{protocol}://{host}:{port}".format(**config), config["token"])
 
-        return res
+        # * tune the connection pool, keep-alive, timeouts, and retries of the HTTP session.
+        self.transport = TransportSettings.from_kwargs(kwargs)
+        configure_client(self.grafana_api.client, self.transport)
+
+        store = self._configure(identity, **kwargs)
+
+        # * to store the folders list, dashboards list (kind of cache), per instance.
+        self.cache = CatalogCache(
+            load_dashboards=self.iter_dashboards,
+            load_folders=self.grafana_api.folder.get_all_folders,
+            store=store,
+        )
+
+        # * try to connect to the API
+        try:
+            res = self.grafana_api.health.check()
+            if res["database"] != "ok":
+                raise Exception("grafana is not UP")
+        except:
+            raise
+
+    def _run(self, flow: Flow[T]) -> T:
+        """
+        Run a flow of `GrafanaBase`, invoking the calls it yields, and sending back their results or errors.
+        """
+        try:
+            request = next(flow)
+            while True:
+                try:
+                    result = request(self)
+                except Exception as ex:
+                    request = flow.throw(ex)
+                else:
+                    request = flow.send(result)
+        except StopIteration as ex:
+            return ex.value
+
+    def find_dashboard(
+        self, dashboard_name: str, folder_name: t.Union[str, None] = None
+    ) -> t.Union[t.Dict[str, t.Any], None]:
+        """
+        Retrieve dashboards which name are matching the lookup named.
+        Some api version didn't return folderTitle. Requires to lookup in two phases.
+        Dashboards within `folder_name` are preferred, which defaults to the configured folder.
+        """
+        return self._run(self._find_dashboard_flow(dashboard_name, folder_name))
+
+    def get_dashboards(self) -> DashboardCatalog:
+        """
+        Return the catalog of all dashboards, acquiring it on first use.
+        """
+        return self.cache.dashboards
+
+    def refresh_dashboards(self) -> DashboardCatalog:
+        """
+        Acquire the catalog of all dashboards from the server.
+        """
+        return self.cache.refresh_dashboards()
+
+    def iter_dashboards(self) -> t.Generator[t.Dict[str, t.Any], None, None]:
+        """
+        Iterate all dashboards using the search API, page by page.
+
+        The page size is defined by `search_api_limit`. Results are yielded
+        as each page arrives, so the whole result set is never fetched in
+        a single response.
+        """
+        page = 1
+        while True:
+            res = self.grafana_api.search.search_dashboards(type_="dash-db", limit=self.search_api_limit, page=page)
+            yield from res
+            if len(res) < self.search_api_limit:
+                break
+            page += 1
+
+    def get_folders(self) -> FolderCatalog:
+        """
+        Return the catalog of all folders, acquiring it on first use.
+        """
+        return self.cache.folders
+
+    def refresh_folders(self) -> FolderCatalog:
+        """
+        Acquire the catalog of all folders from the server.
+        """
+        return self.cache.refresh_folders()
+
+    def export_dashboard(self, dashboard_name: str) -> t.Dict[str, t.Any]:
+        """
+        retrive the dashboard object from Grafana server.
+           params:
+              dashboard_name (str): name of the dashboard to retrieve
+           result:
+              dashboard (dict [json])
+        """
+        return self._run(self._export_dashboard_flow(dashboard_name))
+
+    def select_dashboards(
+        self,
+        pattern: str = "*",
+        folder_name: str = None,
+        regex: t.Union[str, None] = None,
+        uids: t.Union[t.Iterable[str], None] = None,
+    ) -> t.List[t.Dict[str, t.Any]]:
+        """
+        Select dashboards from the catalog, by title and folder.
+           params:
+              pattern (str): glob pattern matching the dashboard titles (case sensitive)
+              folder_name (str): name of the folder to select dashboards from, or None for all folders
+              regex (str): regular expression searched within the dashboard titles, or None
+              uids (list): uids of the dashboards to select, or None for all dashboards
+           result:
+              list of dashboard search results
+        """
+        return self._run(self._select_dashboards_flow(pattern, folder_name, regex=regex, uids=uids))
+
+    def remove_dashboard(self, dashboard_name: str) -> t.Dict[str, t.Any]:
+        """
+        Retrieve the dashboard object from Grafana server and remove it.
+           params:
+              dashboard_name (str): name of the dashboard to retrieve
+           result:
+              True or Exception
+        """
+        return self._run(self._remove_dashboard_flow(dashboard_name))
+
+    def delete_dashboard(self, uid: str) -> t.Dict[str, t.Any]:
+        """
+        Remove a dashboard from Grafana server by uid, and from the catalog.
+           params:
+              uid (str): uid of the dashboard to remove
+           result:
+              response of the server (dict)
+        """
+        return self._run(self._delete_dashboard_flow(uid))
+
+    def remove_dashboards(self, boards: t.List[t.Dict[str, t.Any]], jobs: int = 1) -> t.List[BulkOutcome]:
+        """
+        Remove many dashboards from Grafana server, typically selected by `select_dashboards`.
+           params:
+              boards (list): dashboard search results to remove
+              jobs (int): number of dashboards to remove concurrently
+           result:
+              outcome per dashboard (list)
+        """
+        return run_bulk(lambda board: self.delete_dashboard(board["uid"]), boards, jobs=jobs)
+
+    def get_folder(self, folder_name: str = None, folder_uid: str = None):
+        """
+        try to find folder meta data (uid...) from folder name
+           params:
+              folder_name (str): name of the folder (case sensitive) into Grafana folders tree,
+                                 or path of a nested folder, like `Team/Services`
+              folder_uid (str): uid of the folder
+           return:
+              folder object (dict)
+        """
+        return self._run(self._get_folder_flow(folder_name, folder_uid))
+
+    def ensure_folder(self, folder_name: str) -> t.Dict[str, t.Any]:
+        """
+        try to find folder meta data from folder name, and create the folder when it does not exist.
+           params:
+              folder_name (str): name of the folder (case sensitive) into Grafana folders tree,
+                                 or path of a nested folder, like `Team/Services`
+           return:
+              folder object (dict)
+        """
+        with self.cache.lock:
+            return self._run(self._ensure_folder_flow(folder_name))
+
+    def ensure_folders(self, folder_names: t.Iterable[str]) -> t.Dict[str, t.Dict[str, t.Any]]:
+        """
+        Ensure the destination folders of an import batch exist, before importing dashboards.
+
+        Distinct folders, including nested paths, are resolved and created in a single
+        pass, parent folders first. Subsequent imports into these folders do not need
+        to look up or create folders anymore.
+           params:
+              folder_names (list): names or nested paths of the destination folders
+           return:
+              folder objects (dict) by folder name
+        """
+        return self._run(self._ensure_folders_flow(folder_names))
+
+    def import_dashboard(
+        self, dashboard: t.Dict[str, t.Any], force: bool = False, folder_name: t.Union[str, None] = None
+    ) -> bool:
+        """
+        Upload a dashboard to the configured folder.
+           params:
+              dashboard (dict): the dashboard
+              force (bool): upload without comparing the content with the last imported state,
+                            for example when it is known to be changed already
+              folder_name (str): name or path of the folder to upload to, instead of the configured folder
+           result:
+              True when imported successfully (bool)
+        """
+        return self._run(self._import_dashboard_flow(dashboard, force=force, folder_name=folder_name))
+
+    def is_unchanged(self, uid: str, fingerprint: str) -> bool:
+        """
+        Check whether a dashboard on the server has the given content, using the sync state when possible.
+           params:
+              uid (str): uid of the dashboard on the server
+              fingerprint (str): content hash of the local dashboard, see `dashboard_fingerprint`
+           result:
+              True when the content did not change (bool)
+        """
+        return self._run(self._is_unchanged_flow(uid, fingerprint))
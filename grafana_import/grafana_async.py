@@ -0,0 +1,247 @@
+import asyncio
+import inspect
+import logging
+import os
+import typing as t
+
+from grafana_client import AsyncGrafanaApi
+
+from grafana_import.bulk import BulkOutcome, run_bulk_async
+from grafana_import.catalog import CatalogCache, DashboardCatalog, FolderCatalog
+from grafana_import.grafana import Flow, GrafanaBase, T
+from grafana_import.transport import TransportSettings, configure_client
+
+logger = logging.getLogger(__name__)
+
+# Default number of connections to keep in the connection pool.
+DEFAULT_SESSION_POOL_SIZE = 100
+
+
+class AsyncGrafana(GrafanaBase):
+    """
+    Asynchronous variant of the `Grafana` class, using the asynchronous API of grafana-client.
+
+    All requests share a single connection pool, so many requests can be in flight
+    concurrently, for example when importing or exporting many dashboards using
+    `asyncio.gather`. The pool size is defined by `session_pool_size`. Accepts the
+    same keyword arguments as the `Grafana` class.
+
+    The operations are shared with the `Grafana` class, see `GrafanaBase`, only
+    the calls they yield are awaited here.
+
+    Use it as an asynchronous context manager, which checks connectivity to
+    Grafana, and closes the connection pool on exit.
+
+        async with AsyncGrafana(url="http://localhost:3000") as grafana:
+            dashboards = await asyncio.gather(*[grafana.export_dashboard(name) for name in names])
+    """
+
+    def __init__(self, **kwargs) -> None:
+
+        # Configure Grafana connectivity.
+        if "url" in kwargs:
+            identity = (kwargs["url"], kwargs.get("credential", os.environ.get("GRAFANA_TOKEN")))
+            self.grafana_api = AsyncGrafanaApi.from_url(
+                url=identity[0],
+                credential=identity[1],
+            )
+        else:
+            config = self._connection_settings(**kwargs)
+            self.grafana_api = AsyncGrafanaApi(
+                auth=config["token"],
+                host=config["host"],
+                protocol=config["protocol"],
+                port=config["port"],
+                verify=config["verify_ssl"],
+            )
+            identity = ("{protocol}://{host}:{port}".format(**config), config["token"])
+
+        # * size the connection pool for many concurrent requests, and tune keep-alive, timeouts, and retries.
+        self.transport = TransportSettings.from_kwargs(kwargs, session_pool_size=DEFAULT_SESSION_POOL_SIZE)
+        configure_client(self.grafana_api.client, self.transport)
+
+        # * to store the folders list, dashboards list (kind of cache), per instance.
+        # * catalogs are acquired asynchronously, so the cache does not use loader functions.
+        self.cache = CatalogCache(store=self._configure(identity, **kwargs))
+        # * locks are bound to the event loop, so create them on first use.
+        self._locks: t.Dict[str, asyncio.Lock] = {}
+
+    async def __aenter__(self) -> "AsyncGrafana":
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
+
+    async def connect(self) -> None:
+        """
+        Check connectivity to Grafana.
+        """
+        res = await self.grafana_api.health.check()
+        if res["database"] != "ok":
+            raise Exception("grafana is not UP")
+
+    async def close(self) -> None:
+        """
+        Close the connection pool.
+        """
+        await self.grafana_api.client.s.close()
+
+    def _lock(self, name: str) -> asyncio.Lock:
+        if name not in self._locks:
+            self._locks[name] = asyncio.Lock()
+        return self._locks[name]
+
+    async def _run(self, flow: Flow[T]) -> T:
+        """
+        Run a flow of `GrafanaBase`, awaiting the calls it yields, and sending back their results or errors.
+        """
+        try:
+            request = next(flow)
+            while True:
+                try:
+                    result = request(self)
+                    if inspect.isawaitable(result):
+                        result = await result
+                except Exception as ex:
+                    request = flow.throw(ex)
+                else:
+                    request = flow.send(result)
+        except StopIteration as ex:
+            return ex.value
+
+    async def get_dashboards(self) -> DashboardCatalog:
+        """
+        Return the catalog of all dashboards, acquiring it on first use.
+        """
+        catalog = self.cache.cached_dashboards()
+        if catalog is None:
+            async with self._lock("dashboards"):
+                catalog = self.cache.cached_dashboards()
+                if catalog is None:
+                    catalog = self.cache.set_dashboards(await self.list_dashboards())
+        return catalog
+
+    async def refresh_dashboards(self) -> DashboardCatalog:
+        """
+        Acquire the catalog of all dashboards from the server.
+        """
+        async with self._lock("dashboards"):
+            return self.cache.set_dashboards(await self.list_dashboards())
+
+    async def list_dashboards(self) -> t.List[t.Dict[str, t.Any]]:
+        """
+        Acquire all dashboards using the search API, page by page.
+
+        The page size is defined by `search_api_limit`.
+        """
+        dashboards: t.List[t.Dict[str, t.Any]] = []
+        page = 1
+        while True:
+            res = await self.grafana_api.search.search_dashboards(
+                type_="dash-db", limit=self.search_api_limit, page=page
+            )
+            dashboards.extend(res)
+            if len(res) < self.search_api_limit:
+                return dashboards
+            page += 1
+
+    async def get_folders(self) -> FolderCatalog:
+        """
+        Return the catalog of all folders, acquiring it on first use.
+        """
+        catalog = self.cache.cached_folders()
+        if catalog is None:
+            async with self._lock("folders"):
+                catalog = self.cache.cached_folders()
+                if catalog is None:
+                    catalog = self.cache.set_folders(await self.grafana_api.folder.get_all_folders())
+        return catalog
+
+    async def refresh_folders(self) -> FolderCatalog:
+        """
+        Acquire the catalog of all folders from the server.
+        """
+        async with self._lock("folders"):
+            return self.cache.set_folders(await self.grafana_api.folder.get_all_folders())
+
+    async def find_dashboard(
+        self, dashboard_name: str, folder_name: t.Union[str, None] = None
+    ) -> t.Union[t.Dict[str, t.Any], None]:
+        """
+        Retrieve the dashboard which name is matching the lookup name, see `Grafana.find_dashboard`.
+        """
+        return await self._run(self._find_dashboard_flow(dashboard_name, folder_name))
+
+    async def get_folder(
+        self, folder_name: t.Union[str, None] = None, folder_uid: t.Union[str, None] = None
+    ) -> t.Union[t.Dict[str, t.Any], None]:
+        """
+        Find a folder by name, by nested path like `Team/Services`, or by uid.
+        """
+        return await self._run(self._get_folder_flow(folder_name, folder_uid))
+
+    async def ensure_folder(self, folder_name: str) -> t.Dict[str, t.Any]:
+        """
+        Find a folder by name or by nested path, and create it when it does not exist.
+        """
+        async with self._lock("ensure_folder"):
+            return await self._run(self._ensure_folder_flow(folder_name))
+
+    async def ensure_folders(self, folder_names: t.Iterable[str]) -> t.Dict[str, t.Dict[str, t.Any]]:
+        """
+        Ensure the destination folders of an import batch exist, see `Grafana.ensure_folders`.
+        """
+        return await self._run(self._ensure_folders_flow(folder_names))
+
+    async def export_dashboard(self, dashboard_name: str) -> t.Dict[str, t.Any]:
+        """
+        Retrieve the dashboard object from Grafana server.
+        """
+        return await self._run(self._export_dashboard_flow(dashboard_name))
+
+    async def select_dashboards(
+        self,
+        pattern: str = "*",
+        folder_name: t.Union[str, None] = None,
+        regex: t.Union[str, None] = None,
+        uids: t.Union[t.Iterable[str], None] = None,
+    ) -> t.List[t.Dict[str, t.Any]]:
+        """
+        Select dashboards from the catalog, by title pattern, title regex, uid, and folder.
+        """
+        return await self._run(self._select_dashboards_flow(pattern, folder_name, regex=regex, uids=uids))
+
+    async def remove_dashboard(self, dashboard_name: str) -> t.Dict[str, t.Any]:
+        """
+        Retrieve the dashboard object from Grafana server and remove it.
+        """
+        return await self._run(self._remove_dashboard_flow(dashboard_name))
+
+    async def delete_dashboard(self, uid: str) -> t.Dict[str, t.Any]:
+        """
+        Remove a dashboard from Grafana server by uid, and from the catalog.
+        """
+        return await self._run(self._delete_dashboard_flow(uid))
+
+    async def remove_dashboards(
+        self, boards: t.List[t.Dict[str, t.Any]], jobs: t.Union[int, None] = None
+    ) -> t.List[BulkOutcome]:
+        """
+        Remove many dashboards concurrently, with at most `jobs` requests in flight.
+        """
+        return await run_bulk_async(lambda board: self.delete_dashboard(board["uid"]), boards, jobs=jobs)
+
+    async def import_dashboard(
+        self, dashboard: t.Dict[str, t.Any], force: bool = False, folder_name: t.Union[str, None] = None
+    ) -> bool:
+        """
+        Upload a dashboard to the configured folder, or to `folder_name`, see `Grafana.import_dashboard`.
+        """
+        return await self._run(self._import_dashboard_flow(dashboard, force=force, folder_name=folder_name))
+
+    async def is_unchanged(self, uid: str, fingerprint: str) -> bool:
+        """
+        Check whether a dashboard on the server has the given content, see `Grafana.is_unchanged`.
+        """
+        return await self._run(self._is_unchanged_flow(uid, fingerprint))
@@ -0,0 +1,180 @@
+import copy
+import logging
+import re
+import typing as t
+
+from grafana_import.bulk import BulkOutcome, run_bulk
+from grafana_import.catalog import dashboard_in_folder
+from grafana_import.grafana import Grafana
+from grafana_import.sync import SyncState, dashboard_fingerprint
+
+logger = logging.getLogger(__name__)
+
+CREATE = "create"
+UPDATE = "update"
+UNCHANGED = "unchanged"
+PRUNE = "prune"
+
+# Symbols used when displaying plan items.
+SYMBOLS = {CREATE: "+", UPDATE: "~", UNCHANGED: "=", PRUNE: "-"}
+
+
+class PlanItem(t.NamedTuple):
+    """
+    A single change of an import plan.
+
+    Dashboards to create or update carry the rendered dashboard and the file it
+    has been read from. Dashboards to prune carry the uid of the remote dashboard.
+    """
+
+    action: str
+    title: str
+    file: t.Union[str, None] = None
+    uid: t.Union[str, None] = None
+    dashboard: t.Union[t.Dict[str, t.Any], None] = None
+
+
+class ImportPlan:
+    """
+    Difference between a set of local dashboard files and the dashboards within a Grafana folder.
+    """
+
+    def __init__(self, folder: str, prune: bool = False):
+        self.folder = folder
+        self.prune = prune
+        self.items: t.List[PlanItem] = []
+        self.errors: t.List[BulkOutcome] = []
+
+    def select(self, *actions: str) -> t.List[PlanItem]:
+        return [item for item in self.items if item.action in actions]
+
+    @property
+    def changes(self) -> t.List[PlanItem]:
+        return self.select(CREATE, UPDATE, PRUNE)
+
+    def summary(self) -> str:
+        counts = {action: len(self.select(action)) for action in [CREATE, UPDATE, UNCHANGED, PRUNE]}
+        text = (
+            f"Plan for folder '{self.folder}': {counts[CREATE]} to create, {counts[UPDATE]} to update, "
+            f"{counts[UNCHANGED]} unchanged, {counts[PRUNE]} to prune"
+        )
+        if self.errors:
+            text += f", {len(self.errors)} failed to load"
+        return text
+
+    def format(self) -> str:
+        """
+        Render the plan as text, listing all changes, and all dashboard files which failed to load.
+        """
+        lines = [self.summary()]
+        for item in self.changes:
+            origin = item.file if item.file is not None else f"uid: {item.uid}"
+            lines.append(f"  {SYMBOLS[item.action]} {item.action:<7} {item.title}  ({origin})")
+        for outcome in self.errors:
+            lines.append(f"  ! error   {outcome.item}: {outcome.error}")
+        return "\n".join(lines)
+
+
+def folder_dashboards(grafana: Grafana, folder: t.Union[t.Dict[str, t.Any], None]) -> t.Dict[str, t.Dict[str, t.Any]]:
+    """
+    Select the dashboards within a folder, or within `General`, when it is `None`, from the catalog, by title.
+    """
+    return {board["title"]: board for board in grafana.get_dashboards() if dashboard_in_folder(board, folder)}
+
+
+def plan_import(grafana: Grafana, rendered: t.List[BulkOutcome], prune: bool = False, jobs: int = 1) -> ImportPlan:
+    """
+    Compute the changes needed to reconcile the configured Grafana folder with a set of rendered dashboards.
+
+    The remote set is acquired from a single pass over the search API. Content
+    hashes of remote dashboards are taken from the sync state of the last import,
+    so only dashboards whose hash is unknown are fetched from the server, using
+    `jobs` worker threads. With `prune`, remote dashboards not present locally are
+    scheduled for removal, unless any dashboard file failed to load.
+    """
+    if grafana.sync_state is None:
+        raise ValueError("Planning an import requires sync mode")
+    plan = ImportPlan(folder=grafana.grafana_folder, prune=prune)
+
+    # * bulk operations do not revalidate single entries, so do not use the persistent cache.
+    if grafana.get_dashboards().cached:
+        grafana.cache.refresh_dashboards()
+
+    folder = None
+    remote: t.Dict[str, t.Dict[str, t.Any]] = {}
+    if not re.match("general", grafana.grafana_folder, re.IGNORECASE):
+        folder = grafana.get_folder(grafana.grafana_folder)
+        if folder is not None:
+            remote = folder_dashboards(grafana, folder)
+    else:
+        remote = folder_dashboards(grafana, None)
+
+    local: t.Dict[str, t.Tuple[str, t.Dict[str, t.Any]]] = {}
+    for outcome in rendered:
+        if not outcome.ok:
+            plan.errors.append(outcome)
+            continue
+        title = outcome.result["title"]
+        if title in local:
+            error = ValueError(f"Duplicate dashboard title '{title}', also in: {local[title][0]}")
+            plan.errors.append(BulkOutcome(item=outcome.item, error=error))
+            continue
+        local[title] = (outcome.item, outcome.result)
+
+    def compare(title: str) -> str:
+        file, dashboard = local[title]
+        board = remote.get(title)
+        if board is None:
+            return CREATE
+        if grafana.is_unchanged(board["uid"], dashboard_fingerprint(dashboard, keep_uid=grafana.keep_uid)):
+            return UNCHANGED
+        return UPDATE
+
+    for outcome in run_bulk(compare, list(local), jobs=jobs):
+        title = outcome.item
+        file, dashboard = local[title]
+        if not outcome.ok:
+            plan.errors.append(BulkOutcome(item=file, error=outcome.error))
+            continue
+        uid = remote[title]["uid"] if title in remote else None
+        plan.items.append(PlanItem(action=outcome.result, title=title, file=file, uid=uid, dashboard=dashboard))
+
+    if prune:
+        if plan.errors:
+            logger.warning("Not pruning any dashboards, because some dashboard files failed to load")
+        else:
+            for title, board in remote.items():
+                if title not in local:
+                    plan.items.append(PlanItem(action=PRUNE, title=title, uid=board["uid"]))
+
+    plan.items.sort(key=lambda item: item.title)
+    return plan
+
+
+def apply_plan(grafana: Grafana, plan: ImportPlan, jobs: int = 1) -> t.List[BulkOutcome]:
+    """
+    Execute the changes of an import plan, using `jobs` worker threads.
+
+    Only dashboards to create, update, or prune, cause requests to the server.
+    Outcomes are returned per plan item.
+    """
+    changes = plan.changes
+    if plan.select(CREATE, UPDATE):
+        grafana.ensure_folders([plan.folder])
+
+    def execute(item: PlanItem) -> t.Any:
+        if item.action == PRUNE:
+            return grafana.delete_dashboard(t.cast(str, item.uid))
+        if not grafana.import_dashboard(copy.deepcopy(t.cast(t.Dict[str, t.Any], item.dashboard)), force=True):
+            raise IOError(f"Failed to import dashboard into Grafana. title={item.title}")
+        return True
+
+    outcomes = run_bulk(execute, changes, jobs=jobs)
+    for outcome in outcomes:
+        item = outcome.item
+        if outcome.ok:
+            logger.info(f"OK: Dashboard '{item.title}' {item.action}d")
+        else:
+            logger.error(f"KO: Dashboard '{item.title}' {item.action} failed. Reason: {outcome.error}")
+    t.cast(SyncState, grafana.sync_state).save()
+    return outcomes
@@ -1,50 +1,212 @@
+import collections
+import fnmatch
 import logging
+import queue
+import signal
+import threading
 import time
 import typing as t
 from pathlib import Path
 
-from watchdog.events import FileSystemEvent, PatternMatchingEventHandler
+from watchdog.events import FileSystemEvent, FileSystemEventHandler
 from watchdog.observers import Observer
 
+from grafana_import.builder import DependencyGraph
+
 logger = logging.getLogger(__name__)
 
+# Default quiet period in seconds, used to coalesce bursts of file system events.
+DEFAULT_DELAY = 0.5
+
+# Number of processing latencies to retain.
+LATENCY_HISTORY = 1000
+
+# File system events which indicate changed file content.
+CHANGE_EVENTS = ["created", "modified", "moved", "closed"]
+
+# Files written by editors, interpreters, and version control, which do not contribute to dashboards.
+IGNORE_PATTERNS = [".*", "*~", "*.swp", "*.swx", "*.tmp", "*.pyc", "4913"]
+IGNORE_DIRECTORIES = [".git", "__pycache__"]
+
+
+class ChangeEvent(t.NamedTuple):
+    """
+    A changed file, and the monotonic time the change has been observed.
+    """
+
+    path: Path
+    observed: float
+
+
+class DashboardTreeHandler(FileSystemEventHandler):
+    """
+    Forward changes within a directory tree to an event queue.
+
+    The handler runs on the observer thread, so it only filters and enqueues
+    events, in order to never block event delivery.
+    """
+
+    def __init__(self, events: "queue.Queue[t.Union[ChangeEvent, None]]"):
+        self.events = events
+        super().__init__()
+
+    @staticmethod
+    def ignored(path: Path) -> bool:
+        if any(part in IGNORE_DIRECTORIES for part in path.parts):
+            return True
+        return any(fnmatch.fnmatch(path.name, pattern) for pattern in IGNORE_PATTERNS)
+
+    def on_any_event(self, event: FileSystemEvent) -> None:
+        if event.is_directory or event.event_type not in CHANGE_EVENTS:
+            return
+        src_path = event.dest_path if event.event_type == "moved" else event.src_path
+        path = DependencyGraph.normalize(src_path if isinstance(src_path, str) else src_path.decode())
+        if self.ignored(path):
+            return
+        logger.debug(f"File was modified: {path}")
+        self.events.put(ChangeEvent(path=path, observed=time.monotonic()))
+
+
+class WatchdogService:
+    """
+    Watch the directory trees of dashboard files, and process affected dashboards, when changed.
+
+    File system events are delivered to an event queue, and processed by a worker
+    thread, so slow uploads do not stall event delivery. Bursts of events, as emitted
+    by editors on save, are coalesced until no further event arrived for `delay`
+    seconds. A change to any file processes the dashboards depending on it,
+    according to the dependency graph. Dependencies of processed dashboards are
+    discovered again, in order to pick up added or removed imports.
+
+    The processing latency of each change, from observing the event until all
+    affected dashboards have been processed, is retained in `latencies`.
 
-class SingleFileModifiedHandler(PatternMatchingEventHandler):
+    https://python-watchdog.readthedocs.io/en/stable/quickstart.html
+    """
 
     def __init__(
         self,
-        *args,
-        action: t.Union[t.Callable, None] = None,
-        **kwargs,
+        paths: t.Iterable[t.Union[str, Path]],
+        action: t.Callable[[Path], t.Any],
+        delay: float = DEFAULT_DELAY,
+        graph: t.Union[DependencyGraph, None] = None,
     ):
+        self.dashboards = [DependencyGraph.normalize(path) for path in paths]
+        self.graph = graph if graph is not None else DependencyGraph(self.dashboards)
         self.action = action
-        super().__init__(*args, **kwargs)
+        self.delay = delay
+        self.events: "queue.Queue[t.Union[ChangeEvent, None]]" = queue.Queue()
+        self.handler = DashboardTreeHandler(self.events)
+        self.observer = Observer()
+        self.worker = threading.Thread(target=self.work, name="grafana-import-watchdog", daemon=True)
+        self.stopping = threading.Event()
+        self.latencies: t.Deque[t.Tuple[Path, float]] = collections.deque(maxlen=LATENCY_HISTORY)
 
-    def on_modified(self, event: FileSystemEvent) -> None:
-        super().on_modified(event)
-        logger.info(f"File was modified: {event.src_path}")
+    def affected(self, paths: t.Iterable[Path]) -> t.List[Path]:
+        """
+        Return the dashboards affected by a set of changed files, in their original order.
+        """
+        return self.graph.affected(paths)
+
+    def collect(self, first: ChangeEvent) -> t.Union[t.Dict[Path, float], None]:
+        """
+        Coalesce a burst of events, until the quiet period elapsed, or return `None` when stopping.
+        """
+        batch = {first.path: first.observed}
+        while True:
+            try:
+                event = self.events.get(timeout=self.delay)
+            except queue.Empty:
+                return batch
+            if event is None:
+                return None
+            batch.setdefault(event.path, event.observed)
+
+    def process(self, batch: t.Dict[Path, float]) -> None:
+        """
+        Process all dashboards affected by a batch of changes, and record the latency of each change.
+        """
+        for dashboard in self.affected(batch):
+            logger.info(f"Processing changed dashboard: {dashboard}")
+            self.graph.update(dashboard)
+            try:
+                self.action(dashboard)
+                logger.debug(f"File processed successfully: {dashboard}")
+            except Exception:
+                logger.exception(f"Processing file failed: {dashboard}")
+        completed = time.monotonic()
+        for path, observed in batch.items():
+            self.latencies.append((path, completed - observed))
+        latency = completed - min(batch.values())
+        logger.info(f"Processed {len(batch)} changed files, latency: {latency:.3f}s")
+
+    def work(self) -> None:
+        while True:
+            event = self.events.get()
+            if event is None:
+                return
+            batch = self.collect(event)
+            if batch is None:
+                return
+            self.process(batch)
+
+    def start(self) -> None:
+        for directory in watch_directories(self.graph.dependents):
+            logger.info(f"Watching directory for changes: {directory}")
+            self.observer.schedule(self.handler, str(directory), recursive=True)
+        self.observer.start()
+        self.worker.start()
+
+    def stop(self) -> None:
+        """
+        Stop observing changes, and wait for the dashboard currently being processed.
+        """
+        self.stopping.set()
+        self.observer.stop()
+        self.events.put(None)
+        self.observer.join()
+        self.worker.join()
+
+    def run(self) -> None:
+        """
+        Run until receiving SIGINT or SIGTERM.
+        """
+
+        def shutdown(signum, frame):
+            logger.info(f"Received signal {signum}, shutting down")
+            self.stopping.set()
+
+        handlers = {signum: signal.signal(signum, shutdown) for signum in [signal.SIGINT, signal.SIGTERM]}
+        self.start()
         try:
-            self.action and self.action()
-            logger.debug(f"File processed successfully: {event.src_path}")
-        except Exception:
-            logger.exception(f"Processing file failed: {event.src_path}")
+            self.stopping.wait()
+        finally:
+            self.stop()
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
 
 
-def watchdog_service(path: Path, action: t.Union[t.Callable, None] = None) -> None:
+def watch_directories(paths: t.Iterable[Path]) -> t.List[Path]:
     """
-    https://python-watchdog.readthedocs.io/en/stable/quickstart.html
+    Compute the minimal set of directories to watch recursively, covering all dashboard files and their dependencies.
     """
+    directories = sorted({path.parent for path in paths}, key=lambda path: len(path.parts))
+    roots: t.List[Path] = []
+    for directory in directories:
+        if not any(root == directory or root in directory.parents for root in roots):
+            roots.append(directory)
+    return roots
 
-    import_file = Path(path).absolute()
-    import_path = import_file.parent
 
-    event_handler = SingleFileModifiedHandler(action=action, patterns=[import_file.name], ignore_directories=True)
-    observer = Observer()
-    observer.schedule(event_handler, str(import_path), recursive=False)
-    observer.start()
-    try:
-        while True:
-            time.sleep(1)
-    finally:
-        observer.stop()
-        observer.join()
+def watchdog_service(
+    paths: t.Union[str, Path, t.Iterable[t.Union[str, Path]]],
+    action: t.Callable[[Path], t.Any],
+    delay: float = DEFAULT_DELAY,
+    graph: t.Union[DependencyGraph, None] = None,
+) -> None:
+    """
+    Watch the directory trees of dashboard files, and invoke `action` for each affected dashboard, when changed.
+    """
+    if isinstance(paths, (str, Path)):
+        paths = [paths]
+    WatchdogService(paths, action=action, delay=delay, graph=graph).run()
@@ -0,0 +1,101 @@
+import hashlib
+import json
+import logging
+import threading
+import typing as t
+from pathlib import Path
+
+from grafana_import.util import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+# Dashboard attributes maintained by Grafana, which do not contribute to the content of a dashboard.
+VOLATILE_FIELDS = ["id", "version", "iteration"]
+
+
+def dashboard_fingerprint(dashboard: t.Dict[str, t.Any], keep_uid: bool = False) -> str:
+    """
+    Compute a content hash of a dashboard, ignoring volatile attributes.
+
+    The dashboard uid is ignored as well, unless `keep_uid` is set, because
+    the import operation will adjust it to the uid of the existing dashboard.
+    """
+    ignore = set(VOLATILE_FIELDS)
+    if not keep_uid:
+        ignore.add("uid")
+    normalized = {key: value for key, value in dashboard.items() if key not in ignore}
+    payload = json.dumps(normalized, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SyncState:
+    """
+    Remember the content hashes of the most recently imported dashboards, by uid.
+
+    The state is kept in memory, and optionally persisted to a JSON file, so that
+    subsequent invocations can skip uploading unchanged dashboards without
+    inquiring the server.
+
+    In addition, it remembers the content hashes of dashboard files and their
+    dependencies, by file name and destination folder, so that subsequent
+    invocations can also skip rendering dashboards whose sources did not change.
+    """
+
+    def __init__(self, path: t.Union[str, Path, None] = None):
+        self.path = Path(path) if path is not None else None
+        self.lock = threading.Lock()
+        self.hashes: t.Dict[str, str] = {}
+        self.sources: t.Dict[str, t.Dict[str, str]] = {}
+        self.dirty = False
+        if self.path is not None and self.path.exists():
+            try:
+                with open(self.path, "r") as f:
+                    data = json.load(f)
+                self.hashes = data["dashboards"]
+                self.sources = data["sources"]
+            except (OSError, ValueError, KeyError, TypeError) as ex:
+                logger.warning(f"Reading sync state failed: {self.path}. Reason: {ex}")
+
+    def get(self, uid: str) -> t.Union[str, None]:
+        return self.hashes.get(uid)
+
+    def set(self, uid: str, digest: str) -> None:
+        with self.lock:
+            if self.hashes.get(uid) != digest:
+                self.hashes[uid] = digest
+                self.dirty = True
+
+    def discard(self, uid: str) -> None:
+        with self.lock:
+            if self.hashes.pop(uid, None) is not None:
+                self.dirty = True
+
+    @staticmethod
+    def source_key(path: t.Union[str, Path], folder: str) -> str:
+        return f"{folder}|{Path(path).absolute()}"
+
+    def get_source(self, path: t.Union[str, Path], folder: str) -> t.Union[t.Dict[str, str], None]:
+        """
+        Return the content hash and the title of the dashboard most recently imported from a file into a folder.
+        """
+        return self.sources.get(self.source_key(path, folder))
+
+    def set_source(self, path: t.Union[str, Path], folder: str, digest: str, title: str) -> None:
+        key = self.source_key(path, folder)
+        entry = {"digest": digest, "title": title}
+        with self.lock:
+            if self.sources.get(key) != entry:
+                self.sources[key] = entry
+                self.dirty = True
+
+    def save(self) -> None:
+        """
+        Persist the state, when it has been modified.
+        """
+        if self.path is None:
+            return
+        with self.lock:
+            if not self.dirty:
+                return
+            write_json_atomic(self.path, {"dashboards": self.hashes, "sources": self.sources}, sort_keys=True)
+            self.dirty = False
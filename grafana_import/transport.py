@@ -0,0 +1,303 @@
+import asyncio
+import contextlib
+import logging
+import threading
+import time
+import typing as t
+
+import niquests
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# Default timeout in seconds for connecting to Grafana, and for reading its responses.
+DEFAULT_TIMEOUT = 5.0
+
+# Default number of connections to keep in the connection pool.
+DEFAULT_SESSION_POOL_SIZE = 10
+
+# Default number of seconds an idle connection is kept alive for reuse.
+DEFAULT_KEEPALIVE_TIMEOUT = 600.0
+
+# Default number of retries for failed requests, and the base delay of the exponential backoff in seconds.
+# Retries are opt-in, so an unreachable server fails right away.
+DEFAULT_RETRIES = 0
+DEFAULT_RETRY_BACKOFF = 0.5
+
+# Upper bounds for delays between retries in seconds, computed by backoff, or requested by `Retry-After`.
+RETRY_BACKOFF_MAX = 30
+RETRY_AFTER_MAX = 120
+
+# Transient response status codes which are retried.
+RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+
+
+class GrafanaRetry(Retry):
+    """
+    Retry policy for requests to Grafana.
+
+    Idempotent requests are retried on connection errors, read errors, and all
+    transient response status codes. Other requests, like uploading dashboards,
+    are only retried on connection errors, and on responses indicating the
+    request has not been processed. Delays follow an exponential backoff, or
+    the `Retry-After` response header, when present. Each retry also waits for
+    a token of the rate limiter of the `governor`, when given.
+    """
+
+    # Responses indicating the server did not process the request.
+    UNPROCESSED_STATUS_CODES = frozenset([429, 503])
+
+    governor: t.Optional["Governor"] = None
+
+    def new(self, **kw: t.Any) -> "GrafanaRetry":
+        retry = t.cast(GrafanaRetry, super().new(**kw))
+        retry.governor = self.governor
+        return retry
+
+    def sleep(self, response=None) -> None:
+        super().sleep(response)
+        if self.governor is not None:
+            self.governor.throttle()
+
+    async def async_sleep(self, response=None) -> None:
+        await super().async_sleep(response)
+        if self.governor is not None:
+            await self.governor.throttle_async()
+
+    def is_retry(self, method: str, status_code: int, has_retry_after: bool = False) -> bool:
+        if status_code in self.UNPROCESSED_STATUS_CODES:
+            return True
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+class TransportSettings(t.NamedTuple):
+    """
+    Connection pool, keep-alive, timeout, and retry settings for the HTTP session used to talk to Grafana.
+    """
+
+    timeout: float = DEFAULT_TIMEOUT
+    session_pool_size: int = DEFAULT_SESSION_POOL_SIZE
+    keepalive: bool = True
+    keepalive_timeout: float = DEFAULT_KEEPALIVE_TIMEOUT
+    retries: int = DEFAULT_RETRIES
+    retry_backoff: float = DEFAULT_RETRY_BACKOFF
+    rate_limit: float = 0.0
+    rate_burst: int = 1
+    max_in_flight: int = 0
+
+    @classmethod
+    def from_kwargs(cls, kwargs: t.Dict[str, t.Any], **defaults) -> "TransportSettings":
+        """
+        Acquire settings from keyword arguments, falling back to the given defaults, or the global defaults.
+        """
+        values = cls(**defaults)._asdict()
+        for field in cls._fields:
+            if kwargs.get(field) is not None:
+                values[field] = kwargs[field]
+        settings = cls(
+            timeout=float(values["timeout"]),
+            session_pool_size=int(values["session_pool_size"]),
+            keepalive=bool(values["keepalive"]),
+            keepalive_timeout=float(values["keepalive_timeout"]),
+            retries=int(values["retries"]),
+            retry_backoff=float(values["retry_backoff"]),
+            rate_limit=float(values["rate_limit"]),
+            rate_burst=int(values["rate_burst"]),
+            max_in_flight=int(values["max_in_flight"]),
+        )
+        if settings.timeout <= 0:
+            raise ValueError(f"Invalid value for timeout: {settings.timeout}")
+        if settings.session_pool_size < 1:
+            raise ValueError(f"Invalid value for session_pool_size: {settings.session_pool_size}")
+        if settings.retries < 0:
+            raise ValueError(f"Invalid value for retries: {settings.retries}")
+        if settings.rate_limit < 0:
+            raise ValueError(f"Invalid value for rate_limit: {settings.rate_limit}")
+        if settings.rate_burst < 1:
+            raise ValueError(f"Invalid value for rate_burst: {settings.rate_burst}")
+        if settings.max_in_flight < 0:
+            raise ValueError(f"Invalid value for max_in_flight: {settings.max_in_flight}")
+        return settings
+
+    def retry(self, governor: t.Optional["Governor"] = None) -> GrafanaRetry:
+        retry = GrafanaRetry(
+            total=self.retries,
+            status_forcelist=RETRY_STATUS_CODES,
+            backoff_factor=self.retry_backoff,
+            backoff_max=RETRY_BACKOFF_MAX,
+            retry_after_max=RETRY_AFTER_MAX,
+            respect_retry_after_header=True,
+            # Hand out the final response, so the client can report the error of the server.
+            raise_on_status=False,
+        )
+        retry.governor = governor
+        return retry
+
+
+class RateLimiter:
+    """
+    Token bucket, permitting `rate` requests per second on average, and bursts of up to `burst` requests.
+
+    Callers reserve a token, and wait for the returned delay themselves, so the
+    same limiter serves both threads and coroutines. Reservations beyond the
+    available tokens are queued, by letting the bucket go into debt.
+    """
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Take a token, and return the number of seconds to wait until it is available.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+
+class Governor:
+    """
+    Throttle requests to Grafana, by rate, and by the number of requests in flight.
+
+    Parallel uploads easily overload the database of Grafana, so all requests of
+    a session, from all threads or coroutines, pass through the governor.
+    Retries of requests wait for a rate token again, using `throttle`. The
+    total time requests have been held back is accounted in `throttled`.
+    """
+
+    def __init__(self, rate_limit: float = 0, rate_burst: int = 1, max_in_flight: int = 0) -> None:
+        self.limiter = RateLimiter(rate_limit, rate_burst) if rate_limit else None
+        self.max_in_flight = max_in_flight
+        self.slots = threading.BoundedSemaphore(max_in_flight) if max_in_flight else None
+        self.async_slots: t.Optional[asyncio.Semaphore] = None
+        self.throttled = 0.0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, settings: TransportSettings) -> t.Optional["Governor"]:
+        if not settings.rate_limit and not settings.max_in_flight:
+            return None
+        return cls(rate_limit=settings.rate_limit, rate_burst=settings.rate_burst, max_in_flight=settings.max_in_flight)
+
+    def account(self, started: float) -> None:
+        with self.lock:
+            self.throttled += time.monotonic() - started
+
+    def throttle(self) -> None:
+        """
+        Wait for a rate token, blocking the current thread.
+        """
+        started = time.monotonic()
+        if self.limiter is not None:
+            delay = self.limiter.reserve()
+            if delay:
+                time.sleep(delay)
+        self.account(started)
+
+    async def throttle_async(self) -> None:
+        """
+        Wait for a rate token, suspending the current coroutine.
+        """
+        started = time.monotonic()
+        if self.limiter is not None:
+            delay = self.limiter.reserve()
+            if delay:
+                await asyncio.sleep(delay)
+        self.account(started)
+
+    @contextlib.contextmanager
+    def acquire(self) -> t.Iterator[None]:
+        """
+        Hold an in-flight slot, and wait for a rate token, blocking the current thread.
+        """
+        started = time.monotonic()
+        if self.slots is not None:
+            self.slots.acquire()
+        try:
+            self.account(started)
+            self.throttle()
+            yield
+        finally:
+            if self.slots is not None:
+                self.slots.release()
+
+    @contextlib.asynccontextmanager
+    async def acquire_async(self) -> t.AsyncIterator[None]:
+        """
+        Hold an in-flight slot, and wait for a rate token, suspending the current coroutine.
+        """
+        started = time.monotonic()
+        # The semaphore is created on first use, within the running event loop.
+        if self.max_in_flight and self.async_slots is None:
+            self.async_slots = asyncio.Semaphore(self.max_in_flight)
+        if self.async_slots is not None:
+            await self.async_slots.acquire()
+        try:
+            self.account(started)
+            await self.throttle_async()
+            yield
+        finally:
+            if self.async_slots is not None:
+                self.async_slots.release()
+
+
+class GovernedSession(niquests.Session):
+    """
+    HTTP session passing all requests through an optional governor.
+    """
+
+    governor: t.Optional[Governor] = None
+
+    def request(self, *args, **kwargs):
+        if self.governor is None:
+            return super().request(*args, **kwargs)
+        with self.governor.acquire():
+            return super().request(*args, **kwargs)
+
+
+class AsyncGovernedSession(niquests.AsyncSession):
+    """
+    Asynchronous HTTP session passing all requests through an optional governor.
+    """
+
+    governor: t.Optional[Governor] = None
+
+    async def request(self, *args, **kwargs):
+        if self.governor is None:
+            return await super().request(*args, **kwargs)
+        async with self.governor.acquire_async():
+            return await super().request(*args, **kwargs)
+
+
+def configure_client(client: t.Any, settings: TransportSettings) -> None:
+    """
+    Replace the HTTP session of a grafana-client client object, applying the transport settings.
+
+    Works with both synchronous and asynchronous clients. Session headers,
+    like the user agent and the organization id, are retained.
+    """
+    session: t.Union[GovernedSession, AsyncGovernedSession]
+    session_class = AsyncGovernedSession if isinstance(client.s, niquests.AsyncSession) else GovernedSession
+    governor = Governor.from_settings(settings)
+    session = session_class(
+        pool_connections=settings.session_pool_size,
+        pool_maxsize=settings.session_pool_size,
+        retries=settings.retry(governor=governor),
+        keepalive_delay=settings.keepalive_timeout,
+    )
+    session.headers.update(client.s.headers)
+    session.headers["User-Agent"] = client.user_agent
+    session.headers["Connection"] = "keep-alive" if settings.keepalive else "close"
+    session.governor = governor
+    client.s = session
+    client.timeout = settings.timeout
+    client.session_pool_size = settings.session_pool_size
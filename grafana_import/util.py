@@ -1,3 +1,5 @@
+import contextlib
+import fnmatch
 import json
 import logging
 import os
@@ -5,10 +7,18 @@ import shlex
 import subprocess
 import sys
 import typing as t
+import uuid
 from pathlib import Path
 
 import yaml
 
+from grafana_import.transport import TransportSettings
+
+if t.TYPE_CHECKING:
+    from grafana_import.builder import JsonnetEvaluator, RenderCache
+
+logger = logging.getLogger(__name__)
+
 ConfigType = t.Dict[str, t.Any]
 SettingsType = t.Dict[str, t.Union[str, int, bool]]
 
@@ -57,14 +67,20 @@ def grafana_settings(
     if not params and config is not None and label is not None:
         params = grafana_settings_from_config_section(config=config, label=label)
 
-    # Additional application parameters.
+    # Additional application parameters, from the connection profile, when selected by label.
     if config is not None:
+        section = config.get("grafana", {})
+        if label is not None and isinstance(section.get(label), dict):
+            section = section[label]
         params.update(
             {
-                "search_api_limit": config.get("grafana", {}).get("search_api_limit", 5000),
+                "search_api_limit": section.get("search_api_limit", 5000),
                 "folder": config.get("general", {}).get("grafana_folder", "General"),
             }
         )
+        for key in ["cache_ttl", "cache_path", *TransportSettings._fields]:
+            if key in section:
+                params[key] = section[key]
     return params
 
 
@@ -74,29 +90,45 @@ def grafana_settings_from_config_section(config: ConfigType, label: t.Union[str,
 
     The configuration contains multiple connection profiles within the `grafana`
     section. In order to address a specific profile, this function accepts a
-    `label` string.
+    `label` string. The configuration dictionary is not modified, so it can be
+    used to acquire settings of many profiles.
     """
     if not label or not config.get("grafana", {}).get(label):
         raise ValueError(f"Invalid Grafana configuration label: {label}")
 
-    # Initialize default configuration from Grafana by label.
-    # FIXME: That is certainly a code smell.
-    #        Q: Has it been introduced later in order to support multiple connection profiles?
-    #        Q: Is it needed to update the original `config` dict, or can it just be omitted?
-    config["grafana"] = config["grafana"][label]
+    profile = config["grafana"][label]
 
-    if "token" not in config["grafana"]:
+    if "token" not in profile:
         raise ValueError(f"Authentication token missing in Grafana configuration at: {label}")
 
     return {
-        "host": config["grafana"].get("host", "localhost"),
-        "protocol": config["grafana"].get("protocol", "http"),
-        "port": config["grafana"].get("port", "3000"),
-        "token": config["grafana"].get("token"),
-        "verify_ssl": config["grafana"].get("verify_ssl", True),
+        "host": profile.get("host", "localhost"),
+        "protocol": profile.get("protocol", "http"),
+        "port": profile.get("port", "3000"),
+        "token": profile.get("token"),
+        "verify_ssl": profile.get("verify_ssl", True),
     }
 
 
+def grafana_labels(config: ConfigType, selector: str) -> t.List[str]:
+    """
+    Resolve a selector to labels of Grafana connection profiles, in the order of the configuration file.
+
+    The selector is a comma-separated list of labels, or glob patterns, like
+    `prod-*`, or `*` to select all connection profiles.
+    """
+    labels = [label for label, profile in config.get("grafana", {}).items() if isinstance(profile, dict)]
+    selected: t.List[str] = []
+    for pattern in [item.strip() for item in selector.split(",") if item.strip()]:
+        matches = fnmatch.filter(labels, pattern)
+        if not matches:
+            raise ValueError(f"Invalid Grafana configuration label: {pattern}")
+        selected += [label for label in matches if label not in selected]
+    if not selected:
+        raise ValueError(f"Invalid Grafana configuration label: {selector}")
+    return selected
+
+
 def file_is_executable(path: t.Union[str, Path]) -> bool:
     """
     Is this file executable?
@@ -106,13 +138,33 @@ def file_is_executable(path: t.Union[str, Path]) -> bool:
     return os.access(str(path), os.X_OK)
 
 
-def read_dashboard_file(path: t.Union[str, Path]) -> t.Dict[str, t.Any]:
+def read_dashboard_file(
+    path: t.Union[str, Path], cache: t.Union["RenderCache", None] = None, inprocess: bool = False
+) -> t.Dict[str, t.Any]:
     """
     Read dashboard file, and return its representation.
+
+    When a render cache is given, dashboards rendered by builders are looked up
+    there first, and stored there after rendering.
+
+    With `inprocess`, Python builders are executed within the running interpreter,
+    instead of spawning a new interpreter for each file. Jsonnet files are evaluated
+    using the `jsonnet` Python bindings, when installed.
     """
+    from grafana_import.builder import jsonnet_evaluator, render_python_inprocess
 
     path = Path(path)
 
+    if cache is not None and cache.cacheable(path):
+        key = cache.key(path)
+        dashboard = cache.get(key)
+        if dashboard is None:
+            dashboard = read_dashboard_file(path, inprocess=inprocess)
+            cache.put(key, dashboard)
+        else:
+            logger.debug(f"Using cached rendering of dashboard: {path}")
+        return dashboard
+
     if path.suffix == ".json":
         try:
             with open(path, "r") as f:
@@ -120,11 +172,17 @@ def read_dashboard_file(path: t.Union[str, Path]) -> t.Dict[str, t.Any]:
         except OSError as ex:
             raise IOError(f"Reading file failed: {path}. Reason: {ex.strerror}") from ex
 
+    elif path.suffix == ".jsonnet" and inprocess and jsonnet_evaluator() is not None:
+        payload = t.cast("JsonnetEvaluator", jsonnet_evaluator()).evaluate(path)
+
     elif path.suffix == ".jsonnet":
         # jsonnet --jpath vendor faro.jsonnet
         command = f"jsonnet --jpath {path.parent / 'vendor'} {path}"
         payload = subprocess.check_output(shlex.split(command), encoding="utf-8")  # noqa: S603
 
+    elif path.suffix == ".py" and inprocess:
+        return render_python_inprocess(path)
+
     elif path.suffix == ".py":
         command = f"{sys.executable} {path}"
         payload = subprocess.check_output(shlex.split(command), encoding="utf-8")  # noqa: S603
@@ -139,3 +197,37 @@ def read_dashboard_file(path: t.Union[str, Path]) -> t.Dict[str, t.Any]:
         return json.loads(payload)
     except json.JSONDecodeError as ex:
         raise IOError(f"Decoding JSON output from file failed: {path}. Reason: {ex}") from ex
+
+
+@contextlib.contextmanager
+def atomic_write(path: t.Union[str, Path], mode: str = "w") -> t.Generator[t.IO, None, None]:
+    """
+    Write a file atomically, by writing to a temporary file next to it, and renaming it when finished.
+
+    When writing fails, the temporary file is removed, and an existing file at
+    `path` is left untouched, so readers never observe a half-written file.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        with open(tmp, mode.replace("w", "x")) as fp:
+            yield fp
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp)
+        raise
+
+
+def write_json_atomic(path: t.Union[str, Path], data: t.Any, **kwargs) -> None:
+    """
+    Write data in JSON format to a temporary file, and rename it to its final name.
+
+    Data is serialized chunk by chunk, without building the whole document in
+    memory. Readers never see partially written files, also when writing fails.
+    """
+    with atomic_write(path) as f:
+        json.dump(data, f, **kwargs)
@@ -6,7 +6,7 @@ from grafana_import.constants import PKG_NAME, PKG_VERSION
 
 # Global variables
 requires = [
-    "grafana-client<5",
+    "grafana-client>=4,<5",
     "jinja2<4",
     "pyyaml<7",
     "watchdog<5",
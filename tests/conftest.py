@@ -74,12 +74,6 @@ def settings(config):
     return grafana_settings(url=None, config=config, label="default")
 
 
-@pytest.fixture(autouse=True)
-def reset_grafana_importer():
-    Grafana.folders = []
-    Grafana.dashboards = []
-
-
 @pytest.fixture
 def gio_factory(settings) -> t.Callable:
     def mkgrafana(use_settings: bool = True) -> Grafana:
@@ -0,0 +1,335 @@
+import gzip
+import json
+import shlex
+import sys
+import tarfile
+from unittest import mock
+
+import pytest
+import responses
+
+from grafana_import.archive import NdjsonWriter, TarWriter, open_archive, read_archive
+from grafana_import.backup import ExportManifest
+from grafana_import.bulk import run_bulk
+from grafana_import.cli import main
+from tests.util import mock_grafana_folder_dashboards, mock_grafana_health, mock_grafana_same_title_folders
+
+
+def test_ndjson_writer(tmp_path):
+    """
+    Verify writing many dashboards concurrently into a newline-delimited JSON file.
+    """
+    path = tmp_path / "backup.ndjson"
+    with open_archive(path) as archive:
+        assert isinstance(archive, NdjsonWriter)
+        run_bulk(
+            lambda index: archive.add(f"dashboard-{index}.json", {"title": f"Dashboard {index}"}, {"folderId": 0}),
+            range(20),
+            jobs=4,
+        )
+        assert not path.exists()
+
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert archive.count == 20
+    assert sorted(record["dashboard"]["title"] for record in records[:-1]) == sorted(
+        f"Dashboard {index}" for index in range(20)
+    )
+    assert records[0]["meta"] == {"folderId": 0}
+    assert records[-1]["kind"] == "manifest"
+    assert len(records[-1]["dashboards"]) == 20
+
+
+def test_tar_writer(tmp_path):
+    """
+    Verify writing dashboards as members of a tar archive, and discarding it when failing.
+    """
+    path = tmp_path / "backup.tar"
+    with open_archive(path, pretty=True) as archive:
+        assert isinstance(archive, TarWriter)
+        archive.add("foo.json", {"title": "foo"})
+        archive.add("bar.json", {"title": "bar"})
+
+    with tarfile.open(path) as tar:
+        assert tar.getnames() == ["dashboards/foo.json", "dashboards/bar.json", "manifest.json"]
+        assert json.load(tar.extractfile("dashboards/bar.json")) == {"title": "bar"}
+
+    with pytest.raises(RuntimeError):
+        with open_archive(tmp_path / "failed.tar") as archive:
+            archive.add("foo.json", {"title": "foo"})
+            raise RuntimeError("Interrupted")
+    assert sorted(item.name for item in tmp_path.iterdir()) == ["backup.tar"]
+
+    with pytest.raises(ValueError) as ex:
+        open_archive(tmp_path / "backup.zip")
+    assert ex.match("Unsupported archive format")
+
+
+def test_archive_writer_cleanup(tmp_path):
+    """
+    Verify the temporary file is removed when setting up or completing an archive fails.
+    """
+    with mock.patch("tarfile.open", side_effect=tarfile.TarError("Setup failed")):
+        with pytest.raises(tarfile.TarError):
+            open_archive(tmp_path / "backup.tar")
+    assert list(tmp_path.iterdir()) == []
+
+    archive = open_archive(tmp_path / "backup.tar.gz")
+    archive.add("foo.json", {"title": "foo"})
+    close = archive.tar.close
+
+    def failing_close():
+        close()
+        raise OSError("Disk full")
+
+    with mock.patch.object(archive.tar, "close", side_effect=failing_close):
+        with pytest.raises(OSError):
+            archive.close()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_export_archive(mocked_responses, tmp_path, caplog):
+    """
+    Verify "export" writes many dashboards into a single archive file.
+    """
+    mock_grafana_folder_dashboards(mocked_responses)
+    mocked_responses.get(
+        "http://localhost:3000/api/folders/apps",
+        json={"id": 1, "uid": "apps", "title": "Applications", "parents": [{"uid": "team", "title": "Team"}]},
+    )
+    mocked_responses.assert_all_requests_are_fired = False
+
+    sys.argv = shlex.split(
+        f"grafana-import export --grafana_url http://localhost:3000 --base_path {tmp_path} "
+        f"--pattern '*' --jobs 2 --archive backup.tar.gz"
+    )
+    with pytest.raises(SystemExit) as ex:
+        main()
+    assert ex.match("0")
+
+    assert [item.name for item in tmp_path.iterdir()] == ["backup.tar.gz"]
+    with tarfile.open(tmp_path / "backup.tar.gz") as tar:
+        assert tar.getnames()[0] == "folders.json"
+        assert tar.getnames()[-1] == "manifest.json"
+        assert sorted(tar.getnames()[1:-1]) == [
+            "dashboards/apps/Applications_bar.json",
+            "dashboards/apps/Applications_baz.json",
+            "dashboards/foo.json",
+        ]
+        folders = json.load(tar.extractfile("folders.json"))
+    assert folders == [{"uid": "apps", "title": "Applications", "parentUid": None, "path": "Team/Applications"}]
+    assert "Summary: 3 of 3 dashboards exported, 0 failed" in caplog.messages
+
+
+@pytest.mark.parametrize("suffix", [".ndjson.gz", ".tar.gz"])
+def test_read_archive(tmp_path, suffix):
+    """
+    Verify reading compressed archives sequentially, with folder metadata, dashboards, and the manifest.
+    """
+    path = tmp_path / f"backup{suffix}"
+    with open_archive(path) as archive:
+        archive.add_folders([{"uid": "apps", "title": "Applications", "parentUid": None, "path": "Applications"}])
+        archive.add("foo.json", {"uid": "foo", "title": "foo", "version": 3})
+        archive.add("bar.json", {"uid": "bar", "title": "bar"}, {"folderUid": "apps", "folderTitle": "Applications"})
+    with gzip.open(path) as fp:
+        fp.read()
+
+    records = list(read_archive(path))
+    assert [record.kind for record in records] == ["folders", "dashboard", "dashboard", "manifest"]
+    assert records[1].data == {"uid": "foo", "title": "foo", "version": 3}
+    assert records[2].meta["folderUid"] == "apps"
+    manifest = records[-1].data
+    assert manifest["folders"] == 1
+    assert [(entry["uid"], entry["version"], entry["folderUid"]) for entry in manifest["dashboards"]] == [
+        ("foo", 3, None),
+        ("bar", None, "apps"),
+    ]
+
+
+@pytest.mark.parametrize("suffix", [".ndjson", ".tar"])
+def test_read_archive_reserved_titles(tmp_path, suffix):
+    """
+    Verify dashboards named like the metadata records are read back as dashboards.
+    """
+    path = tmp_path / f"backup{suffix}"
+    with open_archive(path) as archive:
+        archive.add_folders([])
+        archive.add("manifest.json", {"uid": "manifest", "title": "manifest"})
+        archive.add("folders.json", {"uid": "folders", "title": "folders"})
+
+    records = list(read_archive(path))
+    assert [record.kind for record in records] == ["folders", "dashboard", "dashboard", "manifest"]
+    assert records[0].data == []
+    assert [records[1].data["title"], records[2].data["title"]] == ["manifest", "folders"]
+    assert records[-1].kind == "manifest"
+    assert len(records[-1].data["dashboards"]) == 2
+
+
+def test_import_archive(mocked_responses, tmp_path, caplog):
+    """
+    Verify "import" streams dashboards from an archive, restoring them into the folders they have been exported from.
+    """
+    path = tmp_path / "backup.ndjson.gz"
+    with open_archive(path) as archive:
+        archive.add_folders([{"uid": "apps", "title": "Applications", "parentUid": None, "path": "Applications"}])
+        archive.add("foo.json", {"title": "foo"})
+        archive.add("bar.json", {"title": "bar"}, {"folderUid": "apps", "folderTitle": "Applications"})
+
+    mock_grafana_health(mocked_responses)
+    mocked_responses.get("http://localhost:3000/api/search?type=dash-db&limit=5000&page=1", json=[])
+    mocked_responses.get("http://localhost:3000/api/folders", json=[])
+    create = mocked_responses.post(
+        "http://localhost:3000/api/folders", json={"id": 7, "uid": "restored", "title": "Applications"}
+    )
+    upload = mocked_responses.post("http://localhost:3000/api/dashboards/db", json={"status": "success"})
+
+    sys.argv = shlex.split(f"grafana-import import --grafana_url http://localhost:3000 --dashboard_file {path}")
+    with pytest.raises(SystemExit) as ex:
+        main()
+    assert ex.match("0")
+
+    assert create.call_count == 1
+    uploads = [json.loads(call.request.body) for call in mocked_responses.calls if call.request.url.endswith("/db")]
+    assert [(item["dashboard"]["title"], item["folderId"]) for item in uploads] == [("foo", 0), ("bar", 7)]
+    assert upload.call_count == 2
+    assert "OK: Dashboard 'bar.json' imported into folder 'Applications'" in caplog.messages
+
+
+def test_export_incremental(mocked_responses, tmp_path, caplog):
+    """
+    Verify "export" with `--incremental` only fetches new or changed dashboards, and records deleted ones.
+    """
+    mock_grafana_folder_dashboards(mocked_responses)
+    mocked_responses.assert_all_requests_are_fired = False
+    for uid in ["foo-uid", "bar-uid", "baz-uid"]:
+        mocked_responses.get(
+            f"http://localhost:3000/api/dashboards/uid/{uid}/versions?limit=1",
+            json=[{"id": 1, "version": 1}],
+        )
+
+    def export(expected: str):
+        calls = len(mocked_responses.calls)
+        sys.argv = shlex.split(
+            f"grafana-import export --grafana_url http://localhost:3000 --base_path {tmp_path} "
+            f"--pattern '*' --jobs 2 --incremental"
+        )
+        with pytest.raises(SystemExit) as ex:
+            main()
+        assert ex.match("0")
+        assert expected in caplog.messages
+        return sorted(
+            call.request.url.rsplit("/", 1)[-1]
+            for call in mocked_responses.calls[calls:]
+            if "/api/dashboards/uid/" in call.request.url and "/versions" not in call.request.url
+        )
+
+    assert export("Incremental export: 3 changed, 0 unchanged, 0 deleted") == ["bar-uid", "baz-uid", "foo-uid"]
+    # Versions of new dashboards are not probed.
+    assert not [call for call in mocked_responses.calls if "/versions" in call.request.url]
+    assert sorted(item.name for item in tmp_path.iterdir()) == [
+        ".grafana-import-manifest.json",
+        "Applications_bar.json",
+        "Applications_baz.json",
+        "foo.json",
+    ]
+
+    # The next export does not fetch any dashboard.
+    assert export("Incremental export: 0 changed, 3 unchanged, 0 deleted") == []
+
+    # A new version is fetched, and deleted dashboards are recorded in the manifest.
+    mocked_responses.replace(
+        responses.GET,
+        "http://localhost:3000/api/dashboards/uid/bar-uid/versions?limit=1",
+        json={"versions": [{"version": 2}]},
+    )
+    mocked_responses.replace(
+        responses.GET,
+        "http://localhost:3000/api/dashboards/uid/bar-uid",
+        json={
+            "dashboard": {"uid": "bar-uid", "version": 2, "panels": []},
+            "meta": {"folderId": 1, "folderTitle": "Applications"},
+        },
+    )
+    mocked_responses.replace(
+        responses.GET,
+        "http://localhost:3000/api/search?type=dash-db&limit=5000&page=1",
+        json=[
+            {"title": "foo", "uid": "foo-uid"},
+            {"title": "bar", "uid": "bar-uid", "folderId": 1, "folderUid": "apps", "folderTitle": "Applications"},
+        ],
+    )
+    assert export("Incremental export: 1 changed, 1 unchanged, 1 deleted") == ["bar-uid"]
+    assert json.loads((tmp_path / "Applications_bar.json").read_text())["version"] == 2
+    manifest = json.loads((tmp_path / ".grafana-import-manifest.json").read_text())
+    assert sorted(manifest["dashboards"]) == ["bar-uid", "foo-uid"]
+    assert manifest["dashboards"]["bar-uid"]["version"] == 2
+    assert list(manifest["deleted"]) == ["baz-uid"]
+    assert manifest["deleted"]["baz-uid"]["file"] == ".deleted/Applications_baz.json"
+    assert not (tmp_path / "Applications_baz.json").exists()
+    assert (tmp_path / ".deleted" / "Applications_baz.json").exists()
+
+    # The previous file of a renamed dashboard is removed.
+    mocked_responses.replace(
+        responses.GET,
+        "http://localhost:3000/api/search?type=dash-db&limit=5000&page=1",
+        json=[
+            {"title": "foo", "uid": "foo-uid"},
+            {"title": "qux", "uid": "bar-uid", "folderId": 1, "folderUid": "apps", "folderTitle": "Applications"},
+        ],
+    )
+    assert export("Incremental export: 1 changed, 1 unchanged, 0 deleted") == ["bar-uid"]
+    assert sorted(item.name for item in tmp_path.iterdir()) == [
+        ".deleted",
+        ".grafana-import-manifest.json",
+        "Applications_qux.json",
+        "foo.json",
+    ]
+
+
+def test_export_incremental_same_title_folders(mocked_responses, tmp_path, caplog):
+    """
+    Verify "export" with `--incremental` exports dashboards of folders with the same title into separate
+    files, and exports dashboards again whose files went missing.
+    """
+    mock_grafana_same_title_folders(mocked_responses)
+    mocked_responses.assert_all_requests_are_fired = False
+    for uid in ["team-services-svc", "ops-services-svc"]:
+        mocked_responses.get(
+            f"http://localhost:3000/api/dashboards/uid/{uid}/versions?limit=1",
+            json=[{"id": 1, "version": 1}],
+        )
+
+    def export(expected: str):
+        sys.argv = shlex.split(
+            f"grafana-import export --grafana_url http://localhost:3000 --base_path {tmp_path} "
+            f"--pattern '*' --jobs 2 --incremental"
+        )
+        with pytest.raises(SystemExit) as ex:
+            main()
+        assert ex.match("0")
+        assert expected in caplog.messages
+
+    export("Incremental export: 2 changed, 0 unchanged, 0 deleted")
+    manifest = json.loads((tmp_path / ".grafana-import-manifest.json").read_text())
+    assert sorted(entry["file"] for entry in manifest["dashboards"].values()) == [
+        "Services_ops-services_svc.json",
+        "Services_team-services_svc.json",
+    ]
+
+    (tmp_path / "Services_ops-services_svc.json").unlink()
+    export("Incremental export: 1 changed, 1 unchanged, 0 deleted")
+    assert (tmp_path / "Services_ops-services_svc.json").exists()
+
+
+def test_export_manifest_claim(tmp_path):
+    """
+    Verify the export manifest refuses to assign the same file name to different dashboards.
+    """
+    manifest = ExportManifest(tmp_path / ".grafana-import-manifest.json")
+    manifest.set("foo-uid", {"title": "foo", "folderUid": None, "version": 1, "digest": "x", "file": "foo.json"})
+    manifest.claim("foo-uid", "foo.json")
+    manifest.claim("bar-uid", "bar.json")
+    with pytest.raises(ValueError) as ex:
+        manifest.claim("baz-uid", "foo.json")
+    assert ex.match("File name foo.json is already used by dashboard uid foo-uid")
+    with pytest.raises(ValueError):
+        manifest.claim("baz-uid", "bar.json")
@@ -0,0 +1,277 @@
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+from grafana_import.builder import (
+    DependencyGraph,
+    RenderCache,
+    find_dependencies,
+    render_dashboard_files,
+    render_python_inprocess,
+)
+from grafana_import.util import read_dashboard_file
+
+BUILDER = """
+import json
+from helpers import title
+
+print(json.dumps({"title": title}))
+"""
+
+
+def mkbuilder(path: Path, title: str = "Builder One") -> Path:
+    (path / "helpers.py").write_text(f"title = {title!r}\n")
+    builder = path / "dashboard.py"
+    builder.write_text(BUILDER)
+    return builder
+
+
+def test_find_dependencies_python(tmp_path):
+    """
+    Verify local modules imported by Python builders are discovered.
+    """
+    builder = mkbuilder(tmp_path)
+    assert sorted(find_dependencies(builder)) == [builder, tmp_path / "helpers.py"]
+
+
+def mkbuilder_package(path: Path, title: str = "Builder One") -> Path:
+    (path / "lib").mkdir(exist_ok=True)
+    (path / "lib" / "common.py").write_text(f"title = {title!r}\n")
+    (path / "lib" / "helpers.py").write_text("from lib import common\n\ntitle = common.title\n")
+    builder = path / "dashboard.py"
+    builder.write_text(BUILDER.replace("from helpers import title", "from lib.helpers import title"))
+    return builder
+
+
+def test_find_dependencies_python_transitive(tmp_path):
+    """
+    Verify absolute imports within imported modules are resolved against the directory of the builder.
+    """
+    builder = mkbuilder_package(tmp_path)
+    assert sorted(find_dependencies(builder)) == [
+        builder,
+        tmp_path / "lib" / "common.py",
+        tmp_path / "lib" / "helpers.py",
+    ]
+
+
+def test_find_dependencies_jsonnet(tmp_path):
+    """
+    Verify files imported by Jsonnet builders are discovered, also from the `vendor` directory.
+    """
+    library = tmp_path / "vendor" / "grafonnet" / "main.libsonnet"
+    library.parent.mkdir(parents=True)
+    library.write_text("{ panel: importstr 'panel.json' }")
+    (library.parent / "panel.json").write_text("{}")
+    (tmp_path / "util.libsonnet").write_text("{}")
+    builder = tmp_path / "dashboard.jsonnet"
+    builder.write_text("local g = import 'grafonnet/main.libsonnet';\nlocal u = import \"util.libsonnet\";\n{}")
+
+    assert sorted(find_dependencies(builder)) == sorted(
+        [builder, library, library.parent / "panel.json", tmp_path / "util.libsonnet"]
+    )
+
+
+def test_render_cache(tmp_path):
+    """
+    Verify rendered dashboards are cached, and rendered again when a dependency changes.
+    """
+    builder = mkbuilder(tmp_path)
+    cache = RenderCache(tmp_path / "cache")
+
+    assert read_dashboard_file(builder, cache=cache) == {"title": "Builder One"}
+    assert len(list((tmp_path / "cache").glob("*/*.json"))) == 1
+
+    # Unchanged files are not rendered again.
+    with mock.patch("subprocess.check_output", side_effect=subprocess.CalledProcessError(1, "python")):
+        assert read_dashboard_file(builder, cache=cache) == {"title": "Builder One"}
+
+    # Changing an imported module invalidates the cache entry.
+    mkbuilder(tmp_path, title="Builder Two")
+    assert read_dashboard_file(builder, cache=cache) == {"title": "Builder Two"}
+    assert len(list((tmp_path / "cache").glob("*/*.json"))) == 2
+
+
+def test_render_cache_transitive(tmp_path):
+    """
+    Verify changing a module imported by another imported module invalidates the cache entry.
+    """
+    builder = mkbuilder_package(tmp_path)
+    cache = RenderCache(tmp_path / "cache")
+
+    assert read_dashboard_file(builder, cache=cache) == {"title": "Builder One"}
+    mkbuilder_package(tmp_path, title="Builder Two")
+    assert read_dashboard_file(builder, cache=cache) == {"title": "Builder Two"}
+
+    # Watch mode rebuilds the dashboard as well.
+    graph = DependencyGraph([builder])
+    assert graph.affected([tmp_path / "lib" / "common.py"]) == [builder]
+
+
+def test_render_dashboard_files(tmp_path):
+    """
+    Verify rendering many dashboard files using a pool of worker processes.
+    """
+    paths = []
+    for index in range(3):
+        builder = tmp_path / f"dashboard-{index}.py"
+        builder.write_text(f"import json\nprint(json.dumps({{'title': 'Builder {index}'}}))")
+        paths.append(builder)
+    (tmp_path / "native.json").write_text('{"title": "Native"}')
+    paths.append(tmp_path / "native.json")
+    (tmp_path / "broken.py").write_text("raise SystemExit(1)")
+    paths.append(tmp_path / "broken.py")
+
+    outcomes = render_dashboard_files(paths, jobs=2)
+    assert [outcome.item for outcome in outcomes] == paths
+    assert [outcome.result["title"] for outcome in outcomes[:4]] == ["Builder 0", "Builder 1", "Builder 2", "Native"]
+    assert isinstance(outcomes[4].error, subprocess.CalledProcessError)
+
+
+def test_render_dashboard_files_thread(tmp_path):
+    """
+    Verify rendering many dashboard files from a worker thread, spawning the worker processes instead of forking.
+    """
+    paths = [mkbuilder(tmp_path), tmp_path / "other.py"]
+    paths[1].write_text(BUILDER)
+    outcomes = []
+    with mock.patch("grafana_import.builder.ProcessPoolExecutor", wraps=ProcessPoolExecutor) as executor:
+        thread = threading.Thread(target=lambda: outcomes.extend(render_dashboard_files(paths, jobs=2)))
+        thread.start()
+        thread.join()
+    assert executor.call_args.kwargs["mp_context"].get_start_method() == "spawn"
+    assert [outcome.result for outcome in outcomes] == [{"title": "Builder One"}] * 2
+
+
+def test_render_python_inprocess_stdout(tmp_path):
+    """
+    Verify rendering Python builders in-process, using the JSON they print to STDOUT.
+    """
+    builder = mkbuilder(tmp_path)
+    with mock.patch("subprocess.check_output", side_effect=AssertionError("Must not spawn a subprocess")):
+        assert read_dashboard_file(builder, inprocess=True) == {"title": "Builder One"}
+
+    # Local helper modules are unloaded, so changes are picked up.
+    assert "helpers" not in sys.modules
+    mkbuilder(tmp_path, title="Builder Two")
+    assert render_python_inprocess(builder) == {"title": "Builder Two"}
+
+
+def test_render_python_inprocess_concurrent_output(tmp_path, capsys):
+    """
+    Verify output of other threads is not captured while rendering Python builders in-process.
+    """
+    builder = tmp_path / "dashboard.py"
+    builder.write_text("import json, time\ntime.sleep(0.2)\nprint(json.dumps({'title': 'Quiet'}))\n")
+    stop = threading.Event()
+
+    def chatter():
+        while not stop.is_set():
+            sys.stdout.write("noise\n")
+            time.sleep(0.01)
+
+    thread = threading.Thread(target=chatter)
+    thread.start()
+    try:
+        assert render_python_inprocess(builder) == {"title": "Quiet"}
+    finally:
+        stop.set()
+        thread.join()
+    assert "noise" in capsys.readouterr().out
+    assert not hasattr(sys.stdout, "capture")
+
+
+def test_render_python_inprocess_object(tmp_path):
+    """
+    Verify rendering Python builders in-process, using the dashboard object they define.
+    """
+    pytest.importorskip("grafana_dashboard")
+    builder = tmp_path / "dashboard.py"
+    builder.write_text(
+        "from grafana_dashboard.model.dashboard_types_gen import Dashboard\n"
+        "dashboard = Dashboard(title='Builder Object')\n"
+        "if __name__ == '__main__':\n"
+        "    print(dashboard.to_grafana_json())\n"
+    )
+    assert render_python_inprocess(builder)["title"] == "Builder Object"
+
+
+def test_render_python_inprocess_failure(tmp_path):
+    """
+    Verify Python builders exiting unsuccessfully are reported.
+    """
+    builder = tmp_path / "dashboard.py"
+    builder.write_text("raise SystemExit(2)")
+    with pytest.raises(RuntimeError) as ex:
+        render_python_inprocess(builder)
+    assert ex.match("Dashboard builder exited with status 2")
+
+
+def test_render_jsonnet_inprocess(tmp_path):
+    """
+    Verify rendering Jsonnet files in-process, sharing imported library files, and picking up their changes.
+    """
+    pytest.importorskip("_jsonnet")
+    from grafana_import.builder import jsonnet_evaluator
+
+    (tmp_path / "vendor").mkdir()
+    library = tmp_path / "vendor" / "lib.libsonnet"
+    library.write_text("{ title: 'Jsonnet One' }")
+    (tmp_path / "local.libsonnet").write_text("{ tags: ['local'] }")
+    builder = tmp_path / "dashboard.jsonnet"
+    builder.write_text("(import 'lib.libsonnet') + (import 'local.libsonnet')")
+
+    with mock.patch("subprocess.check_output", side_effect=AssertionError("Must not spawn a subprocess")):
+        assert read_dashboard_file(builder, inprocess=True) == {"title": "Jsonnet One", "tags": ["local"]}
+    assert str(library) in jsonnet_evaluator().imports
+
+    library.write_text("{ title: 'Jsonnet Two, updated' }")
+    assert read_dashboard_file(builder, inprocess=True)["title"] == "Jsonnet Two, updated"
+
+    builder.write_text("import 'missing.libsonnet'")
+    with pytest.raises(RuntimeError) as ex:
+        read_dashboard_file(builder, inprocess=True)
+    assert ex.match("missing.libsonnet")
+
+
+def test_dependency_graph(tmp_path):
+    """
+    Verify the dependency graph resolves changed files to the dashboards depending on them.
+    """
+    (tmp_path / "vendor").mkdir()
+    (tmp_path / "vendor" / "lib.libsonnet").write_text("{}")
+    (tmp_path / "shared.libsonnet").write_text("import 'lib.libsonnet'")
+    (tmp_path / "one.jsonnet").write_text("import 'shared.libsonnet'")
+    (tmp_path / "two.jsonnet").write_text("{}")
+    mkbuilder(tmp_path)
+    (tmp_path / "executable").write_text("#!/bin/sh")
+    dashboards = [
+        tmp_path / "one.jsonnet",
+        tmp_path / "two.jsonnet",
+        tmp_path / "dashboard.py",
+        tmp_path / "executable",
+    ]
+    graph = DependencyGraph(dashboards)
+
+    assert graph.affected([tmp_path / "vendor" / "lib.libsonnet"]) == [
+        tmp_path / "one.jsonnet",
+        tmp_path / "executable",
+    ]
+    assert graph.affected([tmp_path / "helpers.py"]) == [tmp_path / "dashboard.py", tmp_path / "executable"]
+    assert graph.affected([tmp_path / "two.jsonnet"]) == [tmp_path / "two.jsonnet"]
+
+    # Updating a dashboard discovers added and removed imports.
+    digest = graph.digest(tmp_path / "two.jsonnet")
+    (tmp_path / "two.jsonnet").write_text("import 'vendor/lib.libsonnet'")
+    graph.update(tmp_path / "two.jsonnet")
+    assert graph.digest(tmp_path / "two.jsonnet") != digest
+    assert tmp_path / "two.jsonnet" in graph.affected([tmp_path / "vendor" / "lib.libsonnet"])
+    (tmp_path / "one.jsonnet").write_text("{}")
+    graph.update(tmp_path / "one.jsonnet")
+    assert tmp_path / "one.jsonnet" not in graph.affected([tmp_path / "shared.libsonnet"])
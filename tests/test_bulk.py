@@ -0,0 +1,47 @@
+import asyncio
+
+from grafana_import.bulk import bulk_summary, run_bulk, run_bulk_async
+
+
+def divide(value):
+    return 10 // value
+
+
+def test_run_bulk_concurrent():
+    """
+    Verify bulk operations retain the order of items, and record failures per item.
+    """
+    outcomes = run_bulk(divide, [1, 2, 0, 5], jobs=3)
+    assert [outcome.item for outcome in outcomes] == [1, 2, 0, 5]
+    assert [outcome.result for outcome in outcomes] == [10, 5, None, 2]
+    assert [outcome.ok for outcome in outcomes] == [True, True, False, True]
+    assert isinstance(outcomes[2].error, ZeroDivisionError)
+    assert bulk_summary(outcomes, "processed") == "Summary: 3 of 4 dashboards processed, 1 failed"
+
+
+def test_run_bulk_sequential():
+    """
+    Verify bulk operations also work without worker threads.
+    """
+    outcomes = run_bulk(divide, [1, 0], jobs=1)
+    assert [outcome.ok for outcome in outcomes] == [True, False]
+
+
+def test_run_bulk_async():
+    """
+    Verify asynchronous bulk operations retain the order of items, and limit the number of invocations in flight.
+    """
+    in_flight = []
+
+    async def divide_async(value):
+        in_flight.append(value)
+        await asyncio.sleep(0.01)
+        concurrent = len(in_flight)
+        in_flight.remove(value)
+        return 10 // value, concurrent
+
+    outcomes = asyncio.run(run_bulk_async(divide_async, [1, 2, 0, 5, 10], jobs=2))
+    assert [outcome.item for outcome in outcomes] == [1, 2, 0, 5, 10]
+    assert [outcome.ok for outcome in outcomes] == [True, True, False, True, True]
+    assert isinstance(outcomes[2].error, ZeroDivisionError)
+    assert max(outcome.result[1] for outcome in outcomes if outcome.ok) <= 2
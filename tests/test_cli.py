@@ -3,12 +3,16 @@ import re
 import shlex
 import sys
 from pathlib import Path
-from unittest import mock
 
 import pytest
 
 from grafana_import.cli import main
-from tests.util import mkdashboard, open_write_noop
+from tests.util import (
+    mkdashboard,
+    mock_grafana_folder_dashboards,
+    mock_grafana_health,
+    mock_grafana_same_title_folders,
+)
 
 CONFIG_FILE = "grafana_import/conf/grafana-import.yml"
 
@@ -27,7 +31,7 @@ def test_no_action_failure(caplog):
     with pytest.raises(SystemExit) as ex:
         main()
     assert ex.match("1")
-    assert "Unknown action: None. Use one of: ['import', 'export', 'remove']" in caplog.messages
+    assert "Unknown action: None. Use one of: ['import', 'export', 'remove', 'plan', 'apply']" in caplog.messages
 
 
 @pytest.mark.parametrize("use_settings", [True, False], ids=["config-yes", "config-no"])
@@ -56,7 +60,7 @@ def test_import_dashboard_success(mocked_grafana, mocked_responses, tmp_path, ca
 
 
 @pytest.mark.parametrize("use_settings", [True, False], ids=["config-yes", "config-no"])
-def test_export_dashboard_success(mocked_grafana, mocked_responses, caplog, use_settings):
+def test_export_dashboard_success(mocked_grafana, mocked_responses, tmp_path, caplog, use_settings):
     """
     Verify "export dashboard" works.
     """
@@ -68,16 +72,16 @@ def test_export_dashboard_success(mocked_grafana, mocked_responses, caplog, use_
         content_type="application/json",
     )
 
-    sys.argv = shlex.split(f"grafana-import export {get_settings_arg(use_settings)} --dashboard_name foobar")
+    sys.argv = shlex.split(
+        f"grafana-import export {get_settings_arg(use_settings)} --base_path {tmp_path} --dashboard_name foobar"
+    )
 
     with pytest.raises(SystemExit) as ex:
-        m = mock.patch("builtins.open", open_write_noop)
-        m.start()
         main()
-        m.stop()
     assert ex.match("0")
 
-    assert re.match(r".*OK: Dashboard 'foobar' exported to: foobar_\d+.json.*", caplog.text, re.DOTALL)
+    assert re.match(r".*OK: Dashboard 'foobar' exported to: .*foobar_\d+.json.*", caplog.text, re.DOTALL)
+    assert [path.name.startswith("foobar_") for path in tmp_path.iterdir()] == [True]
 
 
 @pytest.mark.parametrize("use_settings", [True, False], ids=["config-yes", "config-no"])
@@ -120,3 +124,318 @@ def test_remove_dashboard_success(mocked_grafana, mocked_responses, caplog, use_
     assert ex.match("0")
 
     assert "OK: Dashboard removed: foobar" in caplog.text
+
+
+def test_import_directory_concurrent(mocked_grafana, mocked_responses, tmp_path, caplog):
+    """
+    Verify "import dashboard" works on a directory, using multiple worker threads.
+    """
+    mocked_responses.post(
+        "http://localhost:3000/api/dashboards/db",
+        json={"status": "ok"},
+        status=200,
+        content_type="application/json",
+    )
+
+    for index in range(5):
+        Path(tmp_path / f"dashboard-{index}.json").write_text(json.dumps({"title": f"Dashboard {index}"}))
+    Path(tmp_path / "broken.json").write_text("{")
+
+    sys.argv = shlex.split(f"grafana-import import {get_settings_arg()} --dashboard_file {tmp_path} --jobs 3")
+
+    # Partial failures are reported by the exit code.
+    with pytest.raises(SystemExit) as ex:
+        main()
+    assert ex.match("1")
+
+    for index in range(5):
+        assert f"Dashboard 'Dashboard {index}' imported into folder 'General'" in caplog.messages
+    assert f"Failed to load dashboard from: {tmp_path / 'broken.json'}" in caplog.text
+    assert "Summary: 5 of 6 dashboards imported, 1 failed" in caplog.messages
+
+
+def test_import_failed_load_creates_no_folder(mocked_grafana, mocked_responses, tmp_path, caplog):
+    """
+    Verify "import dashboard" only creates the destination folder when a dashboard has been loaded successfully.
+    """
+    mocked_responses.assert_all_requests_are_fired = False
+    mocked_responses.get("http://localhost:3000/api/folders", json=[])
+    create = mocked_responses.post(
+        "http://localhost:3000/api/folders", json={"id": 7, "uid": "new", "title": "New"}, status=200
+    )
+    mocked_responses.post("http://localhost:3000/api/dashboards/db", json={"status": "ok"}, status=200)
+    broken = tmp_path / "broken.json"
+    broken.write_text("{")
+
+    sys.argv = shlex.split(f"grafana-import import {get_settings_arg(False)} --dashboard_file {broken} -f New")
+    with pytest.raises(SystemExit) as ex:
+        main()
+    assert ex.match("1")
+    assert create.call_count == 0
+
+    dashboard = tmp_path / "dashboard.json"
+    dashboard.write_text(json.dumps({"title": "Dashboard"}))
+    sys.argv = shlex.split(f"grafana-import import {get_settings_arg(False)} --dashboard_file {dashboard} -f New")
+    with pytest.raises(SystemExit) as ex:
+        main()
+    assert ex.match("0")
+    assert create.call_count == 1
+    assert "Dashboard 'Dashboard' imported into folder 'New'" in caplog.messages
+
+
+def test_import_directory_sync_skips_rendering(mocked_responses, tmp_path, caplog, monkeypatch):
+    """
+    Verify "import dashboard" in sync mode skips rendering dashboards whose files and dependencies did not change.
+    """
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    uid = "618f7589-7e3d-4399-a585-372df9fa5e85"
+    mock_grafana_health(mocked_responses)
+    mocked_responses.get(
+        "http://localhost:3000/api/search?type=dash-db&limit=5000&page=1",
+        json=[{"title": "foobar", "uid": uid, "id": 1}],
+        status=200,
+        content_type="application/json",
+    )
+    mocked_responses.get(
+        f"http://localhost:3000/api/dashboards/uid/{uid}",
+        json={"dashboard": {"title": "foobar", "uid": uid, "panels": []}, "meta": {"folderId": 0}},
+        status=200,
+        content_type="application/json",
+    )
+    mocked_responses.post(
+        "http://localhost:3000/api/dashboards/db",
+        json={"status": "success", "uid": uid, "id": 1, "url": "/d/foobar"},
+        status=200,
+        content_type="application/json",
+    )
+
+    dashboards = tmp_path / "dashboards"
+    dashboards.mkdir()
+    (dashboards / "lib").mkdir()
+    (dashboards / "lib" / "__init__.py").write_text("")
+    (dashboards / "lib" / "helpers.py").write_text("title = 'foobar'\n")
+    (dashboards / "dashboard.py").write_text(
+        "import json\n"
+        "from pathlib import Path\n"
+        "from lib.helpers import title\n"
+        "with open(Path(__file__).parent.parent / 'renders.log', 'a') as f:\n"
+        "    f.write('rendered\\n')\n"
+        "print(json.dumps({'title': title, 'tags': ['sync']}))\n"
+    )
+    renders = tmp_path / "renders.log"
+
+    sys.argv = shlex.split(
+        f"grafana-import import {get_settings_arg()} --dashboard_file {dashboards}/ --sync --overwrite"
+    )
+    for _ in range(2):
+        with pytest.raises(SystemExit) as ex:
+            main()
+        assert ex.match("0")
+    assert renders.read_text().splitlines() == ["rendered"]
+    assert f"Dashboard file '{dashboards / 'dashboard.py'}' and its dependencies are unchanged, skipping" in caplog.text
+
+    # Changing a dependency renders the dashboard again.
+    (dashboards / "lib" / "helpers.py").write_text("title = 'foobar'  # changed\n")
+    with pytest.raises(SystemExit) as ex:
+        main()
+    assert ex.match("0")
+    assert renders.read_text().splitlines() == ["rendered", "rendered"]
+
+
+def test_export_folder_success(mocked_responses, tmp_path, caplog):
+    """
+    Verify "export dashboard" works on a whole folder, using multiple worker threads.
+    """
+    mock_grafana_folder_dashboards(mocked_responses)
+    mocked_responses.assert_all_requests_are_fired = False
+
+    sys.argv = shlex.split(
+        f"grafana-import export {get_settings_arg(False)} --base_path {tmp_path} "
+        f"--grafana_folder Applications --pattern '*' --jobs 2"
+    )
+    with pytest.raises(SystemExit) as ex:
+        main()
+    assert ex.match("0")
+
+    assert sorted(path.name.split("_")[:2] for path in tmp_path.glob("*.json")) == [
+        ["Applications", "bar"],
+        ["Applications", "baz"],
+    ]
+    assert "Summary: 2 of 2 dashboards exported, 0 failed" in caplog.messages
+
+
+def test_export_same_title_folders(mocked_responses, tmp_path, caplog):
+    """
+    Verify "export" of many dashboards qualifies file names by folder uid, when folders of the same title collide.
+    """
+    mock_grafana_same_title_folders(mocked_responses)
+
+    sys.argv = shlex.split(f"grafana-import export {get_settings_arg(False)} --base_path {tmp_path} --pattern '*'")
+    with pytest.raises(SystemExit) as ex:
+        main()
+    assert ex.match("0")
+
+    assert sorted(path.name.rsplit("_", 1)[0] for path in tmp_path.glob("*.json")) == [
+        "Services_ops-services_svc",
+        "Services_team-services_svc",
+    ]
+    assert "Summary: 2 of 2 dashboards exported, 0 failed" in caplog.messages
+
+
+def test_export_all_pattern(mocked_responses, tmp_path, caplog):
+    """
+    Verify "export dashboard" works across all folders, selecting dashboards by title pattern.
+    """
+    mock_grafana_folder_dashboards(mocked_responses)
+    mocked_responses.assert_all_requests_are_fired = False
+
+    sys.argv = shlex.split(f"grafana-import export {get_settings_arg(False)} --base_path {tmp_path} --pattern 'ba?'")
+    with pytest.raises(SystemExit) as ex:
+        main()
+    assert ex.match("0")
+    assert len(list(tmp_path.glob("Applications_ba*.json"))) == 2
+
+    sys.argv = shlex.split(f"grafana-import export {get_settings_arg(False)} --base_path {tmp_path} --pattern 'qux*'")
+    with pytest.raises(SystemExit) as ex:
+        main()
+    assert ex.match("1")
+    assert "KO: No dashboards found matching: qux*" in caplog.messages
+
+
+def test_remove_folder_dry_run(mocked_responses, capsys, caplog):
+    """
+    Verify "remove" with `--dry_run` displays the dashboards of a folder, without removing them.
+    """
+    mock_grafana_folder_dashboards(mocked_responses)
+    mocked_responses.assert_all_requests_are_fired = False
+    delete = mocked_responses.delete("http://localhost:3000/api/dashboards/uid/bar-uid", json={})
+
+    sys.argv = shlex.split(
+        f"grafana-import remove {get_settings_arg(False)} --grafana_folder Applications --pattern '*' --dry_run"
+    )
+    with pytest.raises(SystemExit) as ex:
+        main()
+    assert ex.match("0")
+    assert capsys.readouterr().out.splitlines() == [
+        "Would remove dashboard 'bar' from folder 'Applications' (uid: bar-uid)",
+        "Would remove dashboard 'baz' from folder 'Applications' (uid: baz-uid)",
+    ]
+    assert "Dry run: 2 dashboards would be removed" in caplog.messages
+    assert delete.call_count == 0
+
+
+def test_remove_many(mocked_responses, caplog):
+    """
+    Verify "remove" selects dashboards by title regex and uid, and removes them concurrently, reporting each one.
+    """
+    mock_grafana_folder_dashboards(mocked_responses)
+    mocked_responses.assert_all_requests_are_fired = False
+    deletes = {
+        uid: mocked_responses.delete(f"http://localhost:3000/api/dashboards/uid/{uid}", json={})
+        for uid in ["foo-uid", "bar-uid", "baz-uid"]
+    }
+
+    sys.argv = shlex.split(f"grafana-import remove {get_settings_arg(False)} --regex '^ba' --jobs 2")
+    with pytest.raises(SystemExit) as ex:
+        main()
+    assert ex.match("0")
+    assert [deletes[uid].call_count for uid in ["foo-uid", "bar-uid", "baz-uid"]] == [0, 1, 1]
+    assert "OK: Dashboard 'bar' removed (uid: bar-uid)" in caplog.messages
+    assert "Summary: 2 of 2 dashboards removed, 0 failed" in caplog.messages
+
+    # Unknown uids are reported, and fail the operation.
+    sys.argv = shlex.split(f"grafana-import remove {get_settings_arg(False)} --uid foo-uid,unknown-uid")
+    with pytest.raises(SystemExit) as ex:
+        main()
+    assert ex.match("1")
+    assert deletes["foo-uid"].call_count == 1
+    assert "KO: Dashboard not found: uid=unknown-uid" in caplog.messages
+
+
+def test_remove_pattern_config_folder(mocked_responses, tmp_path, caplog):
+    """
+    Verify "remove" by pattern honors the folder of the config file, and requires `--all_folders` otherwise.
+    """
+    mock_grafana_folder_dashboards(mocked_responses)
+    mocked_responses.assert_all_requests_are_fired = False
+    deletes = {
+        uid: mocked_responses.delete(f"http://localhost:3000/api/dashboards/uid/{uid}", json={})
+        for uid in ["foo-uid", "bar-uid", "baz-uid"]
+    }
+    config_file = tmp_path / "grafana-import.yml"
+    config_file.write_text("general:\n  grafana_folder: Applications\n")
+
+    sys.argv = shlex.split(
+        f"grafana-import remove {get_settings_arg(False)} --config_file {config_file} --pattern '*' --jobs 2"
+    )
+    with pytest.raises(SystemExit) as ex:
+        main()
+    assert ex.match("0")
+    assert [deletes[uid].call_count for uid in ["foo-uid", "bar-uid", "baz-uid"]] == [0, 1, 1]
+
+    # Removing dashboards by pattern from all folders requires an explicit opt-in.
+    sys.argv = shlex.split(f"grafana-import remove {get_settings_arg(False)} --pattern '*'")
+    with pytest.raises(SystemExit) as ex:
+        main()
+    assert ex.match("1")
+    assert "ERROR: Removing dashboards by --pattern requires --grafana_folder, or --all_folders." in caplog.messages
+    assert deletes["foo-uid"].call_count == 0
+
+    sys.argv = shlex.split(
+        f"grafana-import remove {get_settings_arg(False)} --config_file {config_file} --pattern 'f*' --all_folders"
+    )
+    with pytest.raises(SystemExit) as ex:
+        main()
+    assert ex.match("0")
+    assert deletes["foo-uid"].call_count == 1
+
+
+def test_export_folder_write_failure(mocked_responses, tmp_path, caplog):
+    """
+    Verify "export dashboard" on many dashboards reports failed file writes per dashboard, and exits non-zero.
+    """
+    mock_grafana_folder_dashboards(mocked_responses)
+    mocked_responses.assert_all_requests_are_fired = False
+    base_path = tmp_path / "not-a-directory"
+    base_path.write_text("")
+
+    sys.argv = shlex.split(
+        f"grafana-import export {get_settings_arg(False)} --base_path {base_path} --pattern '*' --jobs 2"
+    )
+    with pytest.raises(SystemExit) as ex:
+        main()
+    assert ex.match("1")
+    assert "Summary: 0 of 3 dashboards exported, 3 failed" in caplog.messages
+
+
+def test_remove_nested_folder_same_title(mocked_responses, caplog):
+    """
+    Verify "remove" on a nested folder only selects its dashboards, not those of another folder with the same title.
+    """
+    mock_grafana_health(mocked_responses)
+    mocked_responses.get(
+        "http://localhost:3000/api/search?type=dash-db&limit=5000&page=1",
+        json=[
+            {"title": "a", "uid": "a", "folderId": 3, "folderUid": "team-services", "folderTitle": "Services"},
+            {"title": "b", "uid": "b", "folderId": 4, "folderUid": "ops-services", "folderTitle": "Services"},
+        ],
+    )
+    mocked_responses.get(
+        "http://localhost:3000/api/folders",
+        json=[{"id": 1, "uid": "team", "title": "Team"}, {"id": 2, "uid": "ops", "title": "Ops"}],
+    )
+    mocked_responses.get(
+        "http://localhost:3000/api/folders?parentUid=team",
+        json=[{"id": 3, "uid": "team-services", "title": "Services"}],
+    )
+    deletes = {uid: mocked_responses.delete(f"http://localhost:3000/api/dashboards/uid/{uid}", json={}) for uid in "ab"}
+    mocked_responses.assert_all_requests_are_fired = False
+
+    sys.argv = shlex.split(
+        f"grafana-import remove {get_settings_arg(False)} --grafana_folder Team/Services --pattern '*'"
+    )
+    with pytest.raises(SystemExit) as ex:
+        main()
+    assert ex.match("0")
+    assert [deletes[uid].call_count for uid in "ab"] == [1, 0]
+    assert "Summary: 1 of 1 dashboards removed, 0 failed" in caplog.messages
@@ -1,3 +1,5 @@
+import json
+
 import pytest
 
 from grafana_import.grafana import Grafana, GrafanaDashboardNotFoundError, GrafanaFolderNotFoundError
@@ -101,3 +103,292 @@ def test_remove_dashboard_folder_not_found(mocked_responses, settings):
         gio.remove_dashboard("foobar")
 
     assert ex.match("Folder not found: non-standard")
+
+
+def test_find_dashboard_paginated(mocked_responses, settings):
+    """
+    Verify the dashboard catalog is acquired page by page, using `search_api_limit` as page size.
+    """
+    mock_grafana_health(mocked_responses)
+    mocked_responses.get(
+        "http://localhost:3000/api/search?type=dash-db&limit=2&page=1",
+        json=[{"title": "foo", "uid": "foo-uid"}, {"title": "bar", "uid": "bar-uid"}],
+        status=200,
+        content_type="application/json",
+    )
+    mocked_responses.get(
+        "http://localhost:3000/api/search?type=dash-db&limit=2&page=2",
+        json=[{"title": "baz", "uid": "baz-uid"}],
+        status=200,
+        content_type="application/json",
+    )
+
+    settings["search_api_limit"] = 2
+    gio = Grafana(**settings)
+    assert gio.find_dashboard("baz") == {"title": "baz", "uid": "baz-uid"}
+    assert len(gio.get_dashboards()) == 3
+
+
+def test_import_dashboard_updates_catalog(mocked_grafana, mocked_responses, gio_factory):
+    """
+    Verify "import dashboard" and "remove dashboard" keep the dashboard catalog up to date.
+    """
+    mocked_responses.post(
+        "http://localhost:3000/api/dashboards/db",
+        json={"status": "success", "id": 42, "uid": "new-uid", "url": "/d/new-uid/new"},
+        status=200,
+        content_type="application/json",
+    )
+    mocked_responses.delete(
+        "http://localhost:3000/api/dashboards/uid/new-uid",
+        json={"status": "ok"},
+        status=200,
+        content_type="application/json",
+    )
+
+    gio = gio_factory()
+    assert gio.find_dashboard("new") is None
+
+    assert gio.import_dashboard({"title": "new", "panels": []}) is True
+    assert gio.find_dashboard("new") == {
+        "id": 42,
+        "uid": "new-uid",
+        "title": "new",
+        "url": "/d/new-uid/new",
+        "type": "dash-db",
+    }
+
+    gio.remove_dashboard("new")
+    assert gio.find_dashboard("new") is None
+
+
+def test_find_dashboard_persistent_cache(mocked_grafana, mocked_responses, settings, tmp_path):
+    """
+    Verify the dashboard catalog is cached on disk, and cache hits are revalidated by uid.
+    """
+    settings.update({"cache_ttl": 60, "cache_path": tmp_path})
+
+    # The first invocation downloads the full catalog, and stores it on disk.
+    gio = Grafana(**settings)
+    assert gio.find_dashboard("foobar")["uid"] == "618f7589-7e3d-4399-a585-372df9fa5e85"
+    assert len(list(tmp_path.glob("catalog-*-dashboards.json"))) == 1
+
+    # The next invocation loads the catalog from disk, and only revalidates the dashboard found.
+    mocked_responses.get(
+        "http://localhost:3000/api/search?type=dash-db&dashboardUIDs=618f7589-7e3d-4399-a585-372df9fa5e85",
+        json=[{"title": "foobar", "uid": "618f7589-7e3d-4399-a585-372df9fa5e85"}],
+        status=200,
+        content_type="application/json",
+    )
+    gio = Grafana(**settings)
+    assert gio.find_dashboard("foobar")["uid"] == "618f7589-7e3d-4399-a585-372df9fa5e85"
+    assert gio.get_dashboards().cached is True
+
+    search_calls = [call for call in mocked_responses.calls if "/api/search" in call.request.url]
+    assert len(search_calls) == 2
+
+
+def test_find_dashboard_persistent_cache_stale(mocked_grafana, mocked_responses, settings, tmp_path):
+    """
+    Verify a stale cache entry refreshes the dashboard catalog.
+    """
+    settings.update({"cache_ttl": 60, "cache_path": tmp_path})
+    Grafana(**settings).get_dashboards()
+
+    # The dashboard has been removed on the server in the meanwhile.
+    mocked_responses.get(
+        "http://localhost:3000/api/search?type=dash-db&dashboardUIDs=618f7589-7e3d-4399-a585-372df9fa5e85",
+        json=[],
+        status=200,
+        content_type="application/json",
+    )
+    gio = Grafana(**settings)
+    gio.find_dashboard("foobar")
+    assert gio.get_dashboards().cached is False
+
+
+def test_catalog_cache_per_instance(mocked_grafana, mocked_responses, gio_factory):
+    """
+    Verify each `Grafana` instance uses its own catalog cache.
+    """
+    gio1 = gio_factory()
+    gio2 = gio_factory()
+    gio1.get_dashboards().add({"title": "only-in-gio1", "uid": "only-in-gio1"})
+    assert gio1.find_dashboard("only-in-gio1") is not None
+    assert gio2.find_dashboard("only-in-gio1") is None
+
+
+def test_import_dashboard_sync(mocked_responses, settings, tmp_path):
+    """
+    Verify "import dashboard" in sync mode skips uploading unchanged dashboards.
+    """
+    mock_grafana_health(mocked_responses)
+    mocked_responses.get(
+        "http://localhost:3000/api/search?type=dash-db&limit=5000&page=1",
+        json=[{"id": 1, "title": "foobar", "uid": "618f7589-7e3d-4399-a585-372df9fa5e85"}],
+        status=200,
+        content_type="application/json",
+    )
+    mocked_responses.get(
+        "http://localhost:3000/api/dashboards/uid/618f7589-7e3d-4399-a585-372df9fa5e85",
+        json={"dashboard": {"id": 1, "uid": "618f7589-7e3d-4399-a585-372df9fa5e85", "version": 3, "title": "foobar"}},
+        status=200,
+        content_type="application/json",
+    )
+    upload = mocked_responses.post(
+        "http://localhost:3000/api/dashboards/db",
+        json={"status": "success", "id": 1, "uid": "618f7589-7e3d-4399-a585-372df9fa5e85"},
+        status=200,
+        content_type="application/json",
+    )
+    settings.update({"sync": True, "sync_state": tmp_path / "sync.json"})
+
+    # Same content as on the server: Compare with the server copy, and skip the upload.
+    gio = Grafana(**settings)
+    assert gio.import_dashboard({"title": "foobar"}) is True
+    assert upload.call_count == 0
+
+    # Changed content: Upload it.
+    assert gio.import_dashboard({"title": "foobar", "panels": []}) is True
+    assert upload.call_count == 1
+    gio.sync_state.save()
+
+    # Next invocation: Compare with the last imported state, without inquiring the server.
+    gio = Grafana(**settings)
+    get_calls = len(mocked_responses.calls)
+    assert gio.import_dashboard({"title": "foobar", "panels": []}) is True
+    assert upload.call_count == 1
+    assert [call.request.url for call in mocked_responses.calls[get_calls:]] == [
+        "http://localhost:3000/api/search?type=dash-db&limit=5000&page=1"
+    ]
+
+
+def test_get_folder_by_uid_lazy(mocked_responses, settings):
+    """
+    Verify a single folder is fetched by uid, without acquiring the list of all folders.
+    """
+    mock_grafana_health(mocked_responses)
+    mocked_responses.get(
+        "http://localhost:3000/api/folders/f1",
+        json={"id": 7, "uid": "f1", "title": "Applications"},
+        status=200,
+        content_type="application/json",
+    )
+    mocked_responses.get(
+        "http://localhost:3000/api/folders/unknown",
+        json={"message": "folder not found"},
+        status=404,
+        content_type="application/json",
+    )
+
+    gio = Grafana(**settings)
+    assert gio.get_folder(folder_uid="f1")["title"] == "Applications"
+    assert gio.get_folder(folder_uid="f1")["title"] == "Applications"
+    assert gio.get_folder(folder_uid="unknown") is None
+    assert [call.request.url for call in mocked_responses.calls[1:]] == [
+        "http://localhost:3000/api/folders/f1",
+        "http://localhost:3000/api/folders/unknown",
+    ]
+
+
+def test_ensure_folder_nested(mocked_responses, settings):
+    """
+    Verify a nested folder path is resolved component by component, and missing folders are created.
+    """
+    mock_grafana_health(mocked_responses)
+    mocked_responses.get(
+        "http://localhost:3000/api/folders",
+        json=[{"id": 1, "uid": "team", "title": "Team"}],
+        status=200,
+        content_type="application/json",
+    )
+    mocked_responses.get(
+        "http://localhost:3000/api/folders?parentUid=team",
+        json=[{"id": 2, "uid": "services", "title": "Services"}],
+        status=200,
+        content_type="application/json",
+    )
+    mocked_responses.get(
+        "http://localhost:3000/api/folders?parentUid=services",
+        json=[],
+        status=200,
+        content_type="application/json",
+    )
+    create = mocked_responses.post(
+        "http://localhost:3000/api/folders",
+        json={"id": 3, "uid": "databases", "title": "Databases"},
+        status=200,
+        content_type="application/json",
+    )
+
+    gio = Grafana(**settings)
+    assert gio.get_folder("Team/Services")["uid"] == "services"
+    assert gio.get_folder("Team/Services/Databases") is None
+
+    folder = gio.ensure_folder("Team/Services/Databases")
+    assert folder["uid"] == "databases"
+    assert json.loads(create.calls[0].request.body) == {"title": "Databases", "parentUid": "services"}
+
+    # The created folder is indexed, no further requests are needed.
+    calls = len(mocked_responses.calls)
+    assert gio.ensure_folder("Team/Services/Databases")["uid"] == "databases"
+    assert gio.get_folders().path(folder) == "Team/Services/Databases"
+    assert len(mocked_responses.calls) == calls
+
+
+def test_plan_folders():
+    """
+    Verify the destination folders of an import batch are distinct, parent folders first.
+    """
+    names = ["Team/Services", "General", "Applications", "Team", "Team/Services", "general"]
+    assert Grafana._plan_folders(names) == ["Applications", "Team", "Team/Services"]
+
+
+def test_import_dashboards_prepared_folders(mocked_responses, settings):
+    """
+    Verify folders are ensured up front, and importing dashboards does not do any folder work.
+    """
+    mock_grafana_health(mocked_responses)
+    mocked_responses.get(
+        "http://localhost:3000/api/search?type=dash-db&limit=5000&page=1",
+        json=[],
+        status=200,
+        content_type="application/json",
+    )
+    mocked_responses.get(
+        "http://localhost:3000/api/folders",
+        json=[],
+        status=200,
+        content_type="application/json",
+    )
+    create = mocked_responses.post(
+        "http://localhost:3000/api/folders",
+        json={"id": 7, "uid": "apps", "title": "Applications"},
+        status=200,
+        content_type="application/json",
+    )
+    upload = mocked_responses.post(
+        "http://localhost:3000/api/dashboards/db",
+        json={"status": "success", "uid": "foo-uid"},
+        status=200,
+        content_type="application/json",
+    )
+
+    settings["folder"] = "Applications"
+    gio = Grafana(**settings)
+    assert gio.ensure_folders(["Applications", "Applications"]) == {
+        "Applications": {"id": 7, "uid": "apps", "title": "Applications"}
+    }
+    assert create.call_count == 1
+
+    # Discard the catalogs, so any folder lookup would show up as a request.
+    gio.cache.invalidate()
+    gio.get_dashboards()
+    calls = len(mocked_responses.calls)
+    for index in range(3):
+        assert gio.import_dashboard({"title": f"Dashboard {index}"}) is True
+    assert upload.call_count == 3
+    assert [call.request.url for call in mocked_responses.calls[calls:]] == [
+        "http://localhost:3000/api/dashboards/db"
+    ] * 3
+    assert json.loads(upload.calls[0].request.body)["folderId"] == 7
@@ -0,0 +1,111 @@
+import json
+import shlex
+import sys
+
+import pytest
+import yaml
+
+from grafana_import.bulk import BulkOutcome
+from grafana_import.cli import main
+from grafana_import.fanout import FanoutReport
+from grafana_import.util import grafana_labels, grafana_settings
+from tests.util import mkdashboard
+
+CONFIG = {
+    "general": {"debug": False},
+    "grafana": {
+        "eu-1": {"host": "localhost", "port": 3001, "token": "foo"},
+        "eu-2": {"host": "localhost", "port": 3002, "token": "foo", "search_api_limit": 100},
+        "us-1": {"host": "localhost", "port": 3003, "token": "foo"},
+    },
+}
+
+
+def mock_instance(responses, port: int, limit: int = 5000) -> None:
+    responses.get(f"http://localhost:{port}/api/health", json={"database": "ok"})
+    responses.get(f"http://localhost:{port}/api/search?type=dash-db&limit={limit}&page=1", json=[])
+
+
+def test_grafana_labels():
+    """
+    Verify selecting connection profiles by labels and glob patterns.
+    """
+    assert grafana_labels(CONFIG, "eu-2") == ["eu-2"]
+    assert grafana_labels(CONFIG, "eu-*") == ["eu-1", "eu-2"]
+    assert grafana_labels(CONFIG, "us-1, eu-*, eu-1") == ["us-1", "eu-1", "eu-2"]
+    assert grafana_labels(CONFIG, "*") == ["eu-1", "eu-2", "us-1"]
+    with pytest.raises(ValueError) as ex:
+        grafana_labels(CONFIG, "eu-1,ap-*")
+    assert ex.match("Invalid Grafana configuration label: ap-")
+
+
+def test_grafana_settings_many_labels():
+    """
+    Verify acquiring settings of many connection profiles from the same configuration.
+    """
+    settings = [grafana_settings(url=None, config=CONFIG, label=label) for label in ["eu-1", "eu-2"]]
+    assert [item["port"] for item in settings] == [3001, 3002]
+    assert [item["search_api_limit"] for item in settings] == [5000, 100]
+    assert list(CONFIG["grafana"]) == ["eu-1", "eu-2", "us-1"]
+
+
+def test_fanout_report_matrix():
+    """
+    Verify the result matrix reports outcomes per instance and dashboard.
+    """
+    report = FanoutReport(labels=["eu-1", "us-1"], files=["/path/one.json", "/path/two.json"])
+    report.record("eu-1", BulkOutcome(item="/path/one.json"))
+    report.record("eu-1", BulkOutcome(item="/path/two.json", error=IOError("foo")))
+    report.fail("us-1", ConnectionError("bar"))
+    assert not report.ok
+    assert report.matrix().splitlines() == [
+        "instance  one.json  two.json  imported  failed",
+        "eu-1      ok        FAILED    1         1",
+        "us-1      FAILED    FAILED    0         2",
+    ]
+    assert report.summary("eu-1") == "eu-1: Summary: 1 of 2 dashboards imported, 1 failed"
+
+
+def test_import_fanout(mocked_responses, tmp_path, capsys):
+    """
+    Verify importing a directory of dashboards into many Grafana instances, one of them being unavailable.
+    """
+    config_file = tmp_path / "grafana-import.yml"
+    config_file.write_text(yaml.dump(CONFIG))
+    dashboards = tmp_path / "dashboards"
+    dashboards.mkdir()
+    for index in range(2):
+        dashboard = mkdashboard()
+        dashboard["title"] = f"Dashboard {index}"
+        (dashboards / f"dashboard-{index}.json").write_text(json.dumps(dashboard))
+
+    mock_instance(mocked_responses, 3001)
+    mock_instance(mocked_responses, 3002, limit=100)
+    uploads = {
+        port: mocked_responses.post(f"http://localhost:{port}/api/dashboards/db", json={"status": "success"})
+        for port in [3001, 3002]
+    }
+
+    sys.argv = shlex.split(
+        f"grafana-import import --config_file {config_file} --grafana_label '*' --dashboard_file {dashboards} --jobs 2"
+    )
+    with pytest.raises(SystemExit) as ex:
+        main()
+    assert ex.match("1")
+
+    assert [upload.call_count for upload in uploads.values()] == [2, 2]
+    rows = [" ".join(line.split()) for line in capsys.readouterr().out.splitlines()]
+    assert rows[-3:] == ["eu-1 ok ok 2 0", "eu-2 ok ok 2 0", "us-1 FAILED FAILED 0 2"]
+
+
+def test_fanout_unsupported_action(tmp_path, caplog):
+    """
+    Verify multiple Grafana instances are refused for other actions than import.
+    """
+    config_file = tmp_path / "grafana-import.yml"
+    config_file.write_text(yaml.dump(CONFIG))
+    sys.argv = shlex.split(f"grafana-import export --config_file {config_file} --grafana_label 'eu-*' -d foo")
+    with pytest.raises(SystemExit) as ex:
+        main()
+    assert ex.match("1")
+    assert "ERROR: Multiple Grafana instances are only supported when importing: eu-1, eu-2" in caplog.messages
@@ -0,0 +1,137 @@
+import asyncio
+import typing as t
+
+import pytest
+
+from grafana_import.bulk import run_bulk_async
+from grafana_import.grafana import GrafanaDashboardNotFoundError
+from grafana_import.grafana_async import AsyncGrafana
+from tests.util import AsyncSessionMock
+
+DASHBOARDS = [
+    {"title": "foobar", "uid": "foobar-uid", "id": 1},
+    {"title": "baz", "uid": "baz-uid", "id": 2, "folderId": 7, "folderUid": "apps", "folderTitle": "Applications"},
+]
+
+
+def mkgrafana(delay: float = 0, **kwargs) -> t.Tuple[AsyncGrafana, AsyncSessionMock]:
+    grafana = AsyncGrafana(url="http://localhost:3000", **kwargs)
+    session = AsyncSessionMock(delay=delay)
+    session.add("GET", "/health", {"database": "ok"})
+    session.add("GET", "/search", DASHBOARDS)
+    session.add("GET", "/folders", [{"id": 7, "uid": "apps", "title": "Applications"}])
+    grafana.grafana_api.client.s = session
+    return grafana, session
+
+
+def test_async_export_dashboard():
+    """
+    Verify exporting dashboards concurrently, acquiring the catalog only once.
+    """
+    grafana, session = mkgrafana(delay=0.01)
+    session.add("GET", "/dashboards/uid/foobar-uid", {"dashboard": {"title": "foobar", "uid": "foobar-uid"}})
+
+    async def main():
+        async with grafana:
+            exports = await asyncio.gather(*[grafana.export_dashboard("foobar") for _ in range(20)])
+            with pytest.raises(GrafanaDashboardNotFoundError):
+                await grafana.export_dashboard("unknown")
+        return exports
+
+    exports = asyncio.run(main())
+    assert [export["dashboard"]["uid"] for export in exports] == ["foobar-uid"] * 20
+    assert len([request for request in session.requests if request[1] == "/search"]) == 1
+    assert session.max_in_flight == 20
+    assert session.closed
+
+
+def test_async_import_dashboard():
+    """
+    Verify importing dashboards concurrently into a new folder, creating the folder only once.
+    """
+    grafana, session = mkgrafana(folder="Team", delay=0.01)
+    session.add("POST", "/folders", {"id": 8, "uid": "team", "title": "Team"})
+    session.add(
+        "POST",
+        "/dashboards/db",
+        lambda params, json: {"status": "success", "uid": f"{json['dashboard']['title']}-uid", "id": 10},
+    )
+
+    async def main():
+        async with grafana:
+            outcomes = await run_bulk_async(
+                grafana.import_dashboard, [{"title": f"Dashboard {index}"} for index in range(10)], jobs=5
+            )
+            board = await grafana.find_dashboard("Dashboard 3")
+        return outcomes, board
+
+    outcomes, board = asyncio.run(main())
+    assert [outcome.result for outcome in outcomes] == [True] * 10
+    assert len([request for request in session.requests if request[:2] == ("POST", "/folders")]) == 1
+    assert session.max_in_flight == 5
+    assert board["uid"] == "Dashboard 3-uid"
+    assert board["folderTitle"] == "Team"
+
+
+def test_async_remove_dashboard():
+    """
+    Verify removing a dashboard updates the catalog.
+    """
+    grafana, session = mkgrafana(folder="Applications")
+    session.add("DELETE", "/dashboards/uid/baz-uid", {"title": "baz"})
+
+    async def main():
+        async with grafana:
+            res = await grafana.remove_dashboard("baz")
+            board = await grafana.find_dashboard("baz")
+        return res, board
+
+    res, board = asyncio.run(main())
+    assert res == {"title": "baz"}
+    assert board is None
+
+
+def test_async_ensure_folder_nested():
+    """
+    Verify nested folders are resolved lazily, and missing folders are created within their parent folder.
+    """
+    grafana, session = mkgrafana(folder="Applications/Databases")
+    children = {None: [{"id": 7, "uid": "apps", "title": "Applications"}], "apps": []}
+    session.add("GET", "/folders", lambda params, json: children[(params or {}).get("parentUid")])
+    session.add("POST", "/folders", lambda params, json: {"id": 8, "uid": "databases", **json})
+
+    async def main():
+        async with grafana:
+            folder = await grafana.ensure_folder("Applications/Databases")
+            again = await grafana.get_folder("Applications/Databases")
+            parent = await grafana.get_folder(folder_uid="apps")
+        return folder, again, parent
+
+    folder, again, parent = asyncio.run(main())
+    assert folder == {"id": 8, "uid": "databases", "title": "Databases", "parentUid": "apps"}
+    assert again is folder
+    # Folders known from the catalog are not fetched again.
+    assert parent["title"] == "Applications"
+    assert [request[:2] for request in session.requests if request[1].startswith("/folders")] == [
+        ("GET", "/folders"),
+        ("GET", "/folders"),
+        ("POST", "/folders"),
+    ]
+
+
+def test_async_import_dashboard_sync_force(tmp_path):
+    """
+    Verify sync mode skips uploading unchanged dashboards, unless forced, like the `Grafana` class.
+    """
+    grafana, session = mkgrafana(sync=True, sync_state=tmp_path / "sync.json")
+    session.add("GET", "/dashboards/uid/foobar-uid", {"dashboard": {"title": "foobar", "uid": "foobar-uid", "id": 1}})
+    session.add("POST", "/dashboards/db", {"status": "success", "uid": "foobar-uid", "id": 1})
+
+    async def main():
+        async with grafana:
+            results = [await grafana.import_dashboard({"title": "foobar", "panels": []}) for _ in range(2)]
+            results.append(await grafana.import_dashboard({"title": "foobar", "panels": []}, force=True))
+        return results
+
+    assert asyncio.run(main()) == [True, True, True]
+    assert len([request for request in session.requests if request[:2] == ("POST", "/dashboards/db")]) == 2
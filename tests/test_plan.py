@@ -0,0 +1,143 @@
+import json
+import shlex
+import sys
+
+import pytest
+
+from grafana_import.builder import render_dashboard_files
+from grafana_import.cli import main
+from grafana_import.grafana import Grafana
+from grafana_import.plan import CREATE, PRUNE, UNCHANGED, UPDATE, apply_plan, plan_import
+from tests.util import mock_grafana_health
+
+FOLDER = {"id": 7, "uid": "apps", "title": "Applications"}
+
+
+def board(title: str, uid: str, folder=FOLDER):
+    return {
+        "id": 1,
+        "uid": uid,
+        "title": title,
+        "type": "dash-db",
+        "folderId": folder["id"],
+        "folderUid": folder["uid"],
+        "folderTitle": folder["title"],
+    }
+
+
+def mock_folder(responses) -> None:
+    """
+    Mock a Grafana folder with three dashboards, and another dashboard with the same title in another folder.
+    """
+    mock_grafana_health(responses)
+    responses.get(
+        "http://localhost:3000/api/search?type=dash-db&limit=5000&page=1",
+        json=[
+            board("Same", "same"),
+            board("Changed", "changed"),
+            board("Stale", "stale"),
+            board("New", "other", folder={"id": 8, "uid": "other", "title": "Other"}),
+        ],
+    )
+    responses.get("http://localhost:3000/api/folders", json=[FOLDER])
+    responses.get(
+        "http://localhost:3000/api/dashboards/uid/same",
+        json={"dashboard": {"id": 1, "uid": "same", "version": 3, "title": "Same", "panels": []}},
+    )
+    responses.get(
+        "http://localhost:3000/api/dashboards/uid/changed",
+        json={"dashboard": {"id": 2, "uid": "changed", "version": 5, "title": "Changed", "panels": []}},
+    )
+
+
+def write_dashboards(path):
+    path.mkdir()
+    (path / "same.json").write_text(json.dumps({"title": "Same", "panels": []}))
+    (path / "changed.json").write_text(json.dumps({"title": "Changed", "panels": [{"type": "text"}]}))
+    (path / "new.json").write_text(json.dumps({"title": "New", "panels": []}))
+    return sorted(str(item) for item in path.iterdir())
+
+
+def test_plan_apply(mocked_responses, settings, tmp_path):
+    """
+    Verify computing the differences between local dashboards and a folder, and applying only the changes.
+    """
+    mock_folder(mocked_responses)
+
+    def uploaded(request):
+        dashboard = json.loads(request.body)["dashboard"]
+        return 200, {}, json.dumps({"status": "success", "uid": dashboard.get("uid") or "created"})
+
+    upload = mocked_responses.add_callback(
+        "POST", "http://localhost:3000/api/dashboards/db", callback=uploaded, content_type="application/json"
+    )
+    delete = mocked_responses.delete(
+        "http://localhost:3000/api/dashboards/uid/stale",
+        json={"title": "Stale", "message": "Dashboard Stale deleted"},
+    )
+    settings.update({"folder": "Applications", "allow_new": True, "sync": True, "sync_state": tmp_path / "sync.json"})
+    files = write_dashboards(tmp_path / "dashboards")
+    rendered = render_dashboard_files(files, jobs=1)
+
+    gio = Grafana(**settings)
+    plan = plan_import(gio, rendered, prune=True, jobs=2)
+    assert {item.title: item.action for item in plan.items} == {
+        "Changed": UPDATE,
+        "New": CREATE,
+        "Same": UNCHANGED,
+        "Stale": PRUNE,
+    }
+    assert plan.summary() == "Plan for folder 'Applications': 1 to create, 1 to update, 1 unchanged, 1 to prune"
+    assert "  - prune   Stale  (uid: stale)" in plan.format().splitlines()
+    assert upload.call_count == 0
+
+    outcomes = apply_plan(gio, plan, jobs=2)
+    assert all(outcome.ok for outcome in outcomes)
+    assert upload.call_count == 2
+    assert delete.call_count == 1
+    assert gio.get_dashboards().get("stale") is None
+
+    # The next plan compares with the last applied state, without inquiring the server.
+    calls = len(mocked_responses.calls)
+    plan = plan_import(Grafana(**settings), rendered, jobs=2)
+    assert [item.title for item in plan.select(UNCHANGED)] == ["Changed", "Same"]
+    assert not [call for call in mocked_responses.calls[calls:] if "/api/dashboards/uid/" in call.request.url]
+
+
+def test_plan_no_prune_on_errors(mocked_responses, settings, tmp_path):
+    """
+    Verify dashboards are not pruned when any local dashboard file failed to load.
+    """
+    mock_folder(mocked_responses)
+    settings.update({"folder": "Applications", "sync": True, "sync_state": tmp_path / "sync.json"})
+    files = write_dashboards(tmp_path / "dashboards")
+    broken = tmp_path / "dashboards" / "broken.json"
+    broken.write_text("{")
+    rendered = render_dashboard_files(files + [str(broken)], jobs=1)
+
+    plan = plan_import(Grafana(**settings), rendered, prune=True)
+    assert plan.select(PRUNE) == []
+    assert [outcome.item for outcome in plan.errors] == [str(broken)]
+    assert plan.summary().endswith(", 1 failed to load")
+
+
+def test_plan_cli(mocked_responses, tmp_path, capsys):
+    """
+    Verify the `plan` action displays the changes, without uploading any dashboards.
+    """
+    mock_folder(mocked_responses)
+    dashboards = tmp_path / "dashboards"
+    write_dashboards(dashboards)
+
+    sys.argv = shlex.split(
+        f"grafana-import plan --grafana_url http://localhost:3000 --grafana_folder Applications "
+        f"--dashboard_file {dashboards} --prune --cache_ttl 0"
+    )
+    with pytest.raises(SystemExit) as ex:
+        main()
+    assert ex.match("0")
+
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0] == "Plan for folder 'Applications': 1 to create, 1 to update, 1 unchanged, 1 to prune"
+    changes = [line.split()[:3] for line in lines[1:]]
+    assert changes == [["~", "update", "Changed"], ["+", "create", "New"], ["-", "prune", "Stale"]]
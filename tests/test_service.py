@@ -0,0 +1,98 @@
+import os
+import queue
+import signal
+import threading
+import time
+
+from watchdog.events import FileClosedEvent, FileModifiedEvent, FileMovedEvent, FileOpenedEvent
+
+from grafana_import.service import DashboardTreeHandler, WatchdogService, watch_directories
+
+
+def mkservice(tmp_path, action, delay=0.05):
+    (tmp_path / "vendor").mkdir()
+    (tmp_path / "vendor" / "lib.libsonnet").write_text("{}")
+    (tmp_path / "one.jsonnet").write_text("import 'lib.libsonnet'")
+    (tmp_path / "two.jsonnet").write_text("(import 'lib.libsonnet') + {}")
+    (tmp_path / "three.jsonnet").write_text("{}")
+    dashboards = [tmp_path / "one.jsonnet", tmp_path / "two.jsonnet", tmp_path / "three.jsonnet"]
+    return WatchdogService(dashboards, action=action, delay=delay)
+
+
+def test_service_affected(tmp_path):
+    """
+    Verify changes to files only process the dashboards depending on them.
+    """
+    service = mkservice(tmp_path, action=lambda path: None)
+    assert service.affected({tmp_path / "three.jsonnet"}) == [tmp_path / "three.jsonnet"]
+    assert service.affected({tmp_path / "vendor" / "lib.libsonnet"}) == [
+        tmp_path / "one.jsonnet",
+        tmp_path / "two.jsonnet",
+    ]
+    assert service.affected({tmp_path / "unrelated.libsonnet"}) == []
+
+
+def test_tree_handler_events(tmp_path):
+    """
+    Verify irrelevant events are ignored.
+    """
+    events: queue.Queue = queue.Queue()
+    dashboard = tmp_path / "dashboard.py"
+    handler = DashboardTreeHandler(events)
+    handler.dispatch(FileOpenedEvent(str(dashboard)))
+    handler.dispatch(FileModifiedEvent(str(tmp_path / "__pycache__" / "helpers.cpython-312.pyc")))
+    handler.dispatch(FileModifiedEvent(str(tmp_path / ".dashboard.py.swp")))
+    handler.dispatch(FileMovedEvent(str(tmp_path / "dashboard.py~"), str(dashboard)))
+    handler.dispatch(FileModifiedEvent(str(dashboard)))
+    handler.dispatch(FileClosedEvent(str(dashboard)))
+    assert [events.get_nowait().path for _ in range(events.qsize())] == [dashboard] * 3
+
+
+def test_service_coalesces_burst(tmp_path):
+    """
+    Verify a burst of changes processes each affected dashboard once, off the observer thread.
+    """
+    processed = []
+    done = threading.Event()
+
+    def action(path):
+        processed.append((path, threading.current_thread().name))
+        done.set()
+
+    service = mkservice(tmp_path, action=action)
+    service.start()
+    try:
+        for _ in range(3):
+            (tmp_path / "vendor" / "lib.libsonnet").write_text("{ title: 'foo' }")
+            (tmp_path / "three.jsonnet").write_text("{ title: 'bar' }")
+        assert done.wait(5)
+        time.sleep(0.3)
+    finally:
+        service.stop()
+    assert sorted(path.name for path, _ in processed) == ["one.jsonnet", "three.jsonnet", "two.jsonnet"]
+    assert {name for _, name in processed} == {"grafana-import-watchdog"}
+    assert {path.name for path, _ in service.latencies} == {"lib.libsonnet", "three.jsonnet"}
+    assert all(latency >= 0.05 for _, latency in service.latencies)
+
+
+def test_service_signal_shutdown(tmp_path):
+    """
+    Verify the service shuts down promptly when receiving SIGTERM.
+    """
+    service = mkservice(tmp_path, action=lambda path: None)
+    timer = threading.Timer(0.2, os.kill, args=[os.getpid(), signal.SIGTERM])
+    timer.start()
+    started = time.monotonic()
+    service.run()
+    assert time.monotonic() - started < 1
+    assert not service.worker.is_alive()
+    assert signal.getsignal(signal.SIGTERM) is signal.SIG_DFL
+
+
+def test_watch_directories(tmp_path):
+    """
+    Verify nested directories are covered by watching their parent directory recursively.
+    """
+    paths = [tmp_path / "a" / "one.json", tmp_path / "two.json", tmp_path / "a" / "b" / "three.json"]
+    assert watch_directories(paths) == [tmp_path]
+    assert watch_directories([tmp_path / "a" / "one.json"]) == [tmp_path / "a"]
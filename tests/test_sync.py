@@ -0,0 +1,42 @@
+from grafana_import.sync import SyncState, dashboard_fingerprint
+
+
+def test_dashboard_fingerprint():
+    """
+    Verify the content hash ignores volatile attributes and key order.
+    """
+    local = {"title": "foo", "panels": [{"id": 1}], "tags": ["a"]}
+    remote = {"tags": ["a"], "id": 42, "uid": "abc", "version": 7, "panels": [{"id": 1}], "title": "foo"}
+    assert dashboard_fingerprint(local) == dashboard_fingerprint(remote)
+    assert dashboard_fingerprint(local, keep_uid=True) != dashboard_fingerprint(remote, keep_uid=True)
+    assert dashboard_fingerprint(local) != dashboard_fingerprint(dict(local, title="bar"))
+
+
+def test_sync_state(tmp_path):
+    """
+    Verify the sync state is persisted, when modified.
+    """
+    path = tmp_path / "state" / "sync.json"
+    state = SyncState(path)
+    state.save()
+    assert not path.exists()
+
+    state.set("abc", "digest")
+    state.save()
+    assert SyncState(path).get("abc") == "digest"
+
+    state.discard("abc")
+    state.save()
+    assert SyncState(path).get("abc") is None
+
+
+def test_sync_state_sources(tmp_path):
+    """
+    Verify content hashes of dashboard files are persisted per destination folder.
+    """
+    path = tmp_path / "sync.json"
+    state = SyncState(path)
+    state.set_source("dashboard.jsonnet", "General", "digest", "foo")
+    state.save()
+    assert SyncState(path).get_source("dashboard.jsonnet", "General") == {"digest": "digest", "title": "foo"}
+    assert SyncState(path).get_source("dashboard.jsonnet", "Applications") is None
@@ -0,0 +1,267 @@
+import asyncio
+import json
+import threading
+import time
+import typing as t
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import niquests
+import pytest
+from grafana_client.client import GrafanaServerError
+
+from grafana_import.bulk import run_bulk, run_bulk_async
+from grafana_import.grafana import Grafana
+from grafana_import.grafana_async import AsyncGrafana
+from grafana_import.transport import Governor, RateLimiter, TransportSettings, configure_client
+from grafana_import.util import grafana_settings
+from tests.util import mock_grafana_health
+
+
+class FlakyGrafana(ThreadingHTTPServer):
+    """
+    Local HTTP server which answers with a sequence of error responses, before responding successfully.
+    """
+
+    def __init__(self) -> None:
+        self.failures: t.List[t.Tuple[int, t.Dict[str, str]]] = []
+        self.requests: t.List[t.Tuple[str, str]] = []
+        self.delay = 0.0
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        super().__init__(("127.0.0.1", 0), FlakyHandler)
+
+    def fail(self, *failures: t.Tuple[int, t.Dict[str, str]]) -> None:
+        self.failures = list(failures)
+        self.requests.clear()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    server: FlakyGrafana
+
+    def respond(self) -> None:
+        with self.server.lock:
+            self.server.requests.append((self.command, self.path))
+            self.server.in_flight += 1
+            self.server.max_in_flight = max(self.server.max_in_flight, self.server.in_flight)
+        time.sleep(self.server.delay)
+        with self.server.lock:
+            self.server.in_flight -= 1
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        if self.server.failures:
+            status, headers = self.server.failures.pop(0)
+            body = b"{}"
+        else:
+            status, headers = 200, {}
+            body = json.dumps({"database": "ok", "status": "success"}).encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = respond
+
+    def log_message(self, format, *args):  # noqa: A002
+        pass
+
+
+@pytest.fixture
+def server():
+    server = FlakyGrafana()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_transport_settings():
+    """
+    Verify transport settings are acquired from keyword arguments, and validated.
+    """
+    settings = TransportSettings.from_kwargs({"timeout": "2.5", "retries": 1, "keepalive": None})
+    assert settings.timeout == 2.5
+    assert settings.retries == 1
+    assert settings.keepalive is True
+    assert TransportSettings.from_kwargs({}).retries == 0
+    assert TransportSettings.from_kwargs({}, session_pool_size=100).session_pool_size == 100
+    with pytest.raises(ValueError) as ex:
+        TransportSettings.from_kwargs({"session_pool_size": 0})
+    assert ex.match("Invalid value for session_pool_size: 0")
+
+
+def test_transport_config_keys(mocked_responses, config):
+    """
+    Verify transport settings are accepted from the configuration file.
+    """
+    mock_grafana_health(mocked_responses)
+    config["grafana"]["default"].update({"timeout": 10, "keepalive": False, "retries": 5})
+    settings = grafana_settings(url=None, config=config, label="default")
+    gio = Grafana(**settings)
+    assert gio.transport.timeout == 10
+    assert gio.transport.retries == 5
+    assert gio.grafana_api.client.timeout == 10
+    assert gio.grafana_api.client.s.headers["Connection"] == "close"
+
+
+def test_transport_retry_after(server):
+    """
+    Verify rate-limited and unavailable responses are retried, also for uploads, honoring `Retry-After`.
+    """
+    gio = Grafana(url=server.url, retries=3, retry_backoff=0)
+    server.fail((429, {"Retry-After": "0"}), (503, {}))
+    gio.grafana_api.dashboard.update_dashboard({"dashboard": {"title": "foo"}, "overwrite": True})
+    assert server.requests == [("POST", "/api/dashboards/db")] * 3
+
+
+def test_transport_no_retry_upload(server):
+    """
+    Verify uploads failing with an internal server error are not retried, since they may have been processed.
+    """
+    gio = Grafana(url=server.url, retries=3, retry_backoff=0)
+    server.fail((500, {}))
+    with pytest.raises(GrafanaServerError):
+        gio.grafana_api.dashboard.update_dashboard({"dashboard": {"title": "foo"}, "overwrite": True})
+    assert len(server.requests) == 1
+
+
+def test_transport_retry_exhausted(server):
+    """
+    Verify the final error response is reported, when retries are exhausted.
+    """
+    gio = Grafana(url=server.url, retries=2, retry_backoff=0)
+    server.fail(*[(502, {})] * 3)
+    with pytest.raises(GrafanaServerError) as ex:
+        gio.grafana_api.health.check()
+    assert "502" in str(ex.value)
+    assert len(server.requests) == 3
+
+
+def test_transport_async(server):
+    """
+    Verify the asynchronous session retries transient errors, too.
+    """
+    server.fail((503, {"Retry-After": "0"}), (504, {}))
+    grafana = AsyncGrafana(url=server.url, retries=3, retry_backoff=0, session_pool_size=4)
+    assert isinstance(grafana.grafana_api.client.s, niquests.AsyncSession)
+
+    async def main():
+        async with grafana:
+            pass
+
+    asyncio.run(main())
+    assert server.requests == [("GET", "/api/health")] * 3
+
+
+def test_transport_no_retry_default(server):
+    """
+    Verify failed requests are not retried by default.
+    """
+    gio = Grafana(url=server.url)
+    server.fail((503, {}))
+    with pytest.raises(GrafanaServerError):
+        gio.grafana_api.health.check()
+    assert len(server.requests) == 1
+
+
+def test_configure_client_retains_headers(mocked_responses):
+    """
+    Verify replacing the session retains its headers.
+    """
+    mock_grafana_health(mocked_responses)
+    gio = Grafana(url="http://localhost:3000")
+    client = gio.grafana_api.client
+    client.s.headers["X-Grafana-Org-Id"] = "2"
+    configure_client(client, TransportSettings(keepalive=True))
+    assert client.s.headers["X-Grafana-Org-Id"] == "2"
+    assert client.s.headers["Connection"] == "keep-alive"
+
+
+def test_rate_limiter():
+    """
+    Verify the token bucket permits a burst, and spaces out further requests according to the rate.
+    """
+    limiter = RateLimiter(rate=10, burst=2)
+    delays = [limiter.reserve() for _ in range(4)]
+    assert delays[:2] == [0, 0]
+    assert delays[2] == pytest.approx(0.1, abs=0.01)
+    assert delays[3] == pytest.approx(0.2, abs=0.01)
+
+
+def test_governor_max_in_flight(server):
+    """
+    Verify concurrent requests of all threads are capped, and spaced out by the rate limit.
+    """
+    gio = Grafana(url=server.url, max_in_flight=2, rate_limit=50, rate_burst=5)
+    server.fail()
+    server.delay = 0.05
+    started = time.monotonic()
+    outcomes = run_bulk(lambda _: gio.grafana_api.health.check(), range(20), jobs=10)
+    assert all(outcome.error is None for outcome in outcomes)
+    assert len(server.requests) == 20
+    assert server.max_in_flight == 2
+    # 15 requests beyond the burst take at least 0.3 seconds at 50 requests per second.
+    assert time.monotonic() - started >= 0.3
+    governor = gio.grafana_api.client.s.governor
+    assert isinstance(governor, Governor)
+    assert governor.throttled > 0
+
+
+@pytest.mark.parametrize("use_async", [False, True], ids=["sync", "async"])
+def test_governor_retries(server, use_async):
+    """
+    Verify each retry of a request waits for a rate token, too.
+    """
+    failures = [(503, {"Retry-After": "0"})] * 2
+    if use_async:
+        grafana = AsyncGrafana(url=server.url, retries=2, retry_backoff=0, rate_limit=5)
+
+        async def main():
+            async with grafana:
+                pass
+
+        server.fail(*failures)
+        started = time.monotonic()
+        asyncio.run(main())
+    else:
+        gio = Grafana(url=server.url, retries=2, retry_backoff=0, rate_limit=5)
+        server.fail(*failures)
+        started = time.monotonic()
+        gio.grafana_api.health.check()
+    assert len(server.requests) == 3
+    # The two retries beyond the first token take at least 0.4 seconds at 5 requests per second.
+    assert time.monotonic() - started >= 0.35
+
+
+def test_governor_async(server):
+    """
+    Verify concurrent requests of all coroutines are capped.
+    """
+    grafana = AsyncGrafana(url=server.url, max_in_flight=3)
+    server.delay = 0.05
+
+    async def main():
+        async with grafana:
+            server.fail()
+            return await run_bulk_async(lambda _: grafana.grafana_api.health.check(), range(12))
+
+    outcomes = asyncio.run(main())
+    assert all(outcome.error is None for outcome in outcomes)
+    assert len(server.requests) == 12
+    assert server.max_in_flight == 3
+
+
+def test_governor_disabled(mocked_responses):
+    """
+    Verify no governor is used by default.
+    """
+    mock_grafana_health(mocked_responses)
+    gio = Grafana(url="http://localhost:3000")
+    assert gio.grafana_api.client.s.governor is None
@@ -1,9 +1,10 @@
+import json
 from pathlib import Path
 
 import pytest
 import requests
 
-from grafana_import.util import read_dashboard_file
+from grafana_import.util import atomic_write, read_dashboard_file, write_json_atomic
 
 MINIMAL_JSON_URL = "https://github.com/grafana-toolbox/grafana-snippets/raw/main/dashboard/native-minimal.json"
 
@@ -69,3 +70,23 @@ def test_read_dashboard_builder_unknown(tmp_path):
     with pytest.raises(NotImplementedError) as ex:
         read_dashboard_file(builder)
     assert ex.match("Decoding file type not implemented, or file is not executable: unknown-builder")
+
+
+def test_write_json_atomic(tmp_path):
+    """
+    Verify writing a file fails without leaving a half-written file, or replacing the previous one.
+    """
+    path = tmp_path / "exports" / "foo.json"
+    write_json_atomic(path, {"title": "foo"}, indent=2)
+    assert json.loads(path.read_text()) == {"title": "foo"}
+
+    with pytest.raises(TypeError):
+        write_json_atomic(path, {"title": "bar", "panels": [object()]})
+    assert json.loads(path.read_text()) == {"title": "foo"}
+    assert [item.name for item in path.parent.iterdir()] == ["foo.json"]
+
+    with pytest.raises(RuntimeError):
+        with atomic_write(tmp_path / "bar.json") as fp:
+            fp.write("{")
+            raise RuntimeError("Interrupted")
+    assert not (tmp_path / "bar.json").exists()
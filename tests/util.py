@@ -24,13 +24,74 @@ def mock_grafana_health(responses: RequestsMock) -> None:
 
 def mock_grafana_search(responses: RequestsMock) -> None:
     responses.get(
-        "http://localhost:3000/api/search?type=dash-db&limit=5000",
+        "http://localhost:3000/api/search?type=dash-db&limit=5000&page=1",
         json=[{"title": "foobar", "uid": "618f7589-7e3d-4399-a585-372df9fa5e85"}],
         status=200,
         content_type="application/json",
     )
 
 
+def mock_grafana_folder_dashboards(responses: RequestsMock) -> None:
+    """
+    Mock dashboards within the `General` and `Applications` folders.
+    """
+    mock_grafana_health(responses)
+    responses.get(
+        "http://localhost:3000/api/search?type=dash-db&limit=5000&page=1",
+        json=[
+            {"title": "foo", "uid": "foo-uid"},
+            {"title": "bar", "uid": "bar-uid", "folderId": 1, "folderUid": "apps", "folderTitle": "Applications"},
+            {"title": "baz", "uid": "baz-uid", "folderId": 1, "folderUid": "apps", "folderTitle": "Applications"},
+        ],
+        status=200,
+        content_type="application/json",
+    )
+    responses.get(
+        "http://localhost:3000/api/folders",
+        json=[{"id": 1, "uid": "apps", "title": "Applications"}],
+        status=200,
+        content_type="application/json",
+    )
+    for uid, meta in [
+        ("foo-uid", {"folderId": 0}),
+        ("bar-uid", {"folderId": 1, "folderUid": "apps", "folderTitle": "Applications"}),
+        ("baz-uid", {"folderId": 1, "folderUid": "apps", "folderTitle": "Applications"}),
+    ]:
+        responses.get(
+            f"http://localhost:3000/api/dashboards/uid/{uid}",
+            json={"dashboard": {"uid": uid, "version": 1}, "meta": meta},
+            status=200,
+            content_type="application/json",
+        )
+
+
+def mock_grafana_same_title_folders(responses: RequestsMock) -> None:
+    """
+    Mock dashboards of the same title within the nested folders `Team/Services` and `Ops/Services`.
+    """
+    mock_grafana_health(responses)
+    folders = [(2, "team-services"), (4, "ops-services")]
+    responses.get(
+        "http://localhost:3000/api/search?type=dash-db&limit=5000&page=1",
+        json=[
+            {"title": "svc", "uid": f"{uid}-svc", "folderId": id_, "folderUid": uid, "folderTitle": "Services"}
+            for id_, uid in folders
+        ],
+        status=200,
+        content_type="application/json",
+    )
+    for id_, uid in folders:
+        responses.get(
+            f"http://localhost:3000/api/dashboards/uid/{uid}-svc",
+            json={
+                "dashboard": {"uid": f"{uid}-svc", "title": "svc", "version": 1},
+                "meta": {"folderId": id_, "folderUid": uid, "folderTitle": "Services"},
+            },
+            status=200,
+            content_type="application/json",
+        )
+
+
 def mkdashboard() -> t.Dict[str, t.Any]:
     """
     Example Grafana dashboard, generated using the `grafana-dashboard` package.
@@ -77,3 +138,57 @@ def open_write_noop(file: "FileDescriptorOrPath", mode: "OpenTextMode" = "r", **
             return io.BytesIO()
         return io.StringIO()
     return real_open(file=file, mode=mode, **kwargs)
+
+
+class AsyncSessionMock:
+    """
+    A replacement for the `niquests.AsyncSession` of an asynchronous Grafana client.
+
+    Responses are defined per HTTP method and API path, either as static JSON
+    payloads, or as functions of the request parameters and JSON body. Each
+    request is delayed by `delay` seconds, recording the maximum number of
+    concurrent requests.
+    """
+
+    class Response:
+        def __init__(self, status_code: int, payload: t.Any):
+            self.status_code = status_code
+            self.payload = payload
+            self.headers = {"Content-Type": "application/json"}
+            self.text = json.dumps(payload)
+
+        def json(self) -> t.Any:
+            return self.payload
+
+    def __init__(self, delay: float = 0):
+        self.headers: t.Dict[str, str] = {}
+        self.routes: t.Dict[t.Tuple[str, str], t.Any] = {}
+        self.requests: t.List[t.Tuple[str, str, t.Any, t.Any]] = []
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.closed = False
+
+    def add(self, method: str, path: str, payload: t.Any, status: int = 200) -> None:
+        self.routes[(method.upper(), path)] = (status, payload)
+
+    async def request(self, method: str, url: str, json=None, params=None, **kwargs) -> "AsyncSessionMock.Response":
+        import asyncio
+
+        path = url.split("/api", 1)[1]
+        self.requests.append((method.upper(), path, params, json))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        if (method.upper(), path) not in self.routes:
+            return self.Response(404, {"message": "Not Found"})
+        status, payload = self.routes[(method.upper(), path)]
+        if callable(payload):
+            payload = payload(params=params, json=json)
+        return self.Response(status, payload)
+
+    async def close(self) -> None:
+        self.closed = True